@@ -5,6 +5,11 @@
 
     Computes UTC time for each local date/time,
     and outputs a load file in standard format.
+    The local times of a file are converted together,
+    see local_time.py.
+
+    Workbooks are streamed in read only mode, and read in
+    parallel with --jobs.
 """
 
 from optparse import OptionParser
@@ -13,19 +18,61 @@ import operator
 import sys
 import os
 import logging
-from openpyxl import Workbook
-from openpyxl.styles import Alignment
 from openpyxl import load_workbook
-from datetime import datetime, timezone
-import pytz
+from datetime import datetime, date, timezone
+import numpy as np
 
 sys.path.append('../Common')
 from common_defs import *
 from demand_file import DemandFile
+from local_time import get_local_time_table
+from jobs import map_jobs
+
+BC_TIMEZONE = "America/Vancouver"
+
+# Returns the year, month and day of a date cell, which is either
+# a date, or text as YYYY-MM-DD or MM/DD/YYYY followed by any time.
+def get_cell_date(value):
+    if isinstance(value, (datetime, date)):
+        return value.year, value.month, value.day
+    the_date = [tok.strip() for tok in str(value).strip().split(" ")]
+    try:
+        year, month, day = [int(tok.strip()) for tok in the_date[0].split("-")]
+    except ValueError:
+        month, day, year = [int(tok.strip()) for tok in the_date[0].split("/")]
+    return year, month, day
+
+# Returns the hour ending of an hour cell, which may be text
+# ending in '*' for the repeated hour when DST ends.
+def get_cell_hour(value):
+    if isinstance(value, int):
+        return value
+    text = str(value).strip()
+    if text[-1] == '*':
+        text = text[:-1]
+    return int(text)
+
+def get_cell_mw(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    return float(str(value).strip())
+
+def is_empty_cell(value):
+    return (value is None) or (str(value).strip() == '')
+
+# Reads and parses one workbook, returning the path, the rows for the
+# demand file, see BCSpreadsheetFiles.parse_rows(), and the error if
+# the workbook could not be read.
+def read_bc_file(path):
+    ssheet = BCSpreadsheetFiles()
+    try:
+        rows = ssheet.read_excel(path)
+    except ValueError as e:
+        return [path, [], str(e)]
+    return [path, ssheet.parse_rows(path, rows), ""]
 
 class BCSpreadsheetFiles(object):
-    def __init__(self, do_all_files = False, file_paths = []):
-        self.lines = []
+    def __init__(self, do_all_files = False, file_paths = [], workers = 1):
         self.files = []
         self.demand_file = DemandFile()
         self.dst = False
@@ -38,18 +85,28 @@ class BCSpreadsheetFiles(object):
                 if file_extension == EXCEL_FILE_EXTENSION:
                     file_paths.append(each_file)
 
+        paths = []
         for path in file_paths:
             try:
                 self.check_file(path)
-                self.read_and_parse_file(path)
-                self.files.append(path)
-                logging.warning("Parsed file %s" % path)
+                paths.append(path)
             except ValueError as e:
                 if do_all_files:
                     continue
                 print(e)
                 sys.exit(-1)
 
+        # Workbooks are read in parallel, and added in order.
+        for path, rows, error in map_jobs(read_bc_file, paths, workers):
+            if error != "":
+                if do_all_files:
+                    continue
+                print(error)
+                sys.exit(-1)
+            self.add_rows(path, rows)
+            self.files.append(path)
+            logging.warning("Parsed file %s" % path)
+
     def check_file(self, file_path):
         if not os.path.isfile(file_path):
             raise ValueError("File '%s' does not exist!" % file_path)
@@ -58,59 +115,43 @@ class BCSpreadsheetFiles(object):
             raise ValueError("File '%s' wrong type, want '%s' but got %s!" %
                     (file_path, EXCEL_FILE_EXTENSION, file_extension))
 
+    # Returns the first three cells of each row of the active sheet,
+    # after the first row, streamed from the workbook.
     def read_excel(self, file_path):
-        self.wb = load_workbook(filename = file_path)
-        for sheet in self.wb:
-            if sheet.title != self.wb.active.title:
-                continue
-            idx = 0
-            for row in sheet.iter_rows(min_row = 1):
-               vals = [c.value  for c in row]
-               for i, val in enumerate(vals):
-                   if val is None:
-                       vals[i] = ''
-                   try:
-                       vals[i] = str(vals[i])
-                   except UnicodeEncodeError:
-                       vals[i].encode("ascii","ignore")
-               line = SEPARATOR.join(vals[0:3])
-               line_crlf = "%s%s%s\n" % (START_END, line, START_END)
-               self.lines.append(line_crlf)
-               logging.info("Line from Excel %d: %s" % (idx, line_crlf))
-               idx += 1
+        wb = load_workbook(filename = file_path, read_only = True)
+        try:
+            sheet = wb.active
+            # The stored dimensions of converted workbooks may be wrong.
+            sheet.reset_dimensions()
+            return [row[0:3] for row in sheet.iter_rows(min_row = 2, values_only = True)]
+        finally:
+            wb.close()
 
     def _get_BC_UTC(self, year, month, day, hour_in, dst_in=False):
-        local = pytz.timezone("America/Vancouver")
         naive = datetime(year, month, day, hour=hour_in)
-        local_dt = local.localize(naive, is_dst=dst_in)
-        utc_dt = local_dt.astimezone(pytz.utc)
+        utc_dt = get_local_time_table(BC_TIMEZONE).to_utc(naive, dst_in)
         return utc_dt.year, utc_dt.month, utc_dt.day, utc_dt.hour
 
-    def parse_lines(self, path):
-        if self.lines is []:
-            logging.error("%s is empty!" % path)
-            return
-
+    # Returns [line_num, cells, fields] for each hour of rows, where
+    # fields are the UTC and local year, month, day and hour, and
+    # the load, for the demand file.
+    def parse_rows(self, path, rows):
         self.dst = False
         prev_hour = -1
+        # [line_num, cells, local time, DST flag, load] of each hour,
+        # for converting to UTC at the end.
+        hours = []
 
-        for line_num, line in enumerate(self.lines[1:]):
-            line = line.strip()
-            toks = [tok.strip() for tok in line[1:-1].split(SEPARATOR)]
-            if len(toks) < 3 or '' in toks[0:3] or "HE" in toks:
+        for line_num, cells in enumerate(rows):
+            if len(cells) < 3 or [x for x in cells if is_empty_cell(x)] or \
+               [x for x in cells if isinstance(x, str) and x.strip() == "HE"]:
                 logging.info("%s: Skipping line %d:'%s'" %
-                        (path, line_num, line))
+                        (path, line_num, str(cells)))
                 continue
             try:
-                the_date = [tok.strip() for tok in toks[0].split(" ")]
-                try:
-                    year, month, day = [int(tok.strip()) for tok in the_date[0].split("-")]
-                except ValueError:
-                    month, day, year = [int(tok.strip()) for tok in the_date[0].split("/")]
-                if toks[1][-1] == '*':
-                    toks[1] = toks[1][:-1]
-                the_hour = int(toks[1]) - 1
-                the_load = float(toks[2])
+                year, month, day = get_cell_date(cells[0])
+                the_hour = get_cell_hour(cells[1]) - 1
+                the_load = get_cell_mw(cells[2])
 
                 ## Now for some messing about due to Daylight Savings Time entry and exit
                 ##
@@ -129,22 +170,32 @@ class BCSpreadsheetFiles(object):
                 if (the_hour == prev_hour):
                     self.dst = False
 
-                utc_y, utc_m, utc_d, utc_h = self._get_BC_UTC(year, month, day, the_hour, self.dst)
+                hours.append([line_num, cells, datetime(year, month, day, hour=the_hour),
+                              self.dst, the_load])
                 prev_hour = the_hour
-
-                self.demand_file.add_mw_hour(path, line_num, [path, line_num,
-                                                  utc_y, utc_m, utc_d,    utc_h,
-                                                  year , month,   day, the_hour, the_load])
             except ValueError as e:
                 logging.warning("Error processing %s Line %d:%s" %
-                        (path, line_num, line))
+                        (path, line_num, str(cells)))
                 logging.warning(e)
                 continue
 
-    def read_and_parse_file(self, path):
-        self.lines = []
-        self.read_excel(path)
-        self.parse_lines(path)
+        if len(hours) == 0:
+            return []
+        local_times = [x[2] for x in hours]
+        utc_times = get_local_time_table(BC_TIMEZONE).to_utc_array(local_times,
+                                                                   np.array([x[3] for x in hours]))
+        return [[line_num, cells, [utc.year, utc.month, utc.day, utc.hour,
+                                   local.year, local.month, local.day, local.hour, the_load]]
+                for (line_num, cells, local, dst, the_load), utc in zip(hours, utc_times.tolist())]
+
+    def add_rows(self, path, rows):
+        for line_num, cells, fields in rows:
+            try:
+                self.demand_file.add_mw_hour(path, line_num, [path, line_num] + fields)
+            except ValueError as e:
+                logging.warning("Error processing %s Line %d:%s" %
+                        (path, line_num, str(cells)))
+                logging.warning(e)
 
     def print_demand_file(self):
         self.demand_file.write_hourly_mw_file()
@@ -161,6 +212,11 @@ def create_parser():
             action = 'store_true', default = False,
             help = 'Process all .xlsx files in this directory.',
             metavar = 'FLAG')
+    parser.add_option('-j', '--jobs',
+            dest = 'jobs',
+            action = 'store', type = 'int', default = 1,
+            help = 'Number of processes used to read Excel files.',
+            metavar = 'JOBS')
     return parser
 
 def main(argv = None):
@@ -175,9 +231,12 @@ def main(argv = None):
         print
         parser.print_help()
         return -1
+    if options.jobs < 1:
+        raise ValueError("Jobs must be at least 1, not %d." % options.jobs)
 
     ssheet = BCSpreadsheetFiles(options.all_xlsx_files,
-                                options.excel_file_paths)
+                                options.excel_file_paths,
+                                options.jobs)
     ssheet.print_demand_file()
 
 if __name__ == '__main__':
@@ -126,5 +126,24 @@ class TestBCSpreadsheetFile(unittest.TestCase):
         self.assertEqual(d,29)
         self.assertEqual(h, 8)
 
+    def test_parse_rows(self):
+        ssheet = BCSpreadsheetFiles()
+        # Typed and text cells, a heading, the hour skipped in spring
+        # and the hour repeated in autumn.
+        rows = [("Date", "HE", "Load"),
+                (datetime(2006, 4, 2), 1, 5000),
+                ("2006-04-02 00:00:00", "2", 0),
+                ("04/02/2006", 3, 5100.5),
+                (datetime(2006, 10, 29), 2, 4000),
+                (datetime(2006, 10, 29), "2*", 4100),
+                (datetime(2006, 10, 29), None, 4200)]
+        parsed = ssheet.parse_rows("test.xlsx", rows)
+        self.assertEqual([x[0] for x in parsed], [1, 3, 4, 5])
+        self.assertEqual([x[2] for x in parsed],
+                         [[2006, 4, 2, 8, 2006, 4, 2, 0, 5000.0],
+                          [2006, 4, 2, 9, 2006, 4, 2, 2, 5100.5],
+                          [2006, 10, 29, 8, 2006, 10, 29, 1, 4000.0],
+                          [2006, 10, 29, 9, 2006, 10, 29, 1, 4100.0]])
+
 if __name__ == '__main__':
     unittest.main()
@@ -12,11 +12,11 @@ import sys
 import os
 import logging
 from datetime import datetime, timezone, timedelta
-import pytz
 
 sys.path.append('../Common')
 from common_defs import *
 from demand_file import DemandFile
+from local_time import get_local_time_table
 
 class minmax(object):
     def __init__(self, time_id="No Time", demand="No Demand"):
@@ -177,9 +177,7 @@ class ONSpreadsheetFiles(object):
             day_out = naive.day
         else:
             naive = datetime(year, month, day, hour=hour_in)
-        local = pytz.timezone("America/Toronto")
-        local_dt = local.localize(naive, is_dst=dst_in)
-        utc_dt = local_dt.astimezone(pytz.utc)
+        utc_dt = get_local_time_table("America/Toronto").to_utc(naive, dst_in)
         return utc_dt.year, utc_dt.month, utc_dt.day, utc_dt.hour, year_out, month_out, day_out, hour_out
 
     def print_hourly_min_max(self):
@@ -14,11 +14,11 @@ import sys
 import os
 import logging
 from datetime import datetime, timezone
-import pytz
 
 sys.path.append('../Common')
 from common_defs import *
 from demand_file import DemandFile
+from local_time import get_local_time_table
 
 class date_n_val(object):
     def __init__(self, the_date, the_val, file_name, line_num):
@@ -159,10 +159,8 @@ class PQSpreadsheetFiles(object):
                     (file_path, EXCEL_FILE_EXTENSION, file_extension))
 
     def get_PQ_UTC(self, year, month, day, hour_in, dst_in=False):
-        local = pytz.timezone("America/Montreal")
         naive = datetime(year, month, day, hour=hour_in)
-        local_dt = local.localize(naive, is_dst=dst_in)
-        utc_dt = local_dt.astimezone(pytz.utc)
+        utc_dt = get_local_time_table("America/Montreal").to_utc(naive, dst_in)
         return utc_dt.year, utc_dt.month, utc_dt.day, utc_dt.hour
 
     def generate_demand_file(self):
@@ -17,11 +17,11 @@ from openpyxl import Workbook
 from openpyxl.styles import Alignment
 from openpyxl import load_workbook
 from datetime import datetime, timezone
-import pytz
 
 sys.path.append('../Common')
 from common_defs import *
 from demand_file import DemandFile
+from local_time import get_local_time_table
 
 class NBSpreadsheetFiles(object):
     UNKNOWN_INDEX = -1
@@ -92,10 +92,8 @@ class NBSpreadsheetFiles(object):
                 return
 
     def _get_NB_UTC(self, year, month, day, hour_in, dst_in=False):
-        local = pytz.timezone("America/Moncton")
         naive = datetime(year, month, day, hour=hour_in)
-        local_dt = local.localize(naive, is_dst=dst_in)
-        utc_dt = local_dt.astimezone(pytz.utc)
+        utc_dt = get_local_time_table("America/Moncton").to_utc(naive, dst_in)
         return utc_dt.year, utc_dt.month, utc_dt.day, utc_dt.hour
 
     ## Sometimes load figures are "NA", as in Not Available
@@ -17,11 +17,11 @@ from openpyxl import Workbook
 from openpyxl.styles import Alignment
 from openpyxl import load_workbook
 from datetime import datetime, timezone, timedelta
-import pytz
 
 sys.path.append('../Common')
 from common_defs import *
 from demand_file import DemandFile
+from local_time import get_local_time_table
 from hourly_mw_file import HourlyMWFile
 
 class date_n_val(object):
@@ -166,10 +166,8 @@ class PEISpreadsheetFiles(object):
     ## Note: create_demand_file assumes a full year of data, starting with
     ## January 1 at midnight local time.
     def create_demand_file(self):
-        local = pytz.timezone("America/Halifax")
         naive = datetime(self.target_year, 1, 1, hour=0)
-        local_dt = local.localize(naive, False)
-        utc_dt = local_dt.astimezone(pytz.utc)
+        utc_dt = get_local_time_table("America/Halifax").to_utc(naive, False)
 
         for month in sorted(self.vals.months.keys()):
             for day in sorted(self.vals.months[month].keys()):
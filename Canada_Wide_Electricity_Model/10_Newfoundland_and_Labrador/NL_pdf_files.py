@@ -6,6 +6,16 @@
 
     Computes UTC time for each local date/time,
     and outputs a load file in standard format.
+
+    Only the part of the page around the load graph is rendered,
+    found from the vertical axis labels.  The rendered graph is
+    searched as a numpy array sharing the pixmap's samples, a row
+    or column at a time.
+
+    Files are opened, dated, rendered and measured once each, in
+    a pool of --jobs processes.  The report date and hourly readings
+    of each file are kept in a --cache_file by the SHA-256 of the
+    file, so later runs only measure new reports.
 """
 
 from optparse import OptionParser
@@ -15,14 +25,24 @@ import operator
 import sys
 import os
 import logging
+import math
 from urllib.parse import urlparse
-import fitz
+import json
+import numpy as np
 from datetime import datetime, timedelta
 import pytz
 
 sys.path.append('../Common')
 from common_defs import *
 from demand_file import DemandFile
+from local_time import get_local_time_table
+from hourly_cache import get_file_hash
+from jobs import map_jobs
+try:
+    import fitz
+except ImportError:
+    # Only needed to open and render reports.
+    fitz = None
 
 class calibration_pixel(object):
     def __init__(self):
@@ -53,6 +73,26 @@ RIGHT = [1, 0]
 UP = [0, -1]
 DOWN = [0, 1]
 INVALID = -1
+COLOUR_TOLERANCE = 3
+# Points around the vertical axis labels rendered with the graph.
+GRAPH_MARGIN = 20
+REPORT_DATE_FORMAT = "%Y-%m-%d"
+CACHE_VERSION = 1
+
+# Returns the pixels of pix as a height x width x n array, which
+# shares the pixmap's samples where this version of fitz allows it.
+def get_pixel_array(pix):
+    try:
+        samples = pix.samples_mv
+    except AttributeError:
+        samples = bytearray(pix.samples)
+    return np.frombuffer(samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+
+# Returns a mask of the pixels within tolerance of colour
+# for every component.
+def match_colour(pixels, colour, tolerance=0):
+    diff = np.abs(pixels.astype(np.int16) - np.array(colour, dtype=np.int16))
+    return (diff <= tolerance).all(axis=-1)
 
 class NL_PDF_Processing(object):
 
@@ -74,16 +114,18 @@ class NL_PDF_Processing(object):
         self.annotate = annotate
         self.x_scale = 2
         self.y_scale = 2
-        self.scaling = fitz.Matrix(self.x_scale, self.y_scale)
 
         # Variables used when processing a file
         self.filepath = ""
         self.doc = ""
         self.page = ""
         self.pix = ""
+        self.pixels = None
         self.file_report_time = ""
         self.file_utc = ""
+        self.page_labels = []
         self.labels = []
+        self.readings = []
         self.cal_x1 = calibration_pixel()
         self.cal_x2 = calibration_pixel()
         self.cal_y1 = calibration_pixel()
@@ -96,24 +138,17 @@ class NL_PDF_Processing(object):
     #   - Files with multiple pages
     #   - Files without an internal report date
     # - Earlier report revisions for the same date
-    def remove_unwanted_files(self):
+    #
+    # results holds the result of digitise() for each file.
+    def remove_unwanted_files(self, results):
         logging.info("Removing unwanted files")
         list_to_skip = []
 
         for filename in self.filepaths:
-            try:
-                self.doc = fitz.open(filename)
-                if (len(list(self.doc.pages())) > 1):
-                    list_to_skip.append(filename)
-                    self.doc.close()
-                    continue
-                self.page = self.doc.loadPage(0)
-                file_dt = self.get_report_datetime(filename, self.page)
-                self.doc.close()
-            except:
+            if results[filename]["date"] is None:
                 list_to_skip.append(filename)
-                self.doc.close()
                 continue
+            file_dt = datetime.strptime(results[filename]["date"], REPORT_DATE_FORMAT)
 
             found_dup = self.found_dup_file(filename, file_dt)
             if found_dup:
@@ -161,33 +196,133 @@ class NL_PDF_Processing(object):
                 return 1
         return 0
 
-    def process_files(self):
-        self.remove_unwanted_files()
+    # Digitises every file with up to workers processes, then adds
+    # the readings of the wanted files to the demand file, in file
+    # order.  Results are read from and saved to cache_path, if given.
+    # Cached results are not used when annotating, so that every
+    # file is rendered.
+    def process_files(self, workers=1, cache_path=""):
+        cache = {}
+        if cache_path:
+            cache = read_result_cache(cache_path)
+        cached_results = cache
+        if self.annotate:
+            cached_results = {}
+
         logging.info("Processing files")
+        results = {}
+        new_results = 0
+        for filepath, file_hash, result, cached in map_jobs(digitise_file, self.filepaths,
+                                                            workers, set_batch,
+                                                            (cached_results, self.annotate),
+                                                            chunksize=16):
+            results[filepath] = result
+            # Errors are not cached, so that the file is tried again.
+            if not cached and result["error"] == "":
+                cache[file_hash] = result
+                new_results += 1
+        logging.info("Measured %d files, %d from the cache" %
+                     (len(results), len(results) - new_results))
+        if cache_path and new_results:
+            write_result_cache(cache_path, cache)
+
+        self.remove_unwanted_files(results)
+        for filepath in self.filepaths:
+            result = results[filepath]
+            if result["error"] != "":
+                raise ValueError(result["error"])
+            for reading in result["readings"]:
+                self.demand_file.add_mw_hour(filepath, reading[0], [filepath] + reading)
+
+    # Opens, dates, renders and measures one file.
+    #
+    # Returns a dictionary with the report date, or None for unwanted
+    # files, a list of [hour, UTC year, month, day, hour, local year,
+    # month, day, hour, load] readings, and the error if the file could
+    # not be measured.
+    def digitise(self, filepath):
+        self.filepath = filepath
+        result = {"date" : None, "readings" : [], "error" : ""}
+        if fitz is None:
+            raise ValueError("PyMuPDF (fitz) is needed to read %s." % filepath)
         try:
-            for filepath in self.filepaths:
-                self.filepath = filepath
-                logging.info("Processing '%s'" % filepath)
-    
-                self.doc = fitz.open(filepath)
-                self.page = self.doc.loadPage(0)
-                self.pix = self.page.getPixmap(matrix=self.scaling, alpha = False)
-                self.file_report_time = self.get_report_datetime(filepath, self.page)
-                self.file_utc = self.get_NL_UTC(self.file_report_time)
-                self.labels = self.find_labels()
-                self.find_x1(WHITE)
-                self.find_x2(WHITE)
-                self.find_y1()
-                self.find_y2(WHITE)
-                self.make_measurements(WHITE, BLUE)
-                self.mark_calibration_points()
-                self.write_png_file()
+            self.doc = fitz.open(filepath)
+        except:
+            return result
+        try:
+            if (len(list(self.doc.pages())) > 1):
                 self.doc.close()
+                return result
+            self.page = self.doc.loadPage(0)
+            self.file_report_time = self.get_report_datetime(filepath, self.page)
+        except:
+            self.doc.close()
+            return result
+        result["date"] = self.file_report_time.strftime(REPORT_DATE_FORMAT)
+
+        logging.info("Processing '%s'" % filepath)
+        self.readings = result["readings"]
+        try:
+            self.file_utc = self.get_NL_UTC(self.file_report_time)
+            self.page_labels = self.find_labels()
+            clip = self.get_graph_clip()
+            try:
+                self.measure(clip)
+            except ValueError as e:
+                if clip is None:
+                    raise e
+                logging.info("%s  Measuring the whole page instead." % str(e))
+                del self.readings[:]
+                self.measure(None)
         except ValueError as e:
-            self.mark_calibration_points()
+            result["error"] = str(e)
+        if self.annotate:
+            if self.labels:
+                self.mark_calibration_points()
             self.write_png_file()
-            self.doc.close()
-            raise e
+        self.doc.close()
+        return result
+
+    # Returns the part of the page holding the graph, from the left
+    # of the vertical axis labels to the right of the page, and from
+    # above the top label to below the bottom label, or None if that
+    # is the whole page.  The clip is in whole points, so that it
+    # starts on a whole pixel when rendered, as [x0, y0, x1, y1].
+    def get_graph_clip(self):
+        rect = self.page.rect
+        x0 = min([label.ul_x for label in self.page_labels]) / self.x_scale - GRAPH_MARGIN
+        y0 = self.page_labels[0].ul_y / self.y_scale - GRAPH_MARGIN
+        y1 = self.page_labels[-1].lr_y / self.y_scale + GRAPH_MARGIN
+        clip = [max(rect.x0, math.floor(x0)), max(rect.y0, math.floor(y0)),
+                rect.x1, min(rect.y1, math.ceil(y1))]
+        if clip == [rect.x0, rect.y0, rect.x1, rect.y1]:
+            return None
+        return clip
+
+    # Renders clip, or the whole page if clip is None, and takes
+    # the measurements.  Pixel coordinates, including those of the
+    # labels, are relative to the top left of the rendered clip.
+    def measure(self, clip):
+        scaling = fitz.Matrix(self.x_scale, self.y_scale)
+        if clip is None:
+            self.pix = self.page.getPixmap(matrix=scaling, alpha = False)
+        else:
+            self.pix = self.page.getPixmap(matrix=scaling, clip=fitz.Rect(*clip), alpha = False)
+        self.pixels = get_pixel_array(self.pix)
+        self.labels = []
+        for page_label in self.page_labels:
+            label = graph_label()
+            label.value = page_label.value
+            label.ul_x = page_label.ul_x - self.pix.x
+            label.ul_y = page_label.ul_y - self.pix.y
+            label.lr_x = page_label.lr_x - self.pix.x
+            label.lr_y = page_label.lr_y - self.pix.y
+            self.labels.append(label)
+        self.find_x1(WHITE)
+        self.find_x2(WHITE)
+        self.find_y1()
+        self.find_y2(WHITE)
+        self.make_measurements(WHITE, BLUE)
 
     # Get reporting date from page text.
     #
@@ -252,7 +387,8 @@ class NL_PDF_Processing(object):
 
         return found_dup
 
-    # Labels are the text labels for the vertical (load) axis.
+    # Labels are the text labels for the vertical (load) axis,
+    # in pixels of the whole rendered page.
     # They are distinguished from other text blocks by
     # - can be converted to an integer
     # - the integer is greater than or equal to 200
@@ -296,6 +432,25 @@ class NL_PDF_Processing(object):
     def search_down(self, start_pixel, background, edge):
         return self.search_pixels(start_pixel, background, DOWN, edge)
 
+    # Raises ValueError for pixels outside the page, as fitz does.
+    def check_pixel(self, x, y):
+        if (x < 0) or (x >= self.pix.width) or (y < 0) or (y >= self.pix.height):
+            raise ValueError("%s: Pixel (%d, %d) is outside the page." % (self.filepath, x, y))
+
+    # Returns the pixels from start_pixel to the edge of the page
+    # in direction, starting with start_pixel.
+    def get_pixel_line(self, start_pixel, direction):
+        x = int(start_pixel[0])
+        y = int(start_pixel[1])
+        self.check_pixel(x, y)
+        if direction == RIGHT:
+            return self.pixels[y, x:]
+        if direction == LEFT:
+            return self.pixels[y, x::-1]
+        if direction == DOWN:
+            return self.pixels[y:, x]
+        return self.pixels[y::-1, x]
+
     # Searches for a background/not background transition based on the
     # colour of the start_pixel.
     # 
@@ -306,36 +461,14 @@ class NL_PDF_Processing(object):
     # - B4_EDGE  - return last pixel before the transition
     # - AFT_EDGE - return the first pixel after the transition
     def search_pixels(self, start_pixel, background, direction, edge):
-        st_pix = self.pix.pixel(int(start_pixel[0]), int(start_pixel[1]))
-        match_background = True
-        for idx, pix_val in enumerate(st_pix):
-            if (pix_val != background[idx]):
-                match_background = False
-                break
-        found_it = INVALID
-        for srch_cnt in range(1, max(self.pix.width, self.pix.height)):
-            x = int(start_pixel[0]) + (srch_cnt * direction[0])
-            y = int(start_pixel[1]) + (srch_cnt * direction[1])
-            if (x < 0) or (x >= self.pix.width):
-                break
-            if (y < 0) or (y >= self.pix.height):
-                break
-            srch_pix = self.pix.pixel(x, y)
-            # INFW remove before submission
-            # print("x %d y %d pixel %s" % (x, y, str(srch_pix)))
-            srch_pix_is_bkgrnd = True
-            for idx, pix_val in enumerate(srch_pix):
-                if (pix_val != background[idx]):
-                    srch_pix_is_bkgrnd = False
-                    break
-            if (srch_pix_is_bkgrnd != match_background):
-                found_it = srch_cnt
-                if edge == B4_EDGE:
-                    found_it = found_it - 1
-                break
+        is_background = match_colour(self.get_pixel_line(start_pixel, direction), background)
+        changes = np.flatnonzero(is_background[1:] != is_background[0])
 
         rc = [INVALID, INVALID]
-        if found_it != INVALID:
+        if len(changes) != 0:
+            found_it = int(changes[0]) + 1
+            if edge == B4_EDGE:
+                found_it = found_it - 1
             rc = [start_pixel[0] + (found_it * direction[0]),
                   start_pixel[1] + (found_it * direction[1])]
         return rc
@@ -430,36 +563,48 @@ class NL_PDF_Processing(object):
         self.cal_y2.y = horiz_axis_start[1]
         self.cal_y2.value = float(top_label.value)
 
-    def colour_match(self, start_pixel, end_pixel, direction, line_colours):
-        if INVALID in start_pixel or INVALID in end_pixel:
-            return False
-
-        checks = []
-        pix_diff = int(max([abs(a - b) for a, b in zip(start_pixel, end_pixel)]))
-        found = False
-        for offset in range(0, pix_diff):
-            pixel = [int(a + offset*b) for a,b in zip(start_pixel, direction)]
-            pixel_colour = self.pix.pixel(pixel[0], pixel[1])
-
-            for colour in line_colours:
-                checks = [ a in range(b-3,b+4) for a, b in zip(pixel_colour, colour)]
-                if False not in checks:
-                    found = True
-                    break
-            if found:
-                break
-        return found and (len(checks) != 0)
+    # Searches up from start_pixel for a line in one of line_colours.
+    #
+    # The column above start_pixel is split into runs of background
+    # and not background pixels, as repeated calls to search_up() would
+    # find them.  Returns the first and last pixels of the first run,
+    # other than the run reaching the top of the page, with a pixel
+    # within COLOUR_TOLERANCE of a line colour, not counting the last
+    # pixel of each run.  Returns None if there is no such run.
+    def find_line_up(self, start_pixel, background, line_colours):
+        column = self.get_pixel_line(start_pixel, UP)
+        is_background = match_colour(column, background)
+        run_starts = np.flatnonzero(is_background[1:] != is_background[:-1]) + 1
+        if len(run_starts) < 2:
+            raise ValueError("%s: No line above (%d, %d)." %
+                             (self.filepath, start_pixel[0], start_pixel[1]))
+
+        is_line = np.zeros(len(column), dtype=bool)
+        for colour in line_colours:
+            is_line |= match_colour(column, colour, COLOUR_TOLERANCE)
+        is_line[:run_starts[0]] = False
+        is_line[run_starts - 1] = False
+        is_line[run_starts[-1]:] = False
+        found = np.flatnonzero(is_line)
+        if len(found) == 0:
+            return None
+
+        run = np.searchsorted(run_starts, found[0], side='right') - 1
+        first = int(run_starts[run])
+        last = int(run_starts[run + 1]) - 1
+        return ([start_pixel[0], start_pixel[1] - first],
+                [start_pixel[0], start_pixel[1] - last])
 
     def get_NL_UTC(self, time_in):
-        local = pytz.timezone("America/St_Johns")
         naive = datetime(time_in.year, time_in.month, time_in.day, time_in.hour)
-        local_dt = local.localize(naive, False)
-        return local_dt.astimezone(pytz.utc)
+        utc = get_local_time_table("America/St_Johns").to_utc(naive, False)
+        return utc.replace(tzinfo=pytz.utc)
 
     # Make measurements for each hour in the graph.
     #
     # Search up from the horizontal axis until a blue(ish) line
-    # is found.  The measurement is the center of the blue(ish) line.
+    # is found, see find_line_up().  The measurement is the center
+    # of the blue(ish) line.
     #
     # It may not be possible to get a measurement at the computed 'x'
     # coordinate for hour 0 or when daylight savings time starts,
@@ -482,32 +627,28 @@ class NL_PDF_Processing(object):
             if time_local.day != self.file_report_time.day:
                 break
             x_offset = 1
-            found = False
-            while (x_offset < self.pix.width) and not found:
-                start_pix = [self.cal_x1.x + int(float(time_local.hour) * pixels_per_hour) + x_offset,
+            line = None
+            while (x_offset < self.pix.width) and line is None:
+                axis_pix = [self.cal_x1.x + int(float(time_local.hour) * pixels_per_hour) + x_offset,
                             self.cal_x1.y - 1]
-                start_pix = self.search_up(start_pix, background, AFT_EDGE)
-                end_pix = self.search_up(start_pix, background, B4_EDGE)
-                while not self.colour_match(start_pix, end_pix, UP, LOAD_LINE_COLOURS):
-                    start_pix = self.search_up(end_pix, background, AFT_EDGE)
-                    end_pix = self.search_up(start_pix, background, B4_EDGE)
-                    if (start_pix[0] == INVALID) or (end_pix[0] == INVALID):
-                        x_offset += 1
-                        break
-                found = self.colour_match(start_pix, end_pix, UP, LOAD_LINE_COLOURS)
-            if not found:
+                line = self.find_line_up(axis_pix, background, LOAD_LINE_COLOURS)
+                if line is None:
+                    x_offset += 1
+            if line is None:
                 raise ValueError("%s: Could not make measurement for hour %d." % (self.filepath, hour))
+            start_pix, end_pix = line
             sample_y = float(start_pix[1] + end_pix[1])/2.0
             the_load = ((float(self.cal_y1.y) - sample_y) * value_per_pixel) + self.cal_y1.value
-            self.demand_file.add_mw_hour(self.filepath, hour, [self.filepath, hour,
-                                              time_utc.year, time_utc.month, time_utc.day, time_utc.hour,
-                                              time_local.year, time_local.month, time_local.day, time_local.hour, the_load])
+            self.readings.append([hour,
+                                  time_utc.year, time_utc.month, time_utc.day, time_utc.hour,
+                                  time_local.year, time_local.month, time_local.day, time_local.hour, the_load])
             # Annotate the measurement range and horizontal axis
-            self.add_horiz_line(start_pix, RED)
-            self.add_vert_line(start_pix, RED)
-            self.add_horiz_line(end_pix, RED)
-            self.add_vert_line(end_pix, RED)
-            self.add_vert_line([end_pix[0], self.cal_x1.y], RED)
+            if self.annotate:
+                self.add_horiz_line(start_pix, RED)
+                self.add_vert_line(start_pix, RED)
+                self.add_horiz_line(end_pix, RED)
+                self.add_vert_line(end_pix, RED)
+                self.add_vert_line([end_pix[0], self.cal_x1.y], RED)
 
             time_utc = time_utc + timedelta(hours=1)
             time_local = time_utc.replace(tzinfo=pytz.utc).astimezone(local_tz)
@@ -536,6 +677,13 @@ class NL_PDF_Processing(object):
         self.add_ex([self.cal_y1.x, self.cal_y1.y], BLACK)
         self.add_ex([self.cal_y2.x, self.cal_y2.y], BLACK)
 
+    # Sets a pixel of the pixmap, and of the pixel array, which
+    # is only read only when it shares the pixmap's samples.
+    def set_pixel(self, x, y, colour):
+        self.pix.setPixel(x, y, colour)
+        if self.pixels.flags.writeable:
+            self.pixels[y, x] = colour
+
     # Add a '+' like marking in the selected colour
     def add_cross(self, center_pixel, colour):
         if not self.annotate:
@@ -548,11 +696,11 @@ class NL_PDF_Processing(object):
         # Horizontal arm
         for x in range(center_x - arm_len_pixels, center_x + arm_len_pixels + 1):
             for y in range(center_y - arm_width_pixels, center_y + arm_width_pixels + 1):
-                self.pix.setPixel(x, y, colour)
+                self.set_pixel(x, y, colour)
         # Vertical arm
         for x in range(center_x - arm_width_pixels, center_x + arm_width_pixels+ 1):
             for y in range(center_y - arm_len_pixels, center_y + arm_len_pixels+ 1):
-                self.pix.setPixel(x, y, colour)
+                self.set_pixel(x, y, colour)
 
     # Add an 'X' like marking in the selected colour
     def add_ex(self, center_pixel, colour):
@@ -567,18 +715,18 @@ class NL_PDF_Processing(object):
         # Draw all four arms at the same time
         for arm_len in range(0, arm_len_pixels):
             for arm_width in range(0, (arm_width_pixels * 2) + 1):
-                self.pix.setPixel(center_x - arm_len - arm_width_pixels + arm_width,
-                                  center_y - arm_len,
-                                  colour)
-                self.pix.setPixel(center_x + arm_len - arm_width_pixels + arm_width,
-                                  center_y - arm_len,
-                                  colour)
-                self.pix.setPixel(center_x - arm_len - arm_width_pixels + arm_width,
-                                  center_y + arm_len,
-                                  colour)
-                self.pix.setPixel(center_x + arm_len - arm_width_pixels + arm_width,
-                                  center_y + arm_len,
-                                  colour)
+                self.set_pixel(center_x - arm_len - arm_width_pixels + arm_width,
+                               center_y - arm_len,
+                               colour)
+                self.set_pixel(center_x + arm_len - arm_width_pixels + arm_width,
+                               center_y - arm_len,
+                               colour)
+                self.set_pixel(center_x - arm_len - arm_width_pixels + arm_width,
+                               center_y + arm_len,
+                               colour)
+                self.set_pixel(center_x + arm_len - arm_width_pixels + arm_width,
+                               center_y + arm_len,
+                               colour)
 
     def add_horiz_line(self, center_pixel, colour):
         if not self.annotate:
@@ -589,7 +737,7 @@ class NL_PDF_Processing(object):
         center_y = int(center_pixel[1])
 
         for arm_pixel in range(center_x - line_len_pixels, center_x + line_len_pixels + 1):
-            self.pix.setPixel(arm_pixel, center_y, colour)
+            self.set_pixel(arm_pixel, center_y, colour)
 
     def add_vert_line(self, center_pixel, colour):
         if not self.annotate:
@@ -599,7 +747,7 @@ class NL_PDF_Processing(object):
         center_y = int(center_pixel[1])
 
         for arm_pixel in range(center_y - line_len_pixels, center_y + line_len_pixels + 1):
-            self.pix.setPixel(center_x, arm_pixel, colour)
+            self.set_pixel(center_x, arm_pixel, colour)
 
     def write_png_file(self):
         if not self.annotate:
@@ -610,6 +758,50 @@ class NL_PDF_Processing(object):
     def print_demand_file(self):
         self.demand_file.write_hourly_mw_file()
 
+# Returns the cached results of each file by file hash,
+# or an empty dictionary if cache_path cannot be read.
+def read_result_cache(cache_path):
+    try:
+        with open(cache_path, 'r') as cache_file:
+            cache = json.load(cache_file)
+        if cache.get("version") == CACHE_VERSION:
+            return cache["files"]
+        logging.info("Cache %s is out of date." % cache_path)
+    except (OSError, ValueError, KeyError):
+        pass
+    return {}
+
+def write_result_cache(cache_path, results):
+    temp_path = "%s.%d.tmp" % (cache_path, os.getpid())
+    try:
+        with open(temp_path, 'w') as cache_file:
+            json.dump({"version" : CACHE_VERSION, "files" : results}, cache_file)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        logging.warning("Could not write cache %s: %s" % (cache_path, str(e)))
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+# Cached results and the annotate flag for digitise_file,
+# set in each process before any files are digitised.
+_cached_results = {}
+_annotate = False
+
+def set_batch(cached_results, annotate):
+    global _cached_results, _annotate
+    _cached_results = cached_results
+    _annotate = annotate
+
+# Returns the filepath, file hash and result of digitising one
+# file, see NL_PDF_Processing.digitise(), and whether the result
+# came from the cache.
+def digitise_file(filepath):
+    file_hash = get_file_hash(filepath)
+    if file_hash in _cached_results:
+        return [filepath, file_hash, _cached_results[file_hash], True]
+    load = NL_PDF_Processing([], [], _annotate)
+    return [filepath, file_hash, load.digitise(filepath), False]
+
 def create_parser():
     parser = OptionParser(description="Fetches all Newfoundland and Labrador Daily Load Report Files.")
     parser.add_option('-f', '--filepath',
@@ -632,6 +824,16 @@ def create_parser():
             action = 'store_true', default = False,
             help = 'Print demand load file.',
             metavar = 'FLAG')
+    parser.add_option('-c', '--cache_file',
+            dest = 'cache_file',
+            action = 'store', type = 'string', default = "",
+            help = 'JSON file of the readings of each PDF, by file hash.',
+            metavar = 'FILE')
+    parser.add_option('-j', '--jobs',
+            dest = 'jobs',
+            action = 'store', type = 'int', default = 1,
+            help = 'Number of processes used to read PDF files.',
+            metavar = 'JOBS')
     return parser
 
 def main(argv = None):
@@ -646,9 +848,11 @@ def main(argv = None):
         print
         parser.print_help()
         return -1
+    if options.jobs < 1:
+        raise ValueError("Jobs must be at least 1, not %d." % options.jobs)
 
     load = NL_PDF_Processing(options.filepaths, options.directories, options.annotate)
-    load.process_files()
+    load.process_files(options.jobs, options.cache_file)
     if options.load:
         load.print_demand_file()
 
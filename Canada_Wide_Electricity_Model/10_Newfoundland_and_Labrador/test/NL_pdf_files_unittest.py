@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    Unit test for the NL_pdf_files file.
+
+    Pixels are small numpy arrays, so fitz is not needed.
+"""
+
+import sys
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from unittest import mock
+from datetime import datetime
+
+curdir = os.path.dirname(os.path.abspath(__file__))
+par_dir = os.path.split(curdir)[0]
+if par_dir not in sys.path:
+    sys.path.append(par_dir)
+com_dir = os.path.abspath(os.path.join(par_dir, "../Common"))
+if com_dir not in sys.path:
+    sys.path.append(com_dir)
+
+from NL_pdf_files import *
+
+class FakePixmap(object):
+    def __init__(self, pixels, x=0, y=0):
+        self.height, self.width, self.n = pixels.shape
+        self.samples = pixels.tobytes()
+        self.x = x
+        self.y = y
+
+class TestNLPixels(unittest.TestCase):
+
+    def get_load(self, pixels):
+        load = NL_PDF_Processing([], [], False)
+        load.filepath = "test.pdf"
+        load.pix = FakePixmap(pixels)
+        load.pixels = get_pixel_array(load.pix)
+        return load
+
+    # Returns a column of pixels, from colours listed bottom to top.
+    def get_column(self, colours):
+        return np.array(colours[::-1], dtype=np.uint8).reshape(len(colours), 1, 3)
+
+    def test_get_pixel_array(self):
+        pixels = np.arange(0, 2 * 3 * 3, dtype=np.uint8).reshape(2, 3, 3)
+        array = get_pixel_array(FakePixmap(pixels))
+        self.assertEqual(array.tolist(), pixels.tolist())
+        self.assertTrue(array.flags.writeable)
+
+    def test_match_colour(self):
+        pixels = np.array([[0, 0, 255], [3, 0, 252], [0, 4, 255], [0, 0, 251]], dtype=np.uint8)
+        self.assertEqual(match_colour(pixels, BLUE).tolist(), [True, False, False, False])
+        self.assertEqual(match_colour(pixels, BLUE, COLOUR_TOLERANCE).tolist(),
+                         [True, True, False, False])
+
+    def test_search_pixels(self):
+        row = np.array([[WHITE, WHITE, BLACK, BLACK, WHITE]], dtype=np.uint8)
+        load = self.get_load(row)
+        self.assertEqual(load.search_right([0, 0], WHITE, AFT_EDGE), [2, 0])
+        self.assertEqual(load.search_right([0, 0], WHITE, B4_EDGE), [1, 0])
+        self.assertEqual(load.search_right([2, 0], WHITE, AFT_EDGE), [4, 0])
+        self.assertEqual(load.search_right([2, 0], WHITE, B4_EDGE), [3, 0])
+        self.assertEqual(load.search_left([3, 0], WHITE, AFT_EDGE), [1, 0])
+        self.assertEqual(load.search_left([3, 0], WHITE, B4_EDGE), [2, 0])
+        # No transition before the edge of the page.
+        self.assertEqual(load.search_right([4, 0], WHITE, AFT_EDGE), [INVALID, INVALID])
+        self.assertEqual(load.search_left([1, 0], WHITE, B4_EDGE), [INVALID, INVALID])
+        self.assertRaises(ValueError, load.search_right, [5, 0], WHITE, AFT_EDGE)
+
+        load = self.get_load(self.get_column([WHITE, BLACK, BLACK, WHITE]))
+        self.assertEqual(load.search_up([0, 3], WHITE, AFT_EDGE), [0, 2])
+        self.assertEqual(load.search_up([0, 2], WHITE, B4_EDGE), [0, 1])
+        self.assertEqual(load.search_down([0, 1], WHITE, AFT_EDGE), [0, 3])
+        self.assertEqual(load.search_up([0, 0], WHITE, AFT_EDGE), [INVALID, INVALID])
+        self.assertRaises(ValueError, load.search_up, [0, INVALID], WHITE, AFT_EDGE)
+
+    def test_find_line_up(self):
+        # Runs of one pixel are never lines.
+        load = self.get_load(self.get_column([WHITE, BLUE, WHITE, BLUE, BLUE, WHITE]))
+        self.assertEqual(load.find_line_up([0, 5], WHITE, [BLUE]), ([0, 2], [0, 1]))
+        load = self.get_load(self.get_column([WHITE, BLUE, WHITE, WHITE]))
+        self.assertEqual(load.find_line_up([0, 3], WHITE, [BLUE]), None)
+
+        # The run reaching the top is not a line, nor is the run at
+        # the start, and any pixel of a run other than the last counts.
+        load = self.get_load(self.get_column([BLUE, BLUE, WHITE, BLACK, BLUE, BLACK,
+                                              WHITE, BLUE, BLUE]))
+        self.assertEqual(load.find_line_up([0, 8], WHITE, [BLUE]), ([0, 5], [0, 3]))
+        load = self.get_load(self.get_column([WHITE, BLACK, BLACK, WHITE, BLUE, BLUE]))
+        self.assertEqual(load.find_line_up([0, 5], WHITE, [BLUE]), None)
+
+        # Fewer than two runs.
+        load = self.get_load(self.get_column([WHITE, WHITE, WHITE]))
+        self.assertRaises(ValueError, load.find_line_up, [0, 2], WHITE, [BLUE])
+        load = self.get_load(self.get_column([WHITE, BLUE, BLUE]))
+        self.assertRaises(ValueError, load.find_line_up, [0, 2], WHITE, [BLUE])
+
+        # Line colours match within COLOUR_TOLERANCE.
+        for colour, found in [([3, 3, 252], True), ([0, 4, 255], False)]:
+            load = self.get_load(self.get_column([WHITE, colour, colour, WHITE, WHITE]))
+            line = load.find_line_up([0, 4], WHITE, [BLACK, BLUE])
+            self.assertEqual(line, ([0, 3], [0, 2]) if found else None)
+
+class FakeRect(object):
+    def __init__(self, x0, y0, x1, y1):
+        self.x0 = x0
+        self.y0 = y0
+        self.x1 = x1
+        self.y1 = y1
+
+class TestNLGraphClip(unittest.TestCase):
+
+    def get_label(self, value, ul_x, ul_y, lr_x, lr_y):
+        label = graph_label()
+        label.value = value
+        label.ul_x = ul_x
+        label.ul_y = ul_y
+        label.lr_x = lr_x
+        label.lr_y = lr_y
+        return label
+
+    def get_load(self, labels):
+        load = NL_PDF_Processing([], [], False)
+        load.filepath = "test.pdf"
+        load.page = mock.Mock()
+        load.page.rect = FakeRect(0, 0, 612, 792)
+        load.page_labels = labels
+        return load
+
+    def test_get_graph_clip(self):
+        # Label pixels are at twice the page scale, and the clip is
+        # rounded out to whole points.
+        load = self.get_load([self.get_label(1500, 101, 201, 141, 221),
+                              self.get_label(500, 99, 601, 141, 621)])
+        self.assertEqual(load.get_graph_clip(), [29, 80, 612, 331])
+
+        load = self.get_load([self.get_label(1500, 101, 20, 141, 40),
+                              self.get_label(500, 99, 1400, 141, 1560)])
+        self.assertEqual(load.get_graph_clip(), [29, 0, 612, 792])
+        load = self.get_load([self.get_label(1500, 30, 20, 70, 40),
+                              self.get_label(500, 30, 1400, 70, 1560)])
+        self.assertEqual(load.get_graph_clip(), None)
+
+    def test_digitise_whole_page(self):
+        load = self.get_load([self.get_label(1500, 101, 201, 141, 221),
+                              self.get_label(500, 99, 601, 141, 621)])
+        doc = mock.Mock()
+        doc.pages.return_value = [load.page]
+        doc.loadPage.return_value = load.page
+        clips = []
+
+        # Measuring the clip fails, after taking one reading.
+        def measure(clip):
+            clips.append(clip)
+            load.readings.append([len(clips)])
+            if clip is not None:
+                raise ValueError("Could not find x1.")
+
+        with mock.patch("NL_pdf_files.fitz") as fitz, \
+             mock.patch.object(load, "get_report_datetime", return_value=datetime(2017, 3, 12)), \
+             mock.patch.object(load, "find_labels", return_value=load.page_labels), \
+             mock.patch.object(load, "measure", side_effect=measure):
+            fitz.open.return_value = doc
+            result = load.digitise("test.pdf")
+        self.assertEqual(clips, [[29, 80, 612, 331], None])
+        self.assertEqual(result, {"date" : "2017-03-12", "readings" : [[2]], "error" : ""})
+
+class TestNLBatch(unittest.TestCase):
+    # Results of digitise() by file name.  The 12th has two revisions,
+    # and the first revision of the 13th could not be measured.
+    results = {"NL 2017-03-12.pdf" : ["2017-03-12", 100.0, ""],
+               "NL 2017-03-12 Rev2.pdf" : ["2017-03-12", 200.0, ""],
+               "NL 2017-03-13.pdf" : ["2017-03-13", 0.0, "Could not find x1."],
+               "NL 2017-03-13 Rev1.pdf" : ["2017-03-13", 300.0, ""],
+               "Summary.pdf" : [None, 0.0, ""]}
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.tempdir, "cache.json")
+        for filename in self.results:
+            with open(os.path.join(self.tempdir, filename), 'w') as the_file:
+                the_file.write(filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def digitise(self, load, filepath):
+        date, mw, error = self.results[os.path.basename(filepath)]
+        readings = []
+        if date is not None and error == "":
+            day = datetime.strptime(date, REPORT_DATE_FORMAT)
+            readings.append([0, day.year, day.month, day.day, 3,
+                             day.year, day.month, day.day, 0, mw])
+        return {"date" : date, "readings" : readings, "error" : error}
+
+    # Returns the processed files, and the number of files digitised.
+    def process(self, annotate=False, cache_path=None):
+        if cache_path is None:
+            cache_path = self.cache_path
+        load = NL_PDF_Processing([], [self.tempdir], annotate)
+        with mock.patch.object(NL_PDF_Processing, "digitise", autospec=True,
+                               side_effect=self.digitise) as digitise:
+            load.process_files(1, cache_path)
+        return load, digitise.call_count
+
+    def get_path(self, filename):
+        return os.path.join(self.tempdir, filename)
+
+    def test_process_files(self):
+        load, count = self.process()
+        self.assertEqual(count, 5)
+        # The newer revision of each day is kept, and files without
+        # a date skipped, along with the error of the older revision.
+        self.assertEqual(load.filepaths, [self.get_path("NL 2017-03-12 Rev2.pdf"),
+                                          self.get_path("NL 2017-03-13 Rev1.pdf")])
+        self.assertEqual(load.demand_file.get_mw_hours(datetime(2017, 3, 12, 3), 25).tolist()[0::24],
+                         [200.0, 300.0])
+
+        # Errors are not cached, so only that file is digitised again.
+        cache = read_result_cache(self.cache_path)
+        self.assertEqual(len(cache), 4)
+        self.assertFalse(get_file_hash(self.get_path("NL 2017-03-13.pdf")) in cache)
+        load, count = self.process()
+        self.assertEqual(count, 1)
+        self.assertEqual(load.demand_file.get_mw_hour(datetime(2017, 3, 12, 3)), 200.0)
+        self.assertEqual(load.demand_file.get_mw_hour(datetime(2017, 3, 13, 3)), 300.0)
+
+        # Every file is digitised when annotating.
+        load, count = self.process(annotate=True)
+        self.assertEqual(count, 5)
+
+        # Without a cache file, nothing is written.
+        os.remove(self.cache_path)
+        load, count = self.process(cache_path="")
+        self.assertEqual(count, 5)
+        self.assertFalse(os.path.exists(self.cache_path))
+
+    def test_process_files_error(self):
+        os.remove(self.get_path("NL 2017-03-13 Rev1.pdf"))
+        self.results = dict(self.results)
+        self.results["NL 2017-03-14.pdf"] = ["2017-03-14", 0.0, "Could not find y2."]
+        with open(self.get_path("NL 2017-03-14.pdf"), 'w') as the_file:
+            the_file.write("NL 2017-03-14.pdf")
+        with self.assertRaisesRegex(ValueError, "Could not find x1."):
+            self.process()
+
+    def test_result_cache(self):
+        self.assertEqual(read_result_cache(self.cache_path), {})
+        write_result_cache(self.cache_path, {"hash" : {"date" : None}})
+        self.assertEqual(read_result_cache(self.cache_path), {"hash" : {"date" : None}})
+        with open(self.cache_path, 'w') as cache_file:
+            json.dump({"version" : CACHE_VERSION + 1, "files" : {"hash" : {}}}, cache_file)
+        self.assertEqual(read_result_cache(self.cache_path), {})
+        with open(self.cache_path, 'w') as cache_file:
+            cache_file.write("Not JSON")
+        self.assertEqual(read_result_cache(self.cache_path), {})
+
+if __name__ == '__main__':
+    unittest.main()
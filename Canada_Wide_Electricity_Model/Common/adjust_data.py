@@ -19,3 +19,6 @@ class AdjustData(object):
         for data in data_set:
             updata.append((data * self.ratio) + self.abs_adj)
         return updata
+
+    def adjust_array(self, data_array):
+        return (data_array * self.ratio) + self.abs_adj
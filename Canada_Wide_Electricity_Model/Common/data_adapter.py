@@ -24,6 +24,7 @@ class data_adapter(object):
     def __init__(self, src_dir, trg_dir):
         self.src_dir = src_dir
         self.src_load = None
+        self.trg_load = None
         self.src_gen = None
         self.trg_gen = None
 
@@ -34,6 +35,7 @@ class data_adapter(object):
         except:
             logging.warning("Could not read '%s'" % self.src_load_path)
             self.src_load = DemandFile()
+        self.trg_load = self.src_load
 
         self.src_gen_path = os.path.join(os.path.abspath(src_dir), FILE_GEN_DB)
         self.trg_gen_path = os.path.join(os.path.abspath(trg_dir), FILE_GEN_DB)
@@ -50,13 +52,13 @@ class data_adapter(object):
     def scale_trg_load(self, adj):
         utc = self.src_load.min_time
         interval = self.src_load.max_time - utc
-        self.src_load.adjust_mw_hours(utc, interval, adj)
+        self.trg_load = self.src_load.scaled_view(utc, interval, adj)
 
     def update_trg_gen(self):
         self.trg_gen.copy_missing_data(self.src_gen)
 
     def write_load_file(self):
-        self.src_load.write_hourly_mw_file(filepath=self.trg_load_path)
+        self.trg_load.write_hourly_mw_file(filepath=self.trg_load_path)
 
     def write_gen_file(self):
         self.trg_gen.write_generator_file(filepath=self.trg_gen_path, write_hourly_files=True)
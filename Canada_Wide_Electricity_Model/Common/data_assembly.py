@@ -0,0 +1,532 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Assembles the load and generator data for each province.
+
+    Each step declares the files it reads, the files it writes, the
+    steps that must finish before it, and the commands that build it.
+    This replaces the ordering notes in run_load_data_assembly.sh
+    and run_gen_data_assembly.sh:
+    - each province's generator data is built after its load data
+    - Saskatchewan and Manitoba load is scaled from British Columbia
+    - Saskatchewan and Manitoba generation is copied from Alberta
+
+    A step is skipped when the SHA-256 of each of its input and
+    output files, and its commands, are the same as when it last
+    ran.  Changing one input file only rebuilds the steps that read
+    it, and the steps that read their outputs in turn.  Generator
+    steps scrape web pages, which are not files, so they only run
+    when their outputs are missing or with --force.
+
+    Steps whose inputs are ready run in parallel with --jobs.  Steps
+    whose scripts run their own process pools are given all of the
+    jobs as %(jobs)d, and run while no other step does, so that no
+    more than --jobs processes run at once.
+"""
+
+from optparse import OptionParser
+from collections import OrderedDict
+import sys
+import os
+import glob
+import json
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from hourly_cache import get_source_key, get_file_hash
+
+MODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATE_FILE = ".data_assembly_state.json"
+FORCE_ALL = "all"
+
+# Step results
+STEP_RAN = "ran"
+STEP_SKIPPED = "skipped"
+STEP_FAILED = "failed"
+STEP_BLOCKED = "blocked"
+STEP_OUT_OF_DATE = "out of date"
+
+# Runs a script with the current python, from the step directory.
+# stdout, if given, is written to that file once the script succeeds.
+# remove lists files, or patterns, deleted before the script runs.
+class AssemblyCommand(object):
+    def __init__(self, script, args=[], stdout=None, remove=[]):
+        self.script = script
+        self.args = list(args)
+        self.stdout = stdout
+        self.remove = list(remove)
+
+    # Text which changes when the command does.  Parameters such as
+    # the PVWatts key file are left unformatted.
+    def get_signature(self):
+        return " ".join([self.script] + self.args +
+                        ["> %s" % self.stdout if self.stdout else ""] +
+                        ["rm %s" % x for x in self.remove])
+
+    def run(self, cwd, params):
+        for pattern in self.remove:
+            for path in glob.glob(os.path.join(cwd, pattern)):
+                os.remove(path)
+        argv = [sys.executable, self.script] + [x % params for x in self.args]
+        logging.debug("Running %s in %s" % (" ".join(argv), cwd))
+        if self.stdout is None:
+            subprocess.run(argv, cwd=cwd, check=True)
+            return
+        # Keep the old output until the new one is complete.
+        out_path = os.path.join(cwd, self.stdout)
+        temp_path = "%s.%d.tmp" % (out_path, os.getpid())
+        try:
+            with open(temp_path, 'w') as outfile:
+                subprocess.run(argv, cwd=cwd, stdout=outfile, check=True)
+            os.replace(temp_path, out_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+class AssemblyStep(object):
+    def __init__(self, name, directory, commands, inputs, outputs, deps=[],
+                 parallel=False):
+        self.name = name
+        # Commands run from here, relative to the model directory.
+        self.directory = directory
+        self.commands = commands
+        # Files, or glob patterns, relative to the model directory.
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.deps = list(deps)
+        # Set when the commands run their own pool of %(jobs)d processes.
+        self.parallel = parallel
+
+    # Returns the number of jobs the step takes, of workers.
+    def get_jobs(self, workers):
+        if self.parallel:
+            return max(1, workers)
+        return 1
+
+    def get_signature(self):
+        return [x.get_signature() for x in self.commands]
+
+    def run(self, model_dir, params):
+        cwd = os.path.join(model_dir, self.directory)
+        for command in self.commands:
+            command.run(cwd, params)
+
+def _expand(model_dir, patterns):
+    paths = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = glob.glob(os.path.join(model_dir, pattern), recursive=True)
+            paths.extend(sorted(os.path.relpath(x, model_dir) for x in matches
+                                if os.path.isfile(x)))
+        else:
+            paths.append(pattern)
+    return list(OrderedDict.fromkeys(paths))
+
+# Returns the size, modification time and SHA-256 of each file,
+# or None for files which do not exist.  Files whose size and
+# modification time match known are not hashed again.
+def get_file_keys(model_dir, paths, known={}):
+    keys = OrderedDict()
+    for path in paths:
+        key = get_source_key(os.path.join(model_dir, path))
+        if key is not None:
+            old = known.get(path)
+            if (old is not None and old["size"] == key["size"] and
+                    old["mtime_ns"] == key["mtime_ns"]):
+                key["sha256"] = old["sha256"]
+            else:
+                key["sha256"] = get_file_hash(os.path.join(model_dir, path))
+        keys[path] = key
+    return keys
+
+def _same_hashes(keys, old_keys):
+    if list(keys.keys()) != list(old_keys.keys()):
+        return False
+    for path, key in keys.items():
+        old = old_keys[path]
+        if key is None or old is None:
+            if key is not old:
+                return False
+        elif key["sha256"] != old["sha256"]:
+            return False
+    return True
+
+def load_state(model_dir):
+    path = os.path.join(model_dir, STATE_FILE)
+    try:
+        with open(path, 'r') as state_file:
+            return json.load(state_file)
+    except (OSError, ValueError) as e:
+        logging.debug("No assembly state in %s: %s" % (path, str(e)))
+        return {}
+
+def save_state(model_dir, state):
+    path = os.path.join(model_dir, STATE_FILE)
+    temp_path = "%s.%d.tmp" % (path, os.getpid())
+    with open(temp_path, 'w') as state_file:
+        json.dump(state, state_file, indent=1, sort_keys=True)
+    os.replace(temp_path, path)
+
+# Returns the keys of the input files of step, and whether the step
+# is up to date with old, its entry in the saved state.
+def check_step(step, model_dir, old):
+    old = old or {}
+    inputs = get_file_keys(model_dir, _expand(model_dir, step.inputs),
+                           old.get("inputs", {}))
+    if not old or old.get("commands") != step.get_signature():
+        return inputs, False
+    if not _same_hashes(inputs, old["inputs"]):
+        return inputs, False
+    outputs = get_file_keys(model_dir, _expand(model_dir, step.outputs),
+                            old.get("outputs", {}))
+    if [x for x in outputs.values() if x is None]:
+        return inputs, False
+    # Outputs changed, or removed, by hand are built again.
+    if not _same_hashes(outputs, old["outputs"]):
+        return inputs, False
+    return inputs, True
+
+# Returns steps, in order, with the steps they depend on.
+def order_steps(steps):
+    by_name = OrderedDict((x.name, x) for x in steps)
+    ordered = OrderedDict()
+    visiting = set()
+
+    def visit(step):
+        if step.name in ordered:
+            return
+        if step.name in visiting:
+            raise ValueError("Step '%s' depends on itself." % step.name)
+        visiting.add(step.name)
+        for dep in step.deps:
+            if dep not in by_name:
+                raise ValueError("Step '%s' depends on unknown step '%s'." %
+                                 (step.name, dep))
+            visit(by_name[dep])
+        visiting.discard(step.name)
+        ordered[step.name] = step
+
+    for step in steps:
+        visit(step)
+    return list(ordered.values())
+
+# Returns the steps named by targets, or in the directories named by
+# targets, and the steps they depend on.  All steps if no targets.
+def select_steps(steps, targets):
+    if not targets:
+        return order_steps(steps)
+    by_name = OrderedDict((x.name, x) for x in steps)
+    selected = []
+    for target in targets:
+        target = target.rstrip("/")
+        matches = [x for x in steps if target in (x.name, x.name.split(":")[0])]
+        if not matches:
+            raise ValueError("Unknown step '%s'.  Steps are:\n%s" %
+                             (target, "\n".join(by_name.keys())))
+        selected.extend(matches)
+    needed = OrderedDict()
+    pending = list(selected)
+    while pending:
+        step = pending.pop()
+        if step.name in needed:
+            continue
+        needed[step.name] = step
+        pending.extend(by_name[x] for x in step.deps)
+    return [x for x in order_steps(steps) if x.name in needed]
+
+# Runs each out of date step, once the steps it depends on are done,
+# using up to workers jobs for the scripts.  A parallel step takes
+# all of them, so waits for running steps to finish, and steps after
+# it wait for it to start.  Steps named in force,
+# or all steps if force includes FORCE_ALL, are run even if up to date.
+# Returns an OrderedDict of step name to STEP_* result.  A dry run
+# returns STEP_OUT_OF_DATE for steps that would have run.
+def run_steps(steps, model_dir, params={}, workers=1, force=[], dry_run=False):
+    steps = order_steps(steps)
+    state = load_state(model_dir)
+    results = OrderedDict()
+    pending = list(steps)
+    running = {}
+    busy = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while pending or running:
+            for step in list(pending):
+                if [x for x in step.deps if x not in results]:
+                    continue
+                jobs = step.get_jobs(workers)
+                if busy and busy + jobs > max(1, workers):
+                    break
+                pending.remove(step)
+                dep_results = [results[x] for x in step.deps]
+                if [x for x in dep_results if x in (STEP_FAILED, STEP_BLOCKED)]:
+                    logging.warning("%s not run, as a step it needs failed." % step.name)
+                    results[step.name] = STEP_BLOCKED
+                    continue
+                inputs, current = check_step(step, model_dir, state.get(step.name))
+                forced = FORCE_ALL in force or step.name in force
+                # Nothing has been rebuilt by a dry run, so assume
+                # anything after a step which would run also would.
+                if dry_run and STEP_OUT_OF_DATE in dep_results:
+                    current = False
+                if current and not forced:
+                    logging.info("%s is up to date." % step.name)
+                    results[step.name] = STEP_SKIPPED
+                    continue
+                if dry_run:
+                    results[step.name] = STEP_OUT_OF_DATE
+                    continue
+                logging.info("Starting %s..." % step.name)
+                step_params = dict(params)
+                step_params["jobs"] = jobs
+                future = pool.submit(step.run, model_dir, step_params)
+                running[future] = (step, inputs, jobs)
+                busy += jobs
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                step, inputs, jobs = running.pop(future)
+                busy -= jobs
+                try:
+                    future.result()
+                except (OSError, subprocess.CalledProcessError) as e:
+                    logging.error("%s FAILURE! %s" % (step.name, str(e)))
+                    state.pop(step.name, None)
+                    save_state(model_dir, state)
+                    results[step.name] = STEP_FAILED
+                    continue
+                outputs = get_file_keys(model_dir, _expand(model_dir, step.outputs))
+                state[step.name] = {"commands" : step.get_signature(),
+                                    "inputs" : inputs,
+                                    "outputs" : outputs}
+                save_state(model_dir, state)
+                logging.info("%s SUCCESS!" % step.name)
+                results[step.name] = STEP_RAN
+    return OrderedDict((x.name, results[x.name]) for x in steps)
+
+# Steps for a year of PEI load or wind files.
+def _pei_steps(year, script, deps):
+    steps = []
+    for label, prefix, out, extra in [("load", "PEI_Load", "load_db", []),
+                                      ("wind", "PEI_Wind", "gen__wind", ["-n"])]:
+        if year != 2020:
+            label = "%s_%d" % (label, year)
+            out = "%s_%d" % (out, year)
+        csv_files = ["%s_%d_%02d.csv" % (prefix, year, month) for month in range(1, 13)]
+        args = ["-y", str(year)]
+        for csv_file in csv_files:
+            args.extend(["-c", csv_file])
+        steps.append(AssemblyStep("09_Prince_Edward_Island:" + label,
+            "09_Prince_Edward_Island",
+            [AssemblyCommand(script, args + extra, stdout=out + ".txt")],
+            ["09_Prince_Edward_Island/" + script] +
+            ["09_Prince_Edward_Island/" + x for x in csv_files],
+            ["09_Prince_Edward_Island/%s.txt" % out],
+            deps))
+    return steps
+
+# Province directory, wikipedia name and time zone for generator steps.
+GEN_PROVINCES = [
+    ("01_British_Columbia", "British_Columbia", "America/Vancouver"),
+    ("02_Alberta", "Alberta", "America/Edmonton"),
+    ("03_Saskatchewan", "Saskatchewan", "America/Regina"),
+    ("04_Manitoba", "Manitoba", "America/Winnipeg"),
+    ("05_Ontario", "Ontario", "America/Toronto"),
+    ("06_Quebec", "Quebec", "America/Montreal"),
+    ("07_New_Brunswick", "New_Brunswick", "America/Moncton"),
+    ("08_Nova_Scotia", "Nova_Scotia", "America/Halifax"),
+    ("09_Prince_Edward_Island", "Prince_Edward_Island", "America/Charlottetown"),
+    ("10_Newfoundland_and_Labrador", "Newfoundland_and_Labrador", "America/St_Johns"),
+]
+GEN_URL = "https://en.wikipedia.org/wiki/List_of_generating_stations_in_%s"
+# Derived from Alberta hourly generation data for now.
+GEN_FROM_ALBERTA = ["03_Saskatchewan", "04_Manitoba"]
+# Derived from British Columbia load data for now.
+LOAD_FROM_BC = ["03_Saskatchewan", "04_Manitoba"]
+LOAD_FROM_BC_RATIO = "0.3333333333"
+
+def get_load_steps():
+    steps = []
+    bc = "01_British_Columbia"
+    steps.append(AssemblyStep(bc + ":load", bc,
+        [AssemblyCommand("BC_Spreadsheet_Files.py", ["-a", "-j", "%(jobs)d"], stdout="load_db.txt")],
+        [bc + "/BC_Spreadsheet_Files.py", bc + "/*.xlsx"],
+        [bc + "/load_db.txt"], parallel=True))
+
+    ab = "02_Alberta"
+    ab_gen = ["gen__bio.txt", "gen__co.txt", "gen__res.txt",
+              "gen__pv_AB_actual.txt", "gen__wind.txt"]
+    ab_files = ["Hourly-Metered-Volumes-and-Pool-Price-and-AIL-01-2008-10-2020.xlsx",
+                "CSD-Assets.xlsx", "gen_db_AB_2019.txt"]
+    steps.append(AssemblyStep(ab + ":load", ab,
+        [AssemblyCommand("AB_Spreadsheet_File.py",
+                         ["-x", ab_files[0], "-a", ab_files[1], "-g", ab_files[2],
+                          "-p", "gen__pv_AB_actual.txt"],
+                         stdout="load_db.txt", remove=ab_gen)],
+        [ab + "/AB_Spreadsheet_File.py"] + [ab + "/" + x for x in ab_files],
+        [ab + "/load_db.txt"] + [ab + "/" + x for x in ab_gen]))
+
+    for province in LOAD_FROM_BC:
+        steps.append(AssemblyStep(province + ":load", ".",
+            [AssemblyCommand("Common/data_adapter.py",
+                             ["-s", bc, "-t", province, "-r", LOAD_FROM_BC_RATIO, "-l"],
+                             remove=[province + "/load_db.txt"])],
+            ["Common/data_adapter.py", bc + "/load_db.txt"],
+            [province + "/load_db.txt"],
+            [bc + ":load"]))
+
+    on = "05_Ontario"
+    steps.append(AssemblyStep(on + ":load", on,
+        [AssemblyCommand("ON_Spreadsheet_Files.py", ["-a", "-d"], stdout="load_db.txt")],
+        [on + "/ON_Spreadsheet_Files.py", on + "/*.csv"],
+        [on + "/load_db.txt"]))
+
+    pq = "06_Quebec"
+    pq_files = ["QuebecDemand_Partial_Lower_Line.csv",
+                "QuebecDemand_Partial_Lower_Line_ON_overlap.csv",
+                "QuebecDemand_Upper_Line.csv",
+                "QuebecDemand_Upper_Supplemental.csv",
+                "Quebec_Daily_Demand_Curve_2019_Jan_22.csv"]
+    steps.append(AssemblyStep(pq + ":load", pq,
+        [AssemblyCommand("PQ_Spreadsheet_Files.py",
+                         ["-i", pq_files[0], "-i", pq_files[1], "-a", pq_files[2],
+                          "-y", "2014", "-a", pq_files[3], "-c", pq_files[4]],
+                         stdout="load_db.txt")],
+        [pq + "/PQ_Spreadsheet_Files.py"] + [pq + "/" + x for x in pq_files],
+        [pq + "/load_db.txt"]))
+
+    nb = "07_New_Brunswick"
+    steps.append(AssemblyStep(nb + ":load", nb,
+        [AssemblyCommand("NB_Spreadsheet_Files.py", ["-a"], stdout="load_db.txt")],
+        [nb + "/NB_Spreadsheet_Files.py", nb + "/*.csv"],
+        [nb + "/load_db.txt"]))
+
+    ns = "08_Nova_Scotia"
+    for year, label, out in [(2020, "load", "load_db.txt"),
+                             (2021, "load_2021", "load_db_2021.txt")]:
+        steps.append(AssemblyStep(ns + ":" + label, ns,
+            [AssemblyCommand("NS_Spreadsheet_Files.py", ["-a", "-y", str(year)],
+                             stdout=out)],
+            [ns + "/NS_Spreadsheet_Files.py", ns + "/*_%d*.csv" % year],
+            [ns + "/" + out]))
+
+    steps.extend(_pei_steps(2020, "PEI_Spreadsheet_Files.py", []))
+    steps.extend(_pei_steps(2021, "PEI_Spreadsheet_Files.py", []))
+
+    nl = "10_Newfoundland_and_Labrador"
+    steps.append(AssemblyStep(nl + ":load", nl,
+        [AssemblyCommand("NL_pdf_files.py", ["-d", "../www.pub.nl.ca", "-l",
+                                             "-c", "NL_pdf_cache.json", "-j", "%(jobs)d"],
+                         stdout="load_db.txt")],
+        [nl + "/NL_pdf_files.py", "www.pub.nl.ca/**/*.pdf"],
+        [nl + "/load_db.txt"], parallel=True))
+    return steps
+
+# Generator steps depend on load_steps, for their own province
+# and Alberta's hourly generation files.
+def get_gen_steps(load_steps):
+    steps = []
+    ghg_base = "Common/gen_db_GHG.txt"
+    for province, wiki_name, tz_str in GEN_PROVINCES:
+        deps = [x.name for x in load_steps if x.name.split(":")[0] == province]
+        inputs = ["Common/generator_data_gathering.py", "Common/solar_data_gathering.py",
+                  ghg_base]
+        outputs = [province + "/gen_db.txt", province + "/gen__pv.txt"]
+        scrape = AssemblyCommand("Common/generator_data_gathering.py",
+                                 ["-u", GEN_URL % wiki_name, "-t", tz_str,
+                                  "-k", "%(key_file)s", "-s", province + "/gen__pv.txt",
+                                  "-g", ghg_base],
+                                 stdout=province + "/gen_db.txt")
+        commands = [scrape]
+        if province in GEN_FROM_ALBERTA:
+            # As in run_gen_data_assembly.sh, Saskatchewan removes its
+            # hourly files before scraping, Manitoba after.
+            remove = [province + "/gen__*.txt"]
+            if province == "03_Saskatchewan":
+                scrape.remove = remove
+                remove = []
+            commands.append(AssemblyCommand("Common/data_adapter.py",
+                                            ["-s", "02_Alberta", "-t", province, "-g"],
+                                            remove=remove))
+            inputs.extend(["Common/data_adapter.py", "02_Alberta/gen_db.txt",
+                           "02_Alberta/gen__*.txt"])
+            outputs.append(province + "/gen__*.txt")
+            deps.extend(["02_Alberta:load", "02_Alberta:gen"])
+        steps.append(AssemblyStep(province + ":gen", ".", commands, inputs, outputs,
+                                  deps))
+    return steps
+
+def get_steps():
+    load_steps = get_load_steps()
+    return load_steps + get_gen_steps(load_steps)
+
+def create_parser():
+    parser = OptionParser(usage="%prog [options] [step or province ...]",
+            description="Assemble load and generator data, "
+                        "running only the steps whose input files changed.")
+    parser.add_option('-m', '--model_dir',
+            dest = 'model_dir',
+            action = 'store', type = 'string', default = MODEL_DIR,
+            help = 'Directory containing the province directories.',
+            metavar = 'DIR')
+    parser.add_option('-k', '--keyfile',
+            dest = 'key_file',
+            action = 'store', type = 'string', default = "DEMO_KEY",
+            help = "File whose first line is a user key for PVWatts.",
+            metavar = 'FILE')
+    parser.add_option('-j', '--jobs',
+            dest = 'jobs',
+            action = 'store', type = 'int', default = 1,
+            help = 'Number of steps, or processes of a parallel step, run at once.',
+            metavar = 'JOBS')
+    parser.add_option('-f', '--force',
+            dest = 'force',
+            action = 'append', type = 'string', default = [],
+            help = "Run a step even if it is up to date, or '%s'." % FORCE_ALL,
+            metavar = 'STEP')
+    parser.add_option('-n', '--dry_run',
+            dest = 'dry_run',
+            action = 'store_true', default = False,
+            help = 'Report which steps would run, without running them.',
+            metavar = 'FLAG')
+    parser.add_option('-l', '--list',
+            dest = 'list_steps',
+            action = 'store_true', default = False,
+            help = 'List the steps and the steps each depends on.',
+            metavar = 'FLAG')
+    return parser
+
+def main(argv = None):
+    logging.basicConfig(level=logging.INFO)
+
+    parser = create_parser()
+    if argv is None:
+        argv = sys.argv[1:]
+
+    (options, argv) = parser.parse_args(argv)
+    if options.jobs < 1:
+        raise ValueError("Jobs must be at least 1, not %d." % options.jobs)
+
+    steps = get_steps()
+    names = [x.name for x in steps] + [FORCE_ALL]
+    for name in options.force:
+        if name not in names:
+            raise ValueError("Unknown step '%s'." % name)
+    steps = select_steps(steps, argv)
+    if options.list_steps:
+        for step in steps:
+            print("%s %s" % (step.name, " ".join(step.deps)))
+        return 0
+
+    results = run_steps(steps, options.model_dir,
+                        params={"key_file" : options.key_file},
+                        workers=options.jobs, force=options.force,
+                        dry_run=options.dry_run)
+    for name, result in results.items():
+        print("%-40s %s" % (name, result))
+    if [x for x in results.values() if x in (STEP_FAILED, STEP_BLOCKED)]:
+        return -1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -26,7 +26,7 @@ from hourly_mw_file import HourlyMWFile
 
 class DemandFile(HourlyMWFile):
 
-    def __init__(self, file_path = ""):
+    def __init__(self, file_path = "", window=None):
         super(DemandFile, self).__init__(file_path="")
         file_header_prefix = "File, LineNum, "
         self.file_header = file_header_prefix + self.file_header
@@ -34,7 +34,7 @@ class DemandFile(HourlyMWFile):
 
         if not os.path.isfile(file_path):
             return
-        self.read_hourly_mw_file(file_path)
+        self.read_hourly_mw_file(file_path, window)
 
 def create_parser():
     parser = OptionParser(description="Demand file support.")
@@ -0,0 +1,399 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Merit order dispatch of generation to meet demand.
+
+    All hours in the run are dispatched at once.
+    The MW available from each fuel is held in a fuels by hours array.
+    Fuels are dispatched in order of increasing GHG emissions
+    until the demand for each hour is met.
+
+    Results match generator_file.get_total_capacity and
+    generator_file.get_ghg_emissions called for each hour,
+    unless the generators include FUEL_STORAGE.
+
+    Storage is run once the hours have been dispatched without it.
+    It charges from non fossil capacity that is not needed, and
+    discharges into hours that use fossil fuels or are short.
+    The hours are then dispatched again, with the load increased by
+    charging and decreased by discharging, so storage replaces the
+    highest emitting generation.  See storage.py.
+
+    After a run, delta_run changes the capacity of some fuels and
+    dispatches again only the hours whose results can change: those
+    where a changed fuel is dispatched, or where the MW served changes.
+    undo puts back the results of the run, so many changes can be
+    tried against one dispatch.  Runs with storage are dispatched again
+    in full, as storage links every hour to the hours after it.
+
+    The marginal fuel of each hour, which would generate one more MW
+    of load, is found along with the dispatch, so marginal emissions
+    need no runs with the load changed.
+"""
+
+import sys
+import os
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import numpy as np
+from ymdh_data import hours_in
+from storage import Storage, STORAGE_HOURS, STORAGE_EFFICIENCY
+from common_defs import *
+
+# MW difference allowed for rounding
+MW_TOLERANCE = 1e-6
+
+# Results changed by delta_run for the hours it dispatches again
+HOUR_NAMES = ["capacity", "mw", "ghg", "dispatched", "before", "unserved",
+              "served", "hour_ghg", "hour_fossil_ghg", "marginal", "marginal_ghg"]
+# All results of a run
+RESULT_NAMES = HOUR_NAMES + ["fuels", "charge", "discharge", "stored", "totals"]
+
+# Returns the fuels of ghg, {fuel : GHG per MWh} in generator file
+# order, in merit order, as generator_file.get_merit_order.  Storage
+# is left out, as it is dispatched separately.
+def get_merit_fuels(ghg):
+    return [fuel for fuel in sorted(ghg.keys(), key=lambda fuel: ghg[fuel])
+            if fuel != FUEL_STORAGE]
+
+# Dispatches fuels, in merit order, to meet load each hour.  avail
+# has a row of the MW available from each fuel, in merit order, and
+# capacity is the MW that can be generated each hour.  Returns the
+# MW of each fuel, whether each fuel was dispatched, and the MW
+# dispatched before each fuel, each hour, and the MW not served.
+def dispatch_merit_order(load, avail, capacity):
+    short = load > capacity
+    served = np.where(short, capacity, load)
+    shape = (len(avail), len(load))
+    mw = np.zeros(shape)
+    dispatched = np.zeros(shape, dtype=np.bool_)
+    before = np.zeros(shape)
+    gen_mw = np.zeros(len(load))
+    for row in range(len(avail)):
+        before[row] = gen_mw
+        active = gen_mw < served
+        mw[row] = np.where(active, np.minimum(avail[row], served - gen_mw), 0.0)
+        dispatched[row] = active
+        gen_mw = gen_mw + mw[row]
+    unserved = np.where(short, load - capacity, 0.0)
+    return mw, dispatched, before, unserved
+
+# Runs storage over dispatched hours.  Storage charges where clean,
+# the MW of non fossil capacity, is more than load, and discharges
+# into need, the MW of fossil fuels and not served.  Returns the MW
+# charged and discharged, the MWh stored, and the load changed by
+# charging and discharging, to be dispatched again.
+def run_storage(storage, load, clean, need):
+    charge, discharge, stored = storage.run(np.maximum(clean - load, 0.0), need)
+    return charge, discharge, stored, load + charge - discharge
+
+class Dispatch(object):
+    def __init__(self, demand, generator, storage_hours=STORAGE_HOURS,
+                 storage_efficiency=STORAGE_EFFICIENCY):
+        self.demand = demand
+        self.generator = generator
+        self.storage_hours = storage_hours
+        self.storage_efficiency = storage_efficiency
+        self.start_utc = None
+        self.hours = 0
+        self.fuels = []
+        self.load = np.empty(0)
+        self.capacity = np.empty(0)
+        self.served = np.empty(0)
+        self.unserved = np.empty(0)
+        self.mw = np.empty((0, 0))
+        self.ghg = np.empty((0, 0))
+        self.dispatched = np.empty((0, 0), dtype=np.bool_)
+        self.hour_ghg = np.empty(0)
+        self.hour_fossil_ghg = np.empty(0)
+        # Row in fuels of the fuel that would generate one more MW,
+        # -1 if load is not all served, and its GHG per MWh, each hour
+        self.marginal = np.empty(0, dtype=int)
+        self.marginal_ghg = np.empty(0)
+        # MW charged and discharged, and MWh stored, each hour
+        self.charge = np.empty(0)
+        self.discharge = np.empty(0)
+        self.stored = np.empty(0)
+        self.totals = (0.0, 0.0, 0.0, 0.0, 0, 0.0)
+
+        # State kept for delta_run.  Fuels other than storage, in merit
+        # order, with their capacity, the MW available each hour, the
+        # MW available up to capacity, and the MW dispatched before
+        # each fuel each hour.
+        self.merit_fuels = []
+        self.fuel_mw = np.empty(0)
+        self.avail = np.empty((0, 0))
+        self.capped = np.empty((0, 0))
+        self.before = np.empty((0, 0))
+        # Rows of capped in generator file order, as generator_file
+        # adds up capacity.
+        self.capacity_rows = []
+        self.storage_mw = 0.0
+        self.last_delta = None
+
+    def _get_availability(self, fuels):
+        avail = np.empty((len(fuels), self.hours))
+        for row, fuel in enumerate(fuels):
+            avail[row] = self.generator.get_hourly_mw(fuel, self.start_utc, self.hours)
+        return avail
+
+    # Returns the MW that can be generated each hour in cols, by all
+    # fuels or only by non fossil fuels.  Storage is not included.
+    def _get_capacity(self, fossil=True, cols=slice(None)):
+        capacity = np.zeros(self.capped[:, cols].shape[1])
+        for row in self.capacity_rows:
+            if not (fossil or not get_fossil_fuel(self.merit_fuels[row])):
+                continue
+            capacity = capacity + self.capped[row, cols]
+        return capacity
+
+    def _get_storage(self):
+        if self.storage_mw <= 0.0:
+            return None
+        return Storage(self.storage_mw, self.storage_hours, self.storage_efficiency)
+
+    def _get_time(self, hour):
+        return self.start_utc + timedelta(hours=int(hour))
+
+    # Dispatches fuels, in merit order, to meet load each hour.
+    # Returns MW and GHG for each fuel, whether each fuel was
+    # dispatched, the MW dispatched before each fuel, and the MW
+    # not served, each hour.
+    def _dispatch(self, load, avail, capacity):
+        mw, dispatched, before, unserved = dispatch_merit_order(load, avail, capacity)
+        ghg = np.zeros(mw.shape)
+        for row, fuel in enumerate(self.merit_fuels):
+            ghg[row] = mw[row] * self.generator.gen_db[fuel].ghg
+        return mw, ghg, dispatched, before, unserved
+
+    # Runs storage, then dispatches again with the load changed by
+    # charging and discharging.  Storage is added to the fuels, in
+    # its merit order, with charging as negative MW.
+    def _run_storage(self, storage):
+        fossil = np.array([bool(get_fossil_fuel(fuel)) for fuel in self.fuels],
+                          dtype=np.bool_)
+        need = self.mw[fossil].sum(axis=0) + self.unserved
+        self.charge, self.discharge, self.stored, load = run_storage(
+                storage, self.load, self._get_capacity(fossil=False), need)
+        if self.charge.any() or self.discharge.any():
+            self.mw, self.ghg, self.dispatched, _, self.unserved = self._dispatch(
+                    load, self.avail, self.capacity)
+
+        row = self.generator.get_merit_order().index(FUEL_STORAGE)
+        mw = self.discharge - self.charge
+        self.fuels.insert(row, FUEL_STORAGE)
+        self.mw = np.insert(self.mw, row, mw, axis=0)
+        self.ghg = np.insert(self.ghg, row, self.discharge * self.generator.gen_db[FUEL_STORAGE].ghg,
+                             axis=0)
+        self.dispatched = np.insert(self.dispatched, row, mw != 0.0, axis=0)
+
+    # Dispatch hours from start_utc up to, but not including, end_utc.
+    def run(self, start_utc, end_utc):
+        self.start_utc = start_utc
+        if end_utc > start_utc:
+            self.hours = hours_in(end_utc - start_utc)
+        else:
+            self.hours = 0
+        self.load = np.array(self.demand.get_mw_hours(start_utc, self.hours))
+
+        # Storage is dispatched separately, see _run_storage.
+        gen_db = self.generator.gen_db
+        self.merit_fuels = get_merit_fuels(OrderedDict((fuel, gen.ghg)
+                                                       for fuel, gen in gen_db.items()))
+        self.fuel_mw = np.array([gen_db[fuel].mw for fuel in self.merit_fuels])
+        self.avail = self._get_availability(self.merit_fuels)
+        self.capped = np.minimum(self.avail, self.fuel_mw.reshape(-1, 1))
+        self.capacity_rows = [self.merit_fuels.index(fuel) for fuel in gen_db.keys()
+                              if fuel != FUEL_STORAGE]
+        self.storage_mw = 0.0
+        if FUEL_STORAGE in gen_db:
+            self.storage_mw = gen_db[FUEL_STORAGE].mw
+        self.last_delta = None
+        return self._run()
+
+    # Dispatches all hours from the availability already found.
+    def _run(self):
+        self.capacity = self._get_capacity()
+        self.fuels = list(self.merit_fuels)
+        self.mw, self.ghg, self.dispatched, self.before, self.unserved = self._dispatch(
+                self.load, self.avail, self.capacity)
+        self.charge = np.zeros(self.hours)
+        self.discharge = np.zeros(self.hours)
+        self.stored = np.zeros(self.hours)
+        storage = self._get_storage()
+        if storage is not None and self.hours:
+            self._run_storage(storage)
+
+        self.served = np.empty(self.hours)
+        self.hour_ghg = np.empty(self.hours)
+        self.hour_fossil_ghg = np.empty(self.hours)
+        self.marginal = np.empty(self.hours, dtype=int)
+        self.marginal_ghg = np.empty(self.hours)
+        self._set_hours(slice(None))
+        return self._set_totals()
+
+    # Sets the MW served and the GHG for the hours in cols.
+    def _set_hours(self, cols):
+        unserved = self.unserved[cols]
+        load = self.load[cols]
+        self.served[cols] = np.where(unserved > 0.0, load - unserved, load)
+        hour_ghg = np.zeros(len(load))
+        hour_fossil_ghg = np.zeros(len(load))
+        for row, fuel in enumerate(self.fuels):
+            hour_ghg = hour_ghg + self.ghg[row, cols]
+            if get_fossil_fuel(fuel):
+                hour_fossil_ghg = hour_fossil_ghg + self.ghg[row, cols]
+        self.hour_ghg[cols] = hour_ghg
+        self.hour_fossil_ghg[cols] = hour_fossil_ghg
+
+        # Fuels before the marginal fuel generate all they can, so it
+        # is the first with MW left.  Storage is never marginal.
+        gen_rows = np.array([self.fuels.index(fuel) for fuel in self.merit_fuels], dtype=int)
+        marginal = np.full(len(load), -1)
+        if len(gen_rows):
+            left = self.mw[:, cols][gen_rows] < self.avail[:, cols]
+            found = left.any(axis=0) & ~(unserved > 0.0)
+            marginal = np.where(found, gen_rows[np.argmax(left, axis=0)], -1)
+        # Row -1 picks the NaN at the end.
+        ghg = np.array([self.generator.gen_db[fuel].ghg for fuel in self.fuels] + [np.nan])
+        self.marginal[cols] = marginal
+        self.marginal_ghg[cols] = ghg[marginal]
+
+    def _set_totals(self):
+        self._check_values()
+
+        # Running totals are accumulated in time order, so that
+        # the totals are the same as adding one hour at a time.
+        req_MWh = self._total(self.load)
+        gen_MWh = self._total(self.served)
+        ghg = self._total(self.hour_ghg)
+        f_ghg = self._total(self.hour_fossil_ghg)
+        short = self.unserved > 0.0
+        brown_hours = int(np.count_nonzero(short))
+        brown_diff = 0.0
+        if brown_hours:
+            brown_diff = max(brown_diff, float(np.max(self.unserved[short])))
+        self.totals = (req_MWh, gen_MWh, ghg, f_ghg, brown_hours, brown_diff)
+        return self.totals
+
+    # Returns the MW available from fuel at capacity mw.  Hourly
+    # data is scaled by the change in capacity, as Scenario does.
+    def _scale_availability(self, fuel, mw):
+        gen_mw = self.generator.gen_db[fuel].mw
+        hourly = self.generator.get_hourly_mw(fuel, self.start_utc, self.hours)
+        if mw == gen_mw:
+            return np.array(hourly, dtype=float)
+        if (hourly == gen_mw).all():
+            return np.full(self.hours, float(mw))
+        if gen_mw == 0.0:
+            raise ValueError("Cannot scale %s hourly data from 0 MW." % fuel)
+        return hourly * (mw / gen_mw)
+
+    # Changes the capacity of fuels, given as {fuel : MW}, after run.
+    # Only hours where a changed fuel's output may change, as it is
+    # dispatched or the MW served changes, are dispatched again.
+    # With storage, all hours are.  Returns the totals, as run does.
+    def delta_run(self, changes):
+        for fuel, mw in changes.items():
+            if mw < 0.0:
+                raise ValueError("%s capacity would be %f MW." % (fuel, mw))
+            if fuel not in self.generator.gen_db:
+                raise ValueError("%s is not in the dispatch." % fuel)
+
+        # Inputs are kept so that undo can put them back.
+        rows = [self.merit_fuels.index(fuel) for fuel in changes.keys() if fuel != FUEL_STORAGE]
+        delta = {"rows" : rows, "fuel_mw" : self.fuel_mw[rows], "avail" : self.avail[rows],
+                 "capped" : self.capped[rows], "storage_mw" : self.storage_mw,
+                 "results" : None, "cols" : None}
+        self.last_delta = delta
+        changed = np.zeros(self.hours, dtype=np.bool_)
+        drop = np.zeros(self.hours)
+        for fuel, mw in changes.items():
+            if fuel == FUEL_STORAGE:
+                self.storage_mw = float(mw)
+                continue
+            row = self.merit_fuels.index(fuel)
+            avail = self._scale_availability(fuel, mw)
+            capped = np.minimum(avail, mw)
+            changed |= (avail != self.avail[row]) | (capped != self.capped[row])
+            drop = drop + np.maximum(self.capped[row] - capped, 0.0)
+            self.fuel_mw[row] = mw
+            self.avail[row] = avail
+            self.capped[row] = capped
+
+        # A fuel's output can only change where it was dispatched, or
+        # where the MW served changes as load is more than capacity.
+        # Capacity found from drop can differ from the sum of fuels by
+        # rounding, so hours within MW_TOLERANCE are dispatched again,
+        # as are hours with NaN values.
+        marginal = (self.before[rows] < self.served).any(axis=0)
+        short = ~(self.load + MW_TOLERANCE <= self.capacity - drop)
+        cols = np.flatnonzero(changed & (marginal | short))
+
+        # Picking out more than a quarter of the hours is slower than
+        # dispatching them all.  _run makes new result arrays, so the
+        # old ones are kept as they are.
+        if (self._get_storage() is not None or delta["storage_mw"] > 0.0 or
+                4 * len(cols) > self.hours):
+            delta["results"] = dict((name, getattr(self, name)) for name in RESULT_NAMES)
+            return self._run()
+
+        capacity = self._get_capacity(cols=cols)
+        delta["totals"] = self.totals
+        for name in HOUR_NAMES:
+            delta[name] = getattr(self, name)[..., cols]
+        delta["cols"] = cols
+        self.capacity[cols] = capacity
+        (self.mw[:, cols], self.ghg[:, cols], self.dispatched[:, cols],
+         self.before[:, cols], self.unserved[cols]) = self._dispatch(
+                self.load[cols], self.avail[:, cols], capacity)
+        self._set_hours(cols)
+        return self._set_totals()
+
+    # Puts back the state from before the last delta_run, even if
+    # it raised an error.
+    def undo(self):
+        delta = self.last_delta
+        if delta is None:
+            return
+        self.last_delta = None
+        rows = delta["rows"]
+        self.fuel_mw[rows] = delta["fuel_mw"]
+        self.avail[rows] = delta["avail"]
+        self.capped[rows] = delta["capped"]
+        self.storage_mw = delta["storage_mw"]
+        if delta["results"] is not None:
+            for name, value in delta["results"].items():
+                setattr(self, name, value)
+        elif delta["cols"] is not None:
+            cols = delta["cols"]
+            for name in HOUR_NAMES:
+                getattr(self, name)[..., cols] = delta[name]
+            self.totals = delta["totals"]
+
+    def _total(self, values):
+        if len(values) == 0:
+            return 0.0
+        return float(np.cumsum(values)[-1])
+
+    # Report the first hour that could not be dispatched.
+    def _check_values(self):
+        bad_load = np.flatnonzero(np.isnan(self.load))
+        bad_ghg = np.flatnonzero((np.isnan(self.ghg) & self.dispatched).any(axis=0))
+        if len(bad_load) and (len(bad_ghg) == 0 or bad_load[0] <= bad_ghg[0]):
+            raise ValueError("No load for UTC %s" %
+                             self._get_time(bad_load[0]).strftime(DATE_FORMAT))
+        if len(bad_ghg):
+            hour = bad_ghg[0]
+            row = np.flatnonzero(np.isnan(self.ghg[:, hour]) & self.dispatched[:, hour])[0]
+            raise ValueError("%s %s ghg is NaN!" %
+                             (self._get_time(hour).strftime(DATE_FORMAT), self.fuels[row]))
+
+    # Returns the MW and GHG dispatched from each fuel for an hour.
+    def get_hour(self, hour):
+        gen_db = {}
+        for row, fuel in enumerate(self.fuels):
+            if self.dispatched[row, hour]:
+                gen_db[fuel] = [float(self.mw[row, hour]), float(self.ghg[row, hour])]
+        return gen_db
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Searches for the smallest, or cheapest, build of low emission
+    capacity that brings a grid's fossil fuel emissions down to a
+    target, with no hours short of supply.
+
+    The hourly arrays of the grid are taken once, as for scenarios.
+    Capacity is added one step at a time, to whichever fuel removes
+    the most fossil emissions per unit cost.  Until all load is
+    served, each MWh not served counts as UNSERVED_GHG_MWh of
+    emissions.  Once the target is met, steps that are no longer
+    needed are removed, most costly fuel first.
+
+    Added capacity can only reduce the load left for fossil fuels
+    in each hour, so each candidate build is dispatched only for the
+    hours that used fossil fuels or were short before the last step.
+    Storage is run over all hours, as it charges in the other hours.
+
+    Builds are given as FUEL or FUEL=COST, the cost of each MW.
+    Fuels that are not in the grid take their GHG_MWh from
+    gen_db_GHG.txt.
+"""
+
+import sys
+import os
+import logging
+from collections import OrderedDict
+import numpy as np
+from adjust_data import AdjustData
+from dispatch import Dispatch, get_merit_fuels, dispatch_merit_order, run_storage
+from storage import Storage, STORAGE_HOURS, STORAGE_EFFICIENCY
+from generator_file import generator_file
+from scenario import Scenario, ScenarioBase
+
+from common_defs import *
+
+GHG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gen_db_GHG.txt")
+BUILD_FUELS = [FUEL_WIND, FUEL_SOLAR_PV, FUEL_NUCLEAR, FUEL_STORAGE]
+# MW added to a fuel in each step of the search
+BUILD_STEP = 100.0
+# Serving all load comes before reducing emissions.
+UNSERVED_GHG_MWh = 10000.0
+MAX_STEPS = 10000
+
+# Returns the fuel and cost per MW of a build, FUEL or FUEL=COST.
+def parse_build(text):
+    toks = text.split("=")
+    fuel = toks[0].strip()
+    if fuel not in MAPPING_KEYWORDS or len(toks) > 2:
+        raise ValueError("Build should be FUEL or FUEL=COST, not '%s'." % text)
+    if get_fossil_fuel(fuel):
+        raise ValueError("Cannot build %s, it is a fossil fuel." % fuel)
+    cost = 1.0
+    if len(toks) == 2:
+        try:
+            cost = float(toks[1])
+        except ValueError:
+            raise ValueError("Build should be FUEL or FUEL=COST, not '%s'." % text)
+        if cost <= 0.0:
+            raise ValueError("%s cost must be more than 0, not %f." % (fuel, cost))
+    return fuel, cost
+
+# Returns why fuel cannot be built in the grid of base, or "".
+def get_build_error(base, fuel):
+    if fuel in base.gen_db:
+        gen = base.gen_db[fuel]
+        if gen.hourly is not None and gen.mw == 0.0:
+            return "Cannot scale %s hourly data from 0 MW." % fuel
+    elif get_filename(fuel) != "":
+        return "%s is not in the grid, so has no hourly data." % fuel
+    return ""
+
+# Totals of a candidate build, for the hours dispatched.
+class BuildResult(object):
+    def __init__(self, fossil_ghg, unserved, brown_hours, active):
+        self.fossil_ghg = fossil_ghg
+        self.unserved = unserved
+        self.brown_hours = brown_hours
+        # Hours that need fossil fuels, or are short, before storage
+        self.active = active
+
+class CapacitySearch(object):
+    def __init__(self, base, target_ghg, costs, step=BUILD_STEP,
+                 storage_hours=STORAGE_HOURS, storage_efficiency=STORAGE_EFFICIENCY):
+        if step <= 0.0:
+            raise ValueError("Build step must be more than 0, not %f MW." % step)
+        if costs == {}:
+            raise ValueError("No fuels to build.")
+        self.base = base
+        self.target_ghg = target_ghg
+        self.costs = OrderedDict(costs)
+        self.step = step
+        self.storage_hours = storage_hours
+        self.storage_efficiency = storage_efficiency
+        # Storage is checked before searching.
+        Storage(0.0, storage_hours, storage_efficiency)
+
+        # GHG of fuels not in the grid.
+        self.new_ghg = OrderedDict()
+        defaults = generator_file(GHG_FILE).gen_db
+        for fuel in self.costs.keys():
+            error = get_build_error(base, fuel)
+            if error != "":
+                raise ValueError(error)
+            if fuel not in base.gen_db:
+                self.new_ghg[fuel] = defaults[fuel].ghg
+
+        ghg = OrderedDict((fuel, gen.ghg) for fuel, gen in base.gen_db.items())
+        ghg.update(self.new_ghg)
+        self.fuels = get_merit_fuels(ghg)
+        self.ghg = np.array([ghg[fuel] for fuel in self.fuels])
+        self.fossil = np.array([bool(get_fossil_fuel(fuel)) for fuel in self.fuels],
+                               dtype=np.bool_)
+        self.load = base.load
+        hours = base.hours
+        self.mw = np.zeros(len(self.fuels))
+        self.avail = np.zeros((len(self.fuels), hours))
+        # MW available for each MW added
+        self.profile = np.ones((len(self.fuels), hours))
+        for row, fuel in enumerate(self.fuels):
+            if fuel not in base.gen_db:
+                continue
+            gen = base.gen_db[fuel]
+            self.mw[row] = gen.mw
+            if gen.hourly is None:
+                self.avail[row] = gen.mw
+            else:
+                self.avail[row] = gen.hourly
+                self.profile[row] = gen.hourly / gen.mw
+        self.storage_mw = 0.0
+        if FUEL_STORAGE in base.gen_db:
+            self.storage_mw = base.gen_db[FUEL_STORAGE].mw
+        self.clean = np.minimum(self.avail, self.mw.reshape(-1, 1))[~self.fossil].sum(axis=0)
+
+        self.added = OrderedDict((fuel, 0.0) for fuel in self.costs.keys())
+        # Hours dispatched for each candidate
+        self.cols = np.arange(hours)
+        self.evaluations = 0
+
+    # Dispatches the hours in self.cols, as Dispatch does.  Returns the
+    # fossil MW, fossil GHG and MW not served for each hour.
+    def _dispatch(self, load, avail, capacity):
+        mw, _, _, unserved = dispatch_merit_order(load, avail, capacity)
+        fossil_mw = np.zeros(len(load))
+        fossil_ghg = np.zeros(len(load))
+        for row in np.flatnonzero(self.fossil):
+            fossil_mw = fossil_mw + mw[row]
+            fossil_ghg = fossil_ghg + mw[row] * self.ghg[row]
+        return fossil_mw, fossil_ghg, unserved
+
+    def evaluate(self, added):
+        self.evaluations += 1
+        cols = self.cols
+        add = np.array([added.get(fuel, 0.0) for fuel in self.fuels])
+        cap = (self.mw + add).reshape(-1, 1)
+        avail = self.avail[:, cols] + add.reshape(-1, 1) * self.profile[:, cols]
+        capacity = np.minimum(avail, cap).sum(axis=0)
+        load = self.load[cols]
+        fossil_mw, fossil_ghg, unserved = self._dispatch(load, avail, capacity)
+        active = cols[(fossil_mw + unserved) > 0.0]
+
+        storage_mw = self.storage_mw + added.get(FUEL_STORAGE, 0.0)
+        if storage_mw > 0.0 and len(cols):
+            clean = self.clean.copy()
+            for row in np.flatnonzero((add > 0.0) & ~self.fossil):
+                clean += (np.minimum(self.avail[row] + add[row] * self.profile[row], cap[row])
+                          - np.minimum(self.avail[row], self.mw[row]))
+            need = np.zeros(len(self.load))
+            need[cols] = fossil_mw + unserved
+            storage = Storage(storage_mw, self.storage_hours, self.storage_efficiency)
+            charge, discharge, stored, load = run_storage(storage, self.load, clean, need)
+            load = load[cols]
+            fossil_mw, fossil_ghg, unserved = self._dispatch(load, avail, capacity)
+
+        return BuildResult(float(fossil_ghg.sum()), float(unserved.sum()),
+                           int(np.count_nonzero(unserved > 0.0)), active)
+
+    def meets_target(self, result):
+        return result.fossil_ghg <= self.target_ghg and result.brown_hours == 0
+
+    def _shortfall(self, result):
+        return (max(result.fossil_ghg - self.target_ghg, 0.0)
+                + result.unserved * UNSERVED_GHG_MWh)
+
+    def _added(self, fuel, mw):
+        added = OrderedDict(self.added)
+        added[fuel] += mw
+        return added
+
+    # Returns the MW added to each fuel.
+    def run(self, max_steps=MAX_STEPS):
+        self.cols = np.arange(len(self.load))
+        current = self.evaluate(self.added)
+        # Removing capacity can make any hour of the grid as built
+        # so far need fossil fuels again.
+        all_cols = current.active
+        self.cols = current.active
+        steps = 0
+        while not self.meets_target(current):
+            if steps >= max_steps:
+                raise ValueError("Target not met after %d steps." % steps)
+            best = None
+            for fuel, cost in self.costs.items():
+                result = self.evaluate(self._added(fuel, self.step))
+                gain = (self._shortfall(current) - self._shortfall(result)) / (cost * self.step)
+                if best is None or gain > best[0]:
+                    best = (gain, fuel, result)
+            gain, fuel, current = best
+            if gain <= 0.0:
+                raise ValueError("Target of %.2f MT CO2 cannot be met by building %s." %
+                                 (self.target_ghg / 1E9, ", ".join(self.costs.keys())))
+            self.added[fuel] += self.step
+            self.cols = current.active
+            steps += 1
+        logging.info("Target met after %d steps, %d dispatches." % (steps, self.evaluations))
+
+        self.cols = all_cols
+        for fuel in sorted(self.costs.keys(), key=lambda fuel: -self.costs[fuel]):
+            while self.added[fuel] >= self.step:
+                if not self.meets_target(self.evaluate(self._added(fuel, -self.step))):
+                    break
+                self.added[fuel] -= self.step
+        return self.added
+
+    def get_cost(self):
+        return sum(self.costs[fuel] * mw for fuel, mw in self.added.items())
+
+    # Returns the build as a Scenario.
+    def get_scenario(self):
+        scenario = Scenario("Build")
+        for fuel, mw in self.added.items():
+            if mw > 0.0 or fuel in self.new_ghg:
+                scenario.capacity[fuel] = AdjustData(abs_adj=mw)
+            if fuel in self.new_ghg:
+                scenario.ghg[fuel] = AdjustData(abs_adj=self.new_ghg[fuel], ratio=0.0)
+        return scenario
+
+    # Returns the totals of the build, as grid.run does.
+    def run_build(self):
+        demand, generator = self.get_scenario().apply(self.base)
+        dispatch = Dispatch(demand, generator, self.storage_hours, self.storage_efficiency)
+        req_MWh, gen_MWh, ghg, f_ghg, brown_hours, brown_diff = dispatch.run(
+                self.base.start_utc, self.base.end_utc)
+        return (req_MWh, gen_MWh, ghg, f_ghg, self.base.get_run_hours(),
+                brown_hours, brown_diff)
+
+# Searches for a build meeting target_ghg, in MT CO2, for the_grid,
+# whose base must already have been created.  If no builds are
+# given, those of BUILD_FUELS that the grid can build are used.
+def find_build(the_grid, start_utc, end_utc, target_ghg, builds=[], step=BUILD_STEP,
+               storage_hours=STORAGE_HOURS, storage_efficiency=STORAGE_EFFICIENCY):
+    base = ScenarioBase(the_grid, start_utc, end_utc)
+    costs = OrderedDict(parse_build(x) for x in builds)
+    if builds == []:
+        for fuel in BUILD_FUELS:
+            error = get_build_error(base, fuel)
+            if error == "":
+                costs[fuel] = 1.0
+            else:
+                logging.info("Not building %s.  %s" % (fuel, error))
+    search = CapacitySearch(base, target_ghg * 1E9, costs, step, storage_hours,
+                            storage_efficiency)
+    search.run()
+    return search
+
+def print_build(search, outfile=None):
+    if outfile is None:
+        outfile = sys.stdout
+    row_format = "%-12s %14s %14s %14s"
+    print(row_format % ("Fuel", "Capacity(MW)", "Added(MW)", "Cost"), file=outfile)
+    for fuel, mw in search.added.items():
+        capacity = mw
+        if fuel in search.base.gen_db:
+            capacity += search.base.gen_db[fuel].mw
+        print(row_format % (fuel, "%.2f" % capacity, "%.2f" % mw,
+                            "%.2f" % (search.costs[fuel] * mw)), file=outfile)
+    print(row_format % ("Total", "", "%.2f" % sum(search.added.values()),
+                        "%.2f" % search.get_cost()), file=outfile)
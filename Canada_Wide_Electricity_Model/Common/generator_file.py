@@ -16,33 +16,39 @@ import os
 import logging
 import copy
 from math import isnan
+import numpy as np
 from datetime import datetime, timezone, timedelta
 from common_defs import *
 from hourly_mw_file import HourlyMWFile
 from adjust_data import AdjustData
 
 class generator(object):
-    def __init__(self, capacity=0.0, GHG_MWh=0.0, tz_string="Unknown", gen_path=""):
+    def __init__(self, capacity=0.0, GHG_MWh=0.0, tz_string="Unknown", gen_path="", window=None):
         self.mw = float(capacity)
         try:
             self.ghg = float(GHG_MWh)
+            self.ghg_given = True
         except:
             self.ghg = 0.0
+            self.ghg_given = False
         self.tz_str = tz_string
         self.gen_files = [HourlyMWFile()]
         self.min_time = None
         self.max_time = None
-        self.add_gen_file(gen_path)
+        self.add_gen_file(gen_path, window)
 
     # Keep generator files separate for now.
     # Each generator file supports exactly
     # the same date range as all the others.
-    def add_gen_file(self, gen_path):
-        gen_file = HourlyMWFile(gen_path)
+    # window is as for HourlyMWFile.read_hourly_mw_file.
+    def add_gen_file(self, gen_path, window=None):
+        gen_file = HourlyMWFile(gen_path, window)
         if gen_file.is_empty():
             logging.debug("File %s is empty." % gen_path)
             return
+        self.add_hourly_mw_file(gen_file)
 
+    def add_hourly_mw_file(self, gen_file):
         if (len(self.gen_files) == 1) and self.gen_files[0].is_empty():
             self.gen_files = []
 
@@ -64,6 +70,18 @@ class generator(object):
 
         self.gen_files.append(gen_file)
 
+    # Adds another generator for the same fuel, as add_generator
+    # does when the fuel is found in another line or file.
+    def merge(self, other):
+        self.mw += other.mw
+        if other.ghg_given:
+            self.ghg = other.ghg
+        if not other.tz_str == '':
+            self.tz_str = other.tz_str
+        for gen_file in other.gen_files:
+            if not gen_file.is_empty():
+                self.add_hourly_mw_file(gen_file)
+
     def add_mw_hour(self, path, line_num, UMT_Local_MW):
         if len(self.gen_files) != 1:
             raise ValueError("Cannot add mw hour to multiple generator files.")
@@ -84,15 +102,17 @@ class generator(object):
 class generator_file(object):
     generator_file_header = "Fuel, Capacity, GHG_MWh, Timezone"
 
-    def __init__(self, file_path = ""):
+    def __init__(self, file_path = "", window=None):
         self.gen_db = {}
         self.sorted_db = {}
 
         if (file_path == ""):
             return
-        self.read_generator_file(file_path)
+        self.read_generator_file(file_path, window)
 
-    def read_generator_file(self, path):
+    # window is the start and end UTC of the hours needed from
+    # hourly generation files, or None for all hours.
+    def read_generator_file(self, path, window=None):
         lines = {}
         file_dir = os.path.dirname(path)
 
@@ -112,13 +132,15 @@ class generator_file(object):
             toks = [tok.strip() for tok in line[1:-1].split(SEPARATOR)]
 
             try:
-                self.add_generator(toks, file_dir)
+                self.add_generator(toks, file_dir, window)
             except (IndexError, ValueError) as e:
                 raise ValueError("File %s Line %s bad format, Error '%s' : %s" %
                                  (path, str(line_num + 1), str(e), line))
         logging.info("Loaded %s" % path)
 
-    def add_generator(self, toks, file_dir):
+    def add_generator(self, toks, file_dir, window=None):
+        # The merit order may change.
+        self.sorted_db = {}
         fuel = toks[0]
         capacity = toks[1].split(" ")[0].replace(",",'')
         capacity = float(capacity)
@@ -138,9 +160,20 @@ class generator_file(object):
                 self.gen_db[fuel].ghg = ghg
             if not tz_str == '':
                 self.gen_db[fuel].tz_str = tz_str
-            self.gen_db[fuel].add_gen_file(gen_file_path)
+            self.gen_db[fuel].add_gen_file(gen_file_path, window)
             return
-        self.gen_db[fuel] = generator(capacity, ghg, tz_str, gen_path=gen_file_path)
+        self.gen_db[fuel] = generator(capacity, ghg, tz_str, gen_path=gen_file_path,
+                                      window=window)
+
+    # Adds the generators from other, in the same order as if
+    # other's generator file had been read after those already read.
+    def merge(self, other):
+        self.sorted_db = {}
+        for fuel, gen in other.gen_db.items():
+            if fuel in self.gen_db:
+                self.gen_db[fuel].merge(gen)
+            else:
+                self.gen_db[fuel] = gen
 
     def add_mw_hour(self, fuel, path, line_num, UMT_Local_MW):
         if fuel not in self.gen_db:
@@ -181,10 +214,29 @@ class generator_file(object):
         mw = min(mw, gen_mw)
         return mw, mw * self.gen_db[fuel].ghg
 
-    def get_ghg_emissions(self, req_mw, date):
+    # Returns an array of the MW available from fuel
+    # for each hour starting at start_utc.
+    def get_hourly_mw(self, fuel, start_utc, hours):
+        if self.gen_db[fuel].gen_files == []:
+            return np.full(hours, self.gen_db[fuel].mw)
+        elif (len(self.gen_db[fuel].gen_files) == 1
+                and self.gen_db[fuel].gen_files[0].is_empty()):
+            return np.full(hours, self.gen_db[fuel].mw)
+        mw = np.zeros(hours)
+        for gen in self.gen_db[fuel].gen_files:
+            mw = mw + gen.get_values(start_utc, hours)
+        return mw
+
+    # Returns the fuels in the order they are dispatched,
+    # lowest GHG emissions first.
+    def get_merit_order(self):
         if self.sorted_db == {}:
             self.sorted_db = [[self.gen_db[fuel].ghg, fuel] for fuel in self.gen_db.keys()]
             self.sorted_db.sort(key=lambda x: x[0])
+        return [fuel for _, fuel in self.sorted_db]
+
+    def get_ghg_emissions(self, req_mw, date):
+        self.get_merit_order()
         # print("Len: %d %d" % (len(self.gen_db.keys()), len(self.sorted_db)))
         # print("Sorted_db: %s" % ",".join([str(x) for x in self.sorted_db]))
         tot_ghg = 0
@@ -231,11 +283,9 @@ class generator_file(object):
             self.gen_db[fuel].min_time = src.gen_db[fuel].min_time
             self.gen_db[fuel].max_time = src.gen_db[fuel].max_time
             for gen in src.gen_db[fuel].gen_files:
-                gen_file = copy.deepcopy(gen)
                 utc = src.gen_db[fuel].min_time
                 interval = src.gen_db[fuel].max_time - utc + timedelta(hours=1)
-                gen_file.adjust_values(utc, interval, adj)
-                self.gen_db[fuel].gen_files.append(gen_file)
+                self.gen_db[fuel].gen_files.append(gen.scaled_view(utc, interval, adj))
 
     def write_generator_file(self, filepath='', write_hourly_files=False):
         try:
@@ -5,6 +5,21 @@
     - A load file
     - A generator file
 
+    With --all_provinces, each province directory is loaded once and
+    run on its own, then all of Canada is run from the data already
+    loaded, with and without Transportation if it has data.
+    A summary of all runs is printed at the end.  --factors_file
+    saves the hourly average and marginal emission factors of each
+    run in a numpy .npz file.
+
+    With --interties, each module is a region, and power is only
+    sent between regions over the interties in the file.  Otherwise
+    modules are merged into one grid.  See regions.py.
+
+    With --target_ghg, the capacity to --build that brings fossil fuel
+    emissions down to the target is found and printed.  See expansion.py.
+
+    Files are only read for the run window, see hourly_mw_file.py.
 """
 
 from optparse import OptionParser
@@ -12,22 +27,69 @@ from collections import OrderedDict
 import operator
 import sys
 import os
+import re
+import copy
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timezone, timedelta
 from demand_file import DemandFile
 from generator_file import generator_file
+from dispatch import Dispatch
+from storage import Storage, STORAGE_HOURS, STORAGE_EFFICIENCY
+from regions import RegionalGrid, read_interties_file
+from run_results import RunResults
+from result_sink import SINK_TYPES, SINK_TEXT, SINK_ARRAY, create_sink, write_factor_file
+from jobs import map_jobs
 from math import isnan, ceil
 
 from common_defs import *
 
+MODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRANSPORTATION_DIR = "Transportation"
+# Provinces run for a different period, as their data is for other years.
+MODULE_PERIODS = {"06_Quebec" : ("2014-01-01 05:00", "2015-01-01 04:00")}
+
+# Process pool workers, each loads one file.
+def load_demand_file(path, window=None):
+    demand = DemandFile()
+    demand.read_hourly_mw_file(path, window)
+    return demand
+
+def load_generator_file(path, window=None):
+    return generator_file(path, window)
+
 class grid(object):
-    def __init__(self, demand_file_paths=[], generator_file_paths=[]):
+    # window is the start and end UTC of the hours to read from
+    # hourly files, or None to read all hours.
+    def __init__(self, demand_file_paths=[], generator_file_paths=[], workers=1, window=None):
         self.demand = DemandFile()
-        for dem in demand_file_paths:
-            self.demand.read_hourly_mw_file(dem)
         self.generator = generator_file()
+        # RunResults of the last run
+        self.results = None
+        self.storage_hours = STORAGE_HOURS
+        self.storage_efficiency = STORAGE_EFFICIENCY
+        if workers > 1 and (len(demand_file_paths) + len(generator_file_paths)) > 1:
+            self.load_parallel(demand_file_paths, generator_file_paths, workers, window)
+            return
+        for dem in demand_file_paths:
+            self.demand.read_hourly_mw_file(dem, window)
         for gen in generator_file_paths:
-            self.generator.read_generator_file(gen)
+            self.generator.read_generator_file(gen, window)
+
+    # Loads each file in a separate process.  Results are merged
+    # in the order the files are given, so the grid is the same
+    # as if the files were read one after another.
+    def load_parallel(self, demand_file_paths, generator_file_paths, workers, window=None):
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            demands = pool.map(load_demand_file, demand_file_paths,
+                               [window] * len(demand_file_paths))
+            generators = pool.map(load_generator_file, generator_file_paths,
+                                  [window] * len(generator_file_paths))
+            for demand in demands:
+                self.demand.merge(demand)
+                self.demand.files.extend(demand.files)
+            for generator in generators:
+                self.generator.merge(generator)
 
     def create_base(self, start_utc, end_utc):
         interval = end_utc - start_utc
@@ -35,45 +97,170 @@ class grid(object):
         self.demand.create_base(start_utc, interval)
         self.generator.create_base(start_utc, interval)
 
-    def run(self, start_utc, end_utc):
-        req_MWh = 0.0
-        gen_MWh = 0.0
-        ghg = 0.0
-        f_ghg = 0.0
-        hours = 0
-        brown_hours = 0
-        brown_diff = 0.0
+    # The results are kept in self.results, and given to sink, if any.
+    def run(self, start_utc, end_utc, sink=None):
         interval = end_utc - start_utc 
         hours = interval.days * 24 + ceil(interval.seconds / 3600) + 1
         logging.info("Run from %s to %s.  %d hours." % ( start_utc.strftime(DATE_FORMAT),
                                                   end_utc.strftime(DATE_FORMAT),
                                                   hours))
-        while start_utc < end_utc:
-            capacity = self.generator.get_total_capacity(start_utc)
-            load = self.demand.get_mw_hour(start_utc)
-            if isnan(load):
-                raise ValueError("No load for UTC %s" % start_utc.strftime(DATE_FORMAT))
-            req_MWh += load
-            if (load > capacity):
-                brown_hours += 1
-                brown_diff = max(brown_diff, load - capacity)
-                load = capacity
-                
-            gen_ghg, foss_ghg, gen_db = self.generator.get_ghg_emissions(load, start_utc)
-            gen_MWh += load
-            ghg += gen_ghg
-            f_ghg += foss_ghg
-            if isnan(ghg):
-                raise ValueError("%s GHG is NaN" % start_utc.strftime(DATE_FORMAT))
-            op = start_utc.strftime(DATE_FORMAT)
-            op += " %10.2f" % load
-            for fuel in gen_db.keys():
-                op = op + (" %s %f Mw %f GHG" % (fuel, gen_db[fuel][0], gen_db[fuel][1]))
-            print(op)
-
-            start_utc += timedelta(hours=1)
+        dispatch = Dispatch(self.demand, self.generator, self.storage_hours,
+                            self.storage_efficiency)
+        req_MWh, gen_MWh, ghg, f_ghg, brown_hours, brown_diff = dispatch.run(start_utc, end_utc)
+        self.results = RunResults(dispatch)
+        if sink is not None:
+            sink.write(self.results)
         return req_MWh, gen_MWh, ghg, f_ghg, hours, brown_hours, brown_diff
 
+# Returns the demand and generator files found in a module directory.
+def get_module_files(path):
+    demand_paths = []
+    generator_paths = []
+    path = os.path.abspath(path)
+    for fname, paths in zip([FILE_LOAD_DB, FILE_GEN_DB], [demand_paths, generator_paths]):
+        f_path = os.path.join(path, fname)
+        if os.path.isfile(f_path):
+            logging.debug("Found file %s" % f_path)
+            paths.append(f_path)
+    return demand_paths, generator_paths
+
+# Province directories start with a two digit number.
+def find_modules(model_dir):
+    names = sorted(name for name in os.listdir(model_dir)
+                   if re.match(r"\d\d_", name) and os.path.isdir(os.path.join(model_dir, name)))
+    return [os.path.join(model_dir, name) for name in names]
+
+def load_module(path, window=None):
+    demand_paths, generator_paths = get_module_files(path)
+    return grid(demand_paths, generator_paths, window=window)
+
+# Process pool worker for load_module, given the path and window.
+def load_module_window(path_window):
+    return load_module(*path_window)
+
+# Returns a grid with the demand and generators of all grids,
+# as if all of their files had been read in order.
+# The grids themselves are not changed.
+def combine_grids(grids):
+    combined = grid()
+    for the_grid in grids:
+        combined.demand.merge(copy.deepcopy(the_grid.demand))
+        combined.demand.files.extend(the_grid.demand.files)
+        combined.generator.merge(copy.deepcopy(the_grid.generator))
+    return combined
+
+# Runs for run_all, set in each process before any are run.
+_all_runs = []
+
+def set_all_runs(runs):
+    global _all_runs
+    _all_runs = runs
+
+# Returns the name, start, end, totals and error of a run.
+def run_one(idx):
+    name, the_grid, start, end, error = _all_runs[idx]
+    if error != "":
+        return [name, start, end, None, error]
+    try:
+        logging.info("Running %s..." % name)
+        the_grid.create_base(start, end)
+        return [name, start, end, the_grid.run(start, end), ""]
+    except Exception as e:
+        return [name, start, end, None, str(e)]
+
+# Returns the result of run_one and the emission factors of the
+# run, None if it failed.
+def run_one_factors(idx):
+    result = run_one(idx)
+    if result[3] is None:
+        return result, None
+    return result, _all_runs[idx][1].results.get_emission_factors()
+
+# Returns a RegionalGrid with a region for each module directory.
+def load_regions(module_paths, interties_path, workers=1, window=None):
+    interties = read_interties_file(interties_path)
+    grids = map_jobs(load_module_window, [(path, window) for path in module_paths], workers)
+    names = [os.path.basename(os.path.normpath(path)) for path in module_paths]
+    return RegionalGrid(names, grids, interties)
+
+def run_all(model_dir, start, end, workers=1, storage_hours=STORAGE_HOURS,
+            storage_efficiency=STORAGE_EFFICIENCY, interties_path="", factors_path=""):
+    paths = find_modules(model_dir)
+    provinces = len(paths)
+    transportation = os.path.join(model_dir, TRANSPORTATION_DIR)
+    if get_module_files(transportation) != ([], []):
+        paths.append(transportation)
+    # Each module is read for its own period and the all of Canada
+    # run, and the hours between.
+    windows = []
+    for path in paths:
+        window = (start, end)
+        name = os.path.basename(path)
+        if name in MODULE_PERIODS:
+            mod_start, mod_end = [datetime.strptime(x, DATE_FORMAT)
+                                  for x in MODULE_PERIODS[name]]
+            window = (min(start, mod_start), max(end, mod_end))
+        windows.append(window)
+    logging.info("Loading %d modules..." % len(paths))
+    grids = map_jobs(load_module_window, list(zip(paths, windows)), workers)
+
+    runs = []
+    for path, the_grid in zip(paths, grids):
+        name = os.path.basename(path)
+        mod_start, mod_end = start, end
+        if name in MODULE_PERIODS:
+            mod_start, mod_end = [datetime.strptime(x, DATE_FORMAT)
+                                  for x in MODULE_PERIODS[name]]
+        error = ""
+        if the_grid.demand.files == []:
+            error = "No %s found." % FILE_LOAD_DB
+        elif the_grid.generator.gen_db == {}:
+            error = "No %s found." % FILE_GEN_DB
+        runs.append([name, the_grid, mod_start, mod_end, error])
+    runs.append(["Canada", combine_grids(grids[:provinces]), start, end, ""])
+    if len(grids) > provinces:
+        runs.append(["Canada plus " + TRANSPORTATION_DIR, combine_grids(grids), start, end, ""])
+    if interties_path != "":
+        names = [os.path.basename(path) for path in paths[:provinces]]
+        regional = RegionalGrid(names, grids[:provinces], read_interties_file(interties_path))
+        runs.append(["Canada with interties", regional, start, end, ""])
+
+    for run in runs:
+        run[1].storage_hours = storage_hours
+        run[1].storage_efficiency = storage_efficiency
+    if factors_path == "":
+        results = map_jobs(run_one, list(range(len(runs))), workers,
+                           initializer=set_all_runs, initargs=(runs,))
+    else:
+        both = map_jobs(run_one_factors, list(range(len(runs))), workers,
+                        initializer=set_all_runs, initargs=(runs,))
+        results = [result for result, _ in both]
+        write_factor_file(factors_path, [(result[0], result[1], factors)
+                                         for result, factors in both if factors is not None])
+    print_summary(results)
+    return results
+
+def print_summary(results, outfile=None):
+    if outfile is None:
+        outfile = sys.stdout
+    row_format = "%-32s %-16s %-16s %10s %10s %10s %10s %8s %12s  %s"
+    print(row_format % ("Run", "Start", "End", "Demand", "Generated", "Fossil", "Total",
+                        "Brownout", "Max_Deficit", "Status"), file=outfile)
+    print(row_format % ("", "UTC", "UTC", "TWh", "TWh", "MT CO2", "MT CO2",
+                        "Hours", "MW", ""), file=outfile)
+    for name, start, end, totals, error in results:
+        values = [""] * 6
+        status = "SUCCESS"
+        if totals is None:
+            status = "FAILURE! %s" % error.replace("\n", " ")
+        else:
+            req_MWh, gen_MWh, ghg, f_ghg, hours, brown_hours, brown_diff = totals
+            values = ["%.2f" % (req_MWh/1000000), "%.2f" % (gen_MWh/1000000),
+                      "%.2f" % (f_ghg/1E9), "%.2f" % (ghg/1E9),
+                      "%d" % brown_hours, "%.2f" % brown_diff]
+        print(row_format % tuple([name, start.strftime(DATE_FORMAT), end.strftime(DATE_FORMAT)]
+                                 + values + [status]), file=outfile)
+
 def create_parser():
     parser = OptionParser(description="Grid support.")
     parser.add_option('-d', '--demand',
@@ -101,20 +288,104 @@ def create_parser():
             action = 'store', type = 'string', default = "",
             help = 'UTC end date for run, YYYY-MM-DD hh:mm',
             metavar = 'YYY-MM-DD hh:mm')
+    parser.add_option('-j', '--jobs',
+            dest = 'jobs',
+            action = 'store', type = 'int', default = 1,
+            help = 'Number of processes used to load files.',
+            metavar = 'JOBS')
+    parser.add_option('-o', '--output',
+            dest = 'output',
+            action = 'store', type = 'choice', choices = SINK_TYPES, default = SINK_TEXT,
+            help = 'Hourly output, one of %s.' % ", ".join(SINK_TYPES),
+            metavar = 'TYPE')
+    parser.add_option('-f', '--output_file',
+            dest = 'output_file',
+            action = 'store', type = 'string', default = "",
+            help = 'File path for hourly output, standard output if not given.',
+            metavar = 'FILE')
+    parser.add_option('--storage_hours',
+            dest = 'storage_hours',
+            action = 'store', type = 'float', default = STORAGE_HOURS,
+            help = 'Hours of storage discharge at full power.',
+            metavar = 'HOURS')
+    parser.add_option('--storage_efficiency',
+            dest = 'storage_efficiency',
+            action = 'store', type = 'float', default = STORAGE_EFFICIENCY,
+            help = 'Fraction of the energy stored which can be discharged.',
+            metavar = 'FRACTION')
+    parser.add_option('-t', '--interties',
+            dest = 'interties_path',
+            action = 'store', type = 'string', default = "",
+            help = 'File path to interties file.  Each module is run as a region.',
+            metavar = 'FILE')
+    parser.add_option('--target_ghg',
+            dest = 'target_ghg',
+            action = 'store', type = 'float', default = None,
+            help = 'Find the capacity to build for fossil fuel emissions of at most this.',
+            metavar = 'MT_CO2')
+    parser.add_option('--build',
+            dest = 'build',
+            action = 'append', type = 'string', default = [],
+            help = 'Fuel to build for --target_ghg, with an optional cost per MW. '
+                   'WIND, SOLAR_PV, NUCLEAR and STORAGE if not given.',
+            metavar = 'FUEL[=COST]')
+    parser.add_option('--build_step',
+            dest = 'build_step',
+            action = 'store', type = 'float', default = 100.0,
+            help = 'MW added to a fuel in each step of the --target_ghg search.',
+            metavar = 'MW')
+    parser.add_option('--factors_file',
+            dest = 'factors_file',
+            action = 'store', type = 'string', default = "",
+            help = 'File path for the hourly average and marginal GHG per MWh of '
+                   'each --all_provinces run, as a numpy .npz file.',
+            metavar = 'FILE')
+    parser.add_option('-a', '--all_provinces',
+            dest = 'all_provinces',
+            action = 'store_true', default = False,
+            help = 'Run each province, then all of Canada, and print a summary.')
     return parser
 
 def check_options(options):
+    if options.jobs < 1:
+        raise ValueError("Jobs must be at least 1, not %d." % options.jobs)
+
+    # Checks the storage options.
+    Storage(0.0, options.storage_hours, options.storage_efficiency)
+
+    if options.interties_path != "" and not os.path.isfile(options.interties_path):
+        raise ValueError("Interties file '%s' not found." % options.interties_path)
+
+    if options.target_ghg is not None:
+        if options.target_ghg < 0.0:
+            raise ValueError("Target GHG must not be negative, not %f." % options.target_ghg)
+        if options.build_step <= 0.0:
+            raise ValueError("Build step must be more than 0, not %f MW." % options.build_step)
+        if options.all_provinces or options.interties_path != "":
+            raise ValueError("Target GHG is for a single grid.")
+
+    if options.factors_file != "" and not options.all_provinces:
+        raise ValueError("Emission factors file is for all provinces, "
+                         "use array output for one grid.")
+
+    if options.all_provinces:
+        return check_dates(options)
+
+    if options.interties_path != "":
+        if options.module_path == []:
+            raise ValueError("Regions must be given as modules.")
+        if options.demand_path != [] or options.generator_path != []:
+            raise ValueError("Demand and generator files cannot be given with regions.")
+
     for path in options.module_path:
         if not os.path.isdir(path):
             raise ValueError("Module %s directory not found." % path)
-        path = os.path.abspath(path)
-        fnames = [FILE_LOAD_DB, FILE_GEN_DB]
-        options_f = [options.demand_path, options.generator_path]
-        for fname, option in zip(fnames, options_f):
-            f_path = os.path.join(path, fname)
-            if os.path.isfile(f_path):
-                logging.debug("Found file %s" % f_path)
-                option.append(f_path)
+        demand_paths, generator_paths = get_module_files(path)
+        options.demand_path.extend(demand_paths)
+        options.generator_path.extend(generator_paths)
+
+    if options.output == SINK_ARRAY and options.output_file == "":
+        raise ValueError("Array output needs an output file.")
 
     if options.demand_path == [] or options.generator_path == []:
         raise ValueError("Must enter at least one demand and generator file.")
@@ -127,6 +398,9 @@ def check_options(options):
         if not os.path.isfile(path):
             raise ValueError("Generator file '%s' not found." % path)
 
+    return check_dates(options)
+
+def check_dates(options):
     try:
         start_date = datetime.strptime(options.start_date, DATE_FORMAT) 
     except:
@@ -149,11 +423,29 @@ def main(argv = None):
     (options, argv) = parser.parse_args(argv)
     start, end = check_options(options)
 
+    if options.all_provinces:
+        results = run_all(MODEL_DIR, start, end, workers=options.jobs,
+                          storage_hours=options.storage_hours,
+                          storage_efficiency=options.storage_efficiency,
+                          interties_path=options.interties_path,
+                          factors_path=options.factors_file)
+        if [x for x in results if x[3] is None]:
+            return -1
+        return 0
+
     logging.info("Loading Files...")
-    the_grid = grid(options.demand_path, options.generator_path)
+    if options.interties_path != "":
+        return run_regions(options, start, end)
+    the_grid = grid(options.demand_path, options.generator_path, workers=options.jobs,
+                    window=(start, end))
+    the_grid.storage_hours = options.storage_hours
+    the_grid.storage_efficiency = options.storage_efficiency
     logging.info("Creating load/generation baseline...")
     the_grid.create_base(start,end)
-    req_MWh, gen_MWh, ghg, f_ghg, hours, brown_hours, brown_diff = the_grid.run(start, end)
+    if options.target_ghg is not None:
+        return run_target(options, the_grid, start, end)
+    sink = create_sink(options.output, options.output_file)
+    req_MWh, gen_MWh, ghg, f_ghg, hours, brown_hours, brown_diff = the_grid.run(start, end, sink)
     logging.info("Demand is %10.2f TWh" % (req_MWh/1000000))
     logging.info("Generated %10.2f TWh, %10.2f MT CO2 fossil fuel emissions." %
             (gen_MWh/1000000, f_ghg/1E9))
@@ -164,5 +456,37 @@ def main(argv = None):
         logging.info("Demand exceeded supply for %d hours out of %d." % (brown_hours, hours))
         logging.info("Maximum deficiency was %f MW." % brown_diff)
 
+def run_regions(options, start, end):
+    regional = load_regions(options.module_path, options.interties_path, options.jobs,
+                            window=(start, end))
+    logging.info("Creating load/generation baseline...")
+    regional.create_base(start, end)
+    sink = create_sink(options.output, options.output_file)
+    totals = regional.run(start, end, sink)
+    # Hourly output may be on standard output.
+    outfile = sys.stdout if options.output_file != "" else sys.stderr
+    print_summary(regional.get_region_results(start, end) +
+                  [["All regions", start, end, totals, ""]], outfile=outfile)
+    dispatch = regional.dispatch
+    for row, intertie in enumerate(dispatch.interties):
+        flows = dispatch.flows[row]
+        logging.info("%s to %s %10.2f TWh, back %10.2f TWh." %
+                     (intertie.from_region, intertie.to_region,
+                      flows[flows > 0].sum()/1000000, -flows[flows < 0].sum()/1000000))
+    return 0
+
+def run_target(options, the_grid, start, end):
+    # expansion uses scenario, which uses this module.
+    from expansion import find_build, print_build
+    search = find_build(the_grid, start, end, options.target_ghg, options.build, options.build_step,
+                        options.storage_hours, options.storage_efficiency)
+    print_build(search)
+    req_MWh, gen_MWh, ghg, f_ghg, hours, brown_hours, brown_diff = search.run_build()
+    logging.info("Demand is %10.2f TWh" % (req_MWh/1000000))
+    logging.info("Generated %10.2f TWh, %10.2f MT CO2 fossil fuel emissions." %
+            (gen_MWh/1000000, f_ghg/1E9))
+    logging.info("                          %10.2f MT CO2 total emissions." % (ghg/1E9))
+    return 0
+
 if __name__ == '__main__':
     sys.exit(main())
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Binary cache of hourly MW files.
+
+    Parsing and validating the text of an hourly MW file is slow.
+    Once a file has been read, its hourly values and provenance
+    are written to a cache file next to it.  Later reads load the
+    cache instead, as long as it still matches the source file.
+
+    A cache matches its source file when the size is the same and
+    either the modification time or the SHA-256 of the contents
+    is the same.  When only the contents match, the modification time
+    in the cache is updated, so later reads do not hash the file again.
+
+    Cache file layout:
+    - CACHE_MAGIC
+    - Header length, 8 byte little endian unsigned integer
+    - JSON header describing the source file and each array
+    - Arrays, each starting on a CACHE_ALIGN byte boundary
+
+    The arrays can be memory mapped rather than read.  With the
+    copy-on-write mode 'c', every process that maps the same cache
+    shares the pages held by the operating system until it changes
+    them, so workers in a process pool do not each hold a copy.
+"""
+
+import os
+import sys
+import shutil
+import json
+import struct
+import hashlib
+import logging
+import numpy as np
+from datetime import datetime
+from provenance import Provenance
+
+CACHE_SUFFIX = ".hmwcache"
+CACHE_MAGIC = b"HMWCACHE"
+CACHE_VERSION = 1
+CACHE_ALIGN = 64
+CACHE_TIME_FORMAT = "%Y-%m-%d %H:%M"
+
+YMDH_ARRAYS = ["values", "valid", "head", "tail"]
+PROVENANCE_ARRAYS = ["file_id", "line_num", "src_id", "src_line_num",
+                     "local_offset", "mw", "next_row"]
+
+def get_cache_path(path):
+    return path + CACHE_SUFFIX
+
+def get_file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as the_file:
+        for block in iter(lambda: the_file.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+# Returns the size and modification time of path,
+# or None if path is not a real file.
+def get_source_key(path):
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError, ValueError):
+        return None
+    return {"size" : stat.st_size, "mtime_ns" : stat.st_mtime_ns}
+
+def _time_to_str(UTC):
+    if UTC is None:
+        return None
+    return UTC.strftime(CACHE_TIME_FORMAT)
+
+def _str_to_time(text):
+    if text is None:
+        return None
+    return datetime.strptime(text, CACHE_TIME_FORMAT)
+
+def _align(offset):
+    return (offset + CACHE_ALIGN - 1) // CACHE_ALIGN * CACHE_ALIGN
+
+def write_cache(path, ymdh, file_header):
+    source = get_source_key(path)
+    if source is None:
+        return False
+    source["sha256"] = get_file_hash(path)
+
+    # Only keep the hours between the first and last valid hour.
+    valid = np.flatnonzero(ymdh.valid)
+    if len(valid):
+        lo = valid[0]
+        hi = valid[-1] + 1
+        base_time = ymdh._get_time(lo)
+    else:
+        lo = hi = 0
+        base_time = None
+    rows = len(ymdh.provenance)
+    arrays = {}
+    for name in YMDH_ARRAYS:
+        arrays[name] = np.ascontiguousarray(getattr(ymdh, name)[lo:hi])
+    for name in PROVENANCE_ARRAYS:
+        arrays[name] = np.ascontiguousarray(getattr(ymdh.provenance, name)[:rows])
+
+    header = {"version" : CACHE_VERSION,
+              "source" : source,
+              "file_header" : file_header,
+              "base_time" : _time_to_str(base_time),
+              "min_time" : _time_to_str(ymdh.min_time),
+              "max_time" : _time_to_str(ymdh.max_time),
+              "names" : ymdh.provenance.names,
+              "arrays" : {}}
+    # Array offsets depend on the header length, so lay the
+    # arrays out after the header, moving them along until
+    # the header fits.
+    start = _align(len(CACHE_MAGIC) + 8 + len(json.dumps(header)))
+    while True:
+        offset = start
+        for name, array in arrays.items():
+            header["arrays"][name] = {"dtype" : array.dtype.str,
+                                      "shape" : list(array.shape),
+                                      "offset" : offset}
+            offset = _align(offset + array.nbytes)
+        header_bytes = json.dumps(header).encode("utf-8")
+        if len(CACHE_MAGIC) + 8 + len(header_bytes) <= start:
+            break
+        start = _align(len(CACHE_MAGIC) + 8 + len(header_bytes))
+
+    cache_path = get_cache_path(path)
+    temp_path = "%s.%d.tmp" % (cache_path, os.getpid())
+    try:
+        with open(temp_path, 'wb') as cache_file:
+            cache_file.write(CACHE_MAGIC)
+            cache_file.write(struct.pack("<Q", len(header_bytes)))
+            cache_file.write(header_bytes)
+            for name, array in arrays.items():
+                cache_file.seek(header["arrays"][name]["offset"])
+                cache_file.write(array.tobytes())
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        logging.debug("Could not write cache %s: %s" % (cache_path, str(e)))
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+    logging.debug("Wrote cache %s" % cache_path)
+    return True
+
+def _read_header(cache_file):
+    if cache_file.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+        raise ValueError("Bad cache file magic.")
+    header_len = struct.unpack("<Q", cache_file.read(8))[0]
+    return json.loads(cache_file.read(header_len).decode("utf-8"))
+
+# Returns True if the cache header matches path and file_header.
+def _check_header(path, header, file_header):
+    if header.get("version") != CACHE_VERSION:
+        return False
+    if header.get("file_header") != file_header:
+        return False
+    source = get_source_key(path)
+    if source is None:
+        return False
+    cached = header["source"]
+    if cached["size"] != source["size"]:
+        return False
+    if cached["mtime_ns"] == source["mtime_ns"]:
+        return True
+    if cached["sha256"] != get_file_hash(path):
+        return False
+    return True
+
+# Rewrites the source key in the header of the cache for path,
+# after its contents have been found to match a new modification
+# time.  The cache is copied and replaced, as other processes may
+# have it mapped.  Nothing is written if the header no longer fits
+# before the arrays.
+def _update_source(path, header):
+    source = get_source_key(path)
+    if source is None:
+        return False
+    header["source"]["mtime_ns"] = source["mtime_ns"]
+    header_bytes = json.dumps(header).encode("utf-8")
+    first = min([desc["offset"] for desc in header["arrays"].values()])
+    if len(CACHE_MAGIC) + 8 + len(header_bytes) > first:
+        return False
+    cache_path = get_cache_path(path)
+    temp_path = "%s.%d.tmp" % (cache_path, os.getpid())
+    try:
+        shutil.copyfile(cache_path, temp_path)
+        with open(temp_path, 'r+b') as cache_file:
+            cache_file.seek(len(CACHE_MAGIC))
+            cache_file.write(struct.pack("<Q", len(header_bytes)))
+            cache_file.write(header_bytes)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        logging.debug("Could not update cache %s: %s" % (cache_path, str(e)))
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+    logging.debug("Updated cache %s" % cache_path)
+    return True
+
+def _map_array(cache_path, dtype, count, offset, mmap_mode):
+    # Empty files and empty arrays cannot be mapped.
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+    array = np.memmap(cache_path, dtype=dtype, mode=mmap_mode,
+                      offset=offset, shape=(count,))
+    # A plain array view keeps the mapping open, but results of
+    # calculations on it are ordinary arrays.
+    return array.view(np.ndarray)
+
+# Loads the cache for path into ymdh, which must be empty.
+# If mmap_mode is given, the arrays are mapped with numpy.memmap
+# using that mode instead of being read into memory.
+# Returns False if there is no valid cache for path.
+def read_cache(path, ymdh, file_header, mmap_mode=None):
+    cache_path = get_cache_path(path)
+    if get_source_key(cache_path) is None:
+        return False
+    try:
+        with open(cache_path, 'rb') as cache_file:
+            header = _read_header(cache_file)
+            if not _check_header(path, header, file_header):
+                logging.debug("Cache %s is out of date." % cache_path)
+                return False
+            arrays = {}
+            for name, desc in header["arrays"].items():
+                dtype = np.dtype(desc["dtype"])
+                count = int(np.prod(desc["shape"]))
+                if mmap_mode is not None:
+                    arrays[name] = _map_array(cache_path, dtype, count,
+                                              desc["offset"], mmap_mode)
+                    continue
+                cache_file.seek(desc["offset"])
+                arrays[name] = np.fromfile(cache_file, dtype=dtype, count=count)
+                if len(arrays[name]) != count:
+                    raise ValueError("Cache array %s is truncated." % name)
+    except (OSError, ValueError, KeyError, TypeError, struct.error) as e:
+        logging.debug("Could not read cache %s: %s" % (cache_path, str(e)))
+        return False
+    source = get_source_key(path)
+    if source is not None and header["source"]["mtime_ns"] != source["mtime_ns"]:
+        _update_source(path, header)
+
+    prov = Provenance()
+    prov.names = list(header["names"])
+    prov.name_ids = dict((name, idx) for idx, name in enumerate(prov.names))
+    prov.rows = len(arrays["next_row"])
+    for name in PROVENANCE_ARRAYS:
+        setattr(prov, name, arrays[name])
+    ymdh.provenance = prov
+    for name in YMDH_ARRAYS:
+        setattr(ymdh, name, arrays[name])
+    ymdh.base_time = _str_to_time(header["base_time"])
+    ymdh.min_time = _str_to_time(header["min_time"])
+    ymdh.max_time = _str_to_time(header["max_time"])
+    logging.debug("Read cache %s" % cache_path)
+    return True
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Index of the lines of an hourly MW file by UTC day.
+
+    Runs only need the hours of their window, but files may hold
+    many years.  The index gives, for each UTC day in a file, the
+    byte offset and line number of its first line, and the byte
+    offset just past its last line, so a reader can seek straight
+    to the lines of a window rather than parsing the whole file.
+
+    Lines need not be in time order.  Every line of a day lies
+    between the first and end offsets of that day, so reading from
+    the lowest first offset to the highest end offset of the days in
+    a window finds all of the window's lines, along with some others
+    which the reader skips.
+
+    The index is written to a JSON file next to the source file,
+    and is rebuilt when the size or modification time of the
+    source changes.  An index is not written for a file with any
+    line whose UTC day cannot be read, so such files are always
+    read in full, and report their errors as before.
+"""
+
+import os
+import json
+import logging
+from datetime import datetime, timedelta
+from hourly_cache import get_source_key
+from common_defs import *
+
+INDEX_SUFFIX = ".hmwindex"
+INDEX_VERSION = 1
+INDEX_DAY_FORMAT = "%Y-%m-%d"
+
+def get_index_path(path):
+    return path + INDEX_SUFFIX
+
+# Returns {day : [first offset, first line number, end offset]}
+# for the lines of path after the header, with line numbers
+# counted from 0 for the first line after the header.
+# Returns None if the UTC day of any line cannot be read.
+def build_index(path, token_count):
+    days = {}
+    with open(path, 'rb') as the_file:
+        offset = len(the_file.readline())
+        for line_num, line in enumerate(the_file):
+            end = offset + len(line)
+            toks = line.strip()[1:-1].split(SEPARATOR.encode("ascii"))
+            if len(toks) != token_count:
+                return None
+            try:
+                day = "%04d-%02d-%02d" % tuple(int(tok) for tok in toks[-9:-6])
+            except ValueError:
+                return None
+            if day not in days:
+                days[day] = [offset, line_num, end]
+            else:
+                entry = days[day]
+                if offset < entry[0]:
+                    entry[0] = offset
+                    entry[1] = line_num
+                entry[2] = max(entry[2], end)
+            offset = end
+    return days
+
+def write_index(path, days):
+    source = get_source_key(path)
+    if source is None:
+        return False
+    index_path = get_index_path(path)
+    temp_path = "%s.%d.tmp" % (index_path, os.getpid())
+    try:
+        with open(temp_path, 'w') as index_file:
+            json.dump({"version" : INDEX_VERSION, "source" : source, "days" : days},
+                      index_file)
+        os.replace(temp_path, index_path)
+    except OSError as e:
+        logging.debug("Could not write index %s: %s" % (index_path, str(e)))
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+    logging.debug("Wrote index %s" % index_path)
+    return True
+
+# Returns the index of path, from its index file if that is up to
+# date, else built and written.  Returns None if path has no index.
+def get_index(path, token_count):
+    source = get_source_key(path)
+    if source is None:
+        return None
+    index_path = get_index_path(path)
+    try:
+        with open(index_path, 'r') as index_file:
+            index = json.load(index_file)
+        if index.get("version") == INDEX_VERSION and index.get("source") == source:
+            return index["days"]
+        logging.debug("Index %s is out of date." % index_path)
+    except (OSError, ValueError, KeyError):
+        pass
+    days = build_index(path, token_count)
+    if days is not None:
+        write_index(path, days)
+    return days
+
+# Returns the first offset, its line number, and the end offset of
+# the lines for the UTC days from start_utc up to, but not including,
+# end_utc, or None if the index has no lines for those days.
+def get_byte_range(days, start_utc, end_utc):
+    found = None
+    day = datetime(start_utc.year, start_utc.month, start_utc.day)
+    while day < end_utc:
+        entry = days.get(day.strftime(INDEX_DAY_FORMAT))
+        if entry is not None:
+            if found is None:
+                found = list(entry)
+            else:
+                if entry[0] < found[0]:
+                    found[0] = entry[0]
+                    found[1] = entry[1]
+                found[2] = max(found[2], entry[2])
+        day += timedelta(days=1)
+    return found
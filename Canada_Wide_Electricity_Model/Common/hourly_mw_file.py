@@ -8,6 +8,13 @@
     Local Year, Month, Day, Hour
     Power in megawatts, to one decimal place
              =========
+
+    A file can be read for a window of UTC hours, from the start up
+    to, but not including, the end.  Only the lines for those hours
+    are parsed, found with the index in hourly_index.py, or only those
+    hours are kept from the cache.  A file that does not have every
+    hour of the window is read in full instead, as create_base fills
+    the missing hours from other years.
 """
 
 from optparse import OptionParser
@@ -18,51 +25,119 @@ import os
 import logging
 import copy
 from datetime import datetime, timezone, timedelta
-from ymdh_data import YMDHData, VA
+from ymdh_data import YMDHData, VA, hours_in
+from hourly_cache import read_cache, write_cache
+from hourly_index import get_index, get_byte_range
 from common_defs import *
 
 class HourlyMWFile(YMDHData):
     file_header = "UTC_Year, UTC_Month, UTC_Day, UTC_Hour, Year, Month, Day, Hour, Load(MW)"
+    # Read and write binary caches of hourly files
+    use_cache = True
+    # Memory map caches copy-on-write, so processes share one copy
+    # of the data.  None reads caches into memory instead.
+    cache_mmap_mode = 'c'
 
-    def __init__(self, file_path = ""):
+    def __init__(self, file_path = "", window=None):
         super(HourlyMWFile, self).__init__()
         self.files = []
         self.token_count = len(self.file_header.split(", "))
 
         if not os.path.isfile(file_path):
             return
-        self.read_hourly_mw_file(file_path)
+        self.read_hourly_mw_file(file_path, window)
+
+    # Returns a copy of self with no hours or files.
+    def _get_empty(self):
+        hourly = copy.copy(self)
+        YMDHData.__init__(hourly)
+        hourly.files = []
+        return hourly
+
+    # Each file is read separately, then added to the hours
+    # already present.  This allows each file to be cached.
+    # window is the start and end UTC of the hours needed,
+    # or None for all hours.
+    def read_hourly_mw_file(self, path, window=None):
+        hourly = self._get_empty()
+        if self.use_cache and read_cache(path, hourly, self.file_header,
+                                         self.cache_mmap_mode):
+            if window is not None:
+                hourly.keep_window(*window)
+        elif window is None or not hourly.parse_window(path, *window):
+            hourly = self._get_empty()
+            hourly.parse_hourly_mw_file(path)
+            if self.use_cache:
+                write_cache(path, hourly, self.file_header)
+        self.merge(hourly)
+        self.files.append(path)
+        logging.info("Loaded %s" % path)
 
-    def read_hourly_mw_file(self, path):
+    def parse_hourly_mw_file(self, path):
         lines = []
 
         with open(path, 'r') as the_file:
             lines = [line.strip() for line in the_file.readlines()]
 
-        if (lines[0] != self.file_header):
-            raise ValueError("File header is '%s', not '%s'.  Halting." %
-                    (lines[0], self.file_header))
-
+        self._check_header(lines[0])
         logging.debug("Loading %s" % path)
         for line_num, line in enumerate(lines[1:]):
-            if ((line[0] != START_END) or (line[-1] != START_END)):
-                raise ValueError("File %s Line %d delimiters '%s' '%s' not '%s'"
-                                 "'%s'. Halting." %
-                                 (path, line_num+1, line[0], line[-1],
-                                                START_END, START_END))
-            toks = [tok.strip() for tok in line[1:-1].split(SEPARATOR)]
-            if len(toks) != self.token_count:
-                raise ValueError("File %s Line %d Bad format '%s'" %
-                        (path, line_num+1, line))
-
-            try:
-                self.add_mw_hour(path, line_num+1, toks)
-            except ValueError as e:
-                logging.warning("%s" % str(e))
-                raise ValueError("File %s Line %d Invalid format '%s'" %
-                        (path, line_num+1, line))
-        self.files.append(path)
-        logging.info("Loaded %s" % path)
+            self._parse_line(path, line_num, line)
+
+    def _check_header(self, header):
+        if (header != self.file_header):
+            raise ValueError("File header is '%s', not '%s'.  Halting." %
+                    (header, self.file_header))
+
+    # Adds the hour on a line, unless it is before start_utc or
+    # not before end_utc.
+    def _parse_line(self, path, line_num, line, start_utc=None, end_utc=None):
+        if ((line[0] != START_END) or (line[-1] != START_END)):
+            raise ValueError("File %s Line %d delimiters '%s' '%s' not '%s'"
+                             "'%s'. Halting." %
+                             (path, line_num+1, line[0], line[-1],
+                                            START_END, START_END))
+        toks = [tok.strip() for tok in line[1:-1].split(SEPARATOR)]
+        if len(toks) != self.token_count:
+            raise ValueError("File %s Line %d Bad format '%s'" %
+                    (path, line_num+1, line))
+
+        try:
+            if start_utc is not None:
+                UTC = datetime(int(toks[-9]), int(toks[-8]), int(toks[-7]),
+                               hour=int(toks[-6]))
+                if UTC < start_utc or UTC >= end_utc:
+                    return
+            self.add_mw_hour(path, line_num+1, toks)
+        except ValueError as e:
+            logging.warning("%s" % str(e))
+            raise ValueError("File %s Line %d Invalid format '%s'" %
+                    (path, line_num+1, line))
+
+    # Parses only the lines for hours from start_utc up to, but not
+    # including, end_utc.  Returns False, having parsed nothing or
+    # only some of the window, if the file has no index or does not
+    # have every hour of the window.
+    def parse_window(self, path, start_utc, end_utc):
+        hours = hours_in(end_utc - start_utc)
+        if hours <= 0:
+            return False
+        days = get_index(path, self.token_count)
+        if days is None:
+            return False
+        found = get_byte_range(days, start_utc, end_utc)
+        if found is None:
+            return False
+        first, line_num, end = found
+
+        with open(path, 'rb') as the_file:
+            self._check_header(the_file.readline().decode().strip())
+            the_file.seek(first)
+            lines = the_file.read(end - first).decode().splitlines()
+        logging.debug("Loading %s from line %d" % (path, line_num + 1))
+        for line_num, line in enumerate(lines, line_num):
+            self._parse_line(path, line_num, line.strip(), start_utc, end_utc)
+        return self.get_valid(start_utc, hours).all()
 
     # This looks a bit weird, but allows additional tokens to be
     # prepended to the UMT, local time, and capacity/load tokens.
@@ -103,9 +178,17 @@ class HourlyMWFile(YMDHData):
         except ValueError:
             self.add_ymdh(UTC, load, data, ignore_dup=True)
 
+    def scaled_view(self, UTC, interval, adj):
+        view = super(HourlyMWFile, self).scaled_view(UTC, interval, adj)
+        view.files = list(self.files)
+        return view
+
     def get_mw_hour(self, UTC):
         return self.get_value(UTC)
 
+    def get_mw_hours(self, UTC, hours):
+        return self.get_values(UTC, hours)
+
     def duplicate_mw_hours(self, UTC, new_UTC, interval, adj):
         self.duplicate_data(UTC, new_UTC, interval, adj)
 
@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Running independent jobs in a process pool.
+
+    Kept apart from grid.py, so that parsers can run their files
+    in parallel without importing the grid and its dispatch.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+# Returns [func(arg) for arg in args], using a process pool if
+# workers > 1.  Each process calls initializer(*initargs) first,
+# and is sent chunksize args at a time.
+def map_jobs(func, args, workers, initializer=None, initargs=(), chunksize=1):
+    if workers <= 1 or len(args) <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        return [func(arg) for arg in args]
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer,
+                             initargs=initargs) as pool:
+        return list(pool.map(func, args, chunksize=chunksize))
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Conversion of local times to UTC, from tables of UTC offsets.
+
+    Localizing every hour of a multi-year file with pytz is slow.
+    A LocalTimeTable holds, for each year it has converted, the UTC
+    offset of every local hour of the year, along with the hours
+    skipped when daylight savings time starts and repeated when it
+    ends.  Offsets only change at daylight savings time transitions,
+    so pytz is asked for the offset at noon of each day, and for each
+    hour of the days on which the noon offsets differ.
+
+    Local times are naive datetimes on the hour, and UTC times are
+    naive datetimes.  is_dst is used as by pytz localize():
+    - True uses the daylight savings time offset for skipped and
+      repeated hours, so the first of two repeated hours
+    - False uses the standard time offset, so the second of two
+      repeated hours
+    - None raises ValueError for skipped and repeated hours
+    Other hours have the same offset for all three.
+
+    The tables for each timezone are shared through
+    get_local_time_table().
+"""
+
+import numpy as np
+import pytz
+from datetime import datetime, timedelta
+
+HOURS_PER_DAY = 24
+NOON = 12
+
+class YearOffsets(object):
+    def __init__(self, year, hours):
+        self.start = datetime(year, 1, 1)
+        # UTC offset in minutes of each hour, for is_dst False and True.
+        self.offsets = np.zeros((2, hours), dtype=np.int64)
+        self.skipped = np.zeros(hours, dtype=bool)
+        self.repeated = np.zeros(hours, dtype=bool)
+
+class LocalTimeTable(object):
+    def __init__(self, tz_name):
+        self.tz_name = tz_name
+        self.tz = pytz.timezone(tz_name)
+        self.years = {}
+
+    def _get_offset(self, local, is_dst):
+        return int(self.tz.localize(local, is_dst=is_dst).utcoffset().total_seconds()) // 60
+
+    def get_year(self, year):
+        if year in self.years:
+            return self.years[year]
+        start = datetime(year, 1, 1)
+        days = (datetime(year + 1, 1, 1) - start).days
+        hours = days * HOURS_PER_DAY
+        table = YearOffsets(year, hours)
+
+        # The offset at noon of the day before the year, each day of
+        # the year, and the day after the year.
+        noons = [self._get_offset(start + timedelta(days=day, hours=NOON), False)
+                 for day in range(-1, days + 1)]
+        for day in range(-1, days):
+            # Hours from noon of day to noon of the next day.
+            first = max(0, day * HOURS_PER_DAY + NOON)
+            end = min(hours, (day + 1) * HOURS_PER_DAY + NOON)
+            if noons[day + 1] == noons[day + 2]:
+                table.offsets[:, first:end] = noons[day + 1]
+                continue
+            for hour in range(first, end):
+                local = start + timedelta(hours=hour)
+                table.offsets[0, hour] = self._get_offset(local, False)
+                table.offsets[1, hour] = self._get_offset(local, True)
+                try:
+                    self.tz.localize(local, is_dst=None)
+                except pytz.NonExistentTimeError:
+                    table.skipped[hour] = True
+                except pytz.AmbiguousTimeError:
+                    table.repeated[hour] = True
+        self.years[year] = table
+        return table
+
+    def _check_dst(self, local, skipped, repeated):
+        if skipped:
+            raise ValueError("%s is skipped in %s." % (str(local), self.tz_name))
+        if repeated:
+            raise ValueError("%s is repeated in %s." % (str(local), self.tz_name))
+
+    # Returns the UTC time of local.
+    def to_utc(self, local, is_dst=False):
+        if (local.minute, local.second, local.microsecond) != (0, 0, 0):
+            raise ValueError("%s is not on the hour." % str(local))
+        table = self.get_year(local.year)
+        hour = (local - table.start) // timedelta(hours=1)
+        if is_dst is None:
+            self._check_dst(local, table.skipped[hour], table.repeated[hour])
+        return local - timedelta(minutes=int(table.offsets[int(bool(is_dst)), hour]))
+
+    # Returns the UTC times of an array of local times, as a numpy
+    # datetime64 array of minutes.  is_dst may also be an array with
+    # a flag for each time.
+    def to_utc_array(self, local, is_dst=False):
+        local = np.asarray(local, dtype='datetime64[m]')
+        if (local != local.astype('datetime64[h]')).any():
+            raise ValueError("Local times must be on the hour.")
+        flags = np.broadcast_to(np.asarray(False if is_dst is None else is_dst,
+                                           dtype=bool), local.shape).astype(np.int64)
+        offsets = np.zeros(local.shape, dtype=np.int64)
+        years = local.astype('datetime64[Y]')
+        for year in np.unique(years):
+            rows = np.flatnonzero(years == year)
+            table = self.get_year(year.astype(int) + 1970)
+            hours = (local[rows] - year).astype('timedelta64[h]').astype(np.int64)
+            if is_dst is None:
+                bad = np.flatnonzero(table.skipped[hours] | table.repeated[hours])
+                if len(bad):
+                    hour = hours[bad[0]]
+                    self._check_dst(local[rows[bad[0]]].astype(datetime),
+                                    table.skipped[hour], table.repeated[hour])
+            offsets[rows] = table.offsets[flags[rows], hours]
+        return local - offsets.astype('timedelta64[m]')
+
+# Tables by timezone name, shared by all callers in a process.
+_tables = {}
+
+def get_local_time_table(tz_name):
+    if tz_name not in _tables:
+        _tables[tz_name] = LocalTimeTable(tz_name)
+    return _tables[tz_name]
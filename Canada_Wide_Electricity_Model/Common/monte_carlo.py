@@ -0,0 +1,353 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Monte Carlo runs of a grid over synthetic weather years.
+
+    The load and each fuel with hourly generation data, such as WIND
+    or SOLAR_PV, are series of hourly history covering one or more
+    years.  A synthetic year is built by splitting the run period into
+    days or weeks, and taking each one from the same month/day/hour
+    of a randomly chosen year of history, so seasons stay aligned.
+    Feb 29 is taken from Feb 28 in years that do not have one.
+
+    One random number is drawn for each block of a sample, and every
+    series uses it to choose among the years it has data for.  Series
+    with the same years of history therefore take each block from the
+    same year, keeping load and weather together.
+
+    Only the history and the year chosen for each block of each sample
+    are kept.  The hourly arrays of a sample are gathered from the
+    history when it is dispatched, so thousands of samples need little
+    more memory than one.  Samples are dispatched in a process pool
+    with --jobs, started after the history is loaded.
+"""
+
+from optparse import OptionParser
+from collections import OrderedDict
+import sys
+import os
+import csv
+import logging
+import numpy as np
+from datetime import datetime, timedelta
+from dispatch import Dispatch
+from ymdh_data import hours_in
+from scenario import ScenarioFuel, ScenarioGenerator, ScenarioDemand
+from grid import grid, get_module_files, check_dates
+from jobs import map_jobs
+
+from common_defs import *
+
+BLOCK_DAY = "day"
+BLOCK_WEEK = "week"
+BLOCK_HOURS = OrderedDict([(BLOCK_DAY, 24), (BLOCK_WEEK, 24 * 7)])
+LOAD_SERIES = "LOAD"
+PERCENTILES = [10, 50, 90]
+
+RESULT_HEADER = ["Sample", "Demand(MWh)", "Generated(MWh)", "Unserved(MWh)", "GHG",
+                 "Fossil_GHG", "Brownout_Hours", "Max_Deficit(MW)", "Error"]
+SUMMARY_COLUMNS = ["Unserved(MWh)", "GHG", "Fossil_GHG", "Brownout_Hours"]
+
+# Hourly history of the load, or of the MW available from a fuel.
+class HistorySeries(object):
+    def __init__(self, name, ymdh_files):
+        self.name = name
+        self.start = None
+        self.values = np.empty(0)
+        self.valid = np.zeros(0, dtype=np.bool_)
+        ymdh_files = [x for x in ymdh_files if not x.is_empty()]
+        if ymdh_files == []:
+            return
+        self.start = min(x.min_time for x in ymdh_files)
+        end = max(x.max_time for x in ymdh_files)
+        hours = hours_in(end - self.start) + 1
+        # Generator files are added together, and only hours
+        # all of them have are used.
+        self.values = np.zeros(hours)
+        self.valid = np.ones(hours, dtype=np.bool_)
+        for ymdh in ymdh_files:
+            self.values = self.values + ymdh.get_values(self.start, hours)
+            self.valid = self.valid & ymdh.get_valid(self.start, hours)
+
+    def get_years(self):
+        if self.start is None:
+            return []
+        end = self.start + timedelta(hours=len(self.values) - 1)
+        return list(range(self.start.year, end.year + 1))
+
+# Returns the same month/day/hour of times in year,
+# with Feb 29 moved to Feb 28 if year is not a leap year.
+def shift_to_year(times, year):
+    months = times.astype('M8[M]')
+    days = times.astype('M8[D]')
+    month = (months - times.astype('M8[Y]').astype('M8[M]')).astype(np.int64)
+    day = (days - months.astype('M8[D]')).astype(np.int64)
+    hour = (times - days.astype('M8[h]')).astype(np.int64)
+    base = np.datetime64(str(year), 'M')
+    if (base + 2).astype('M8[D]') - (base + 1).astype('M8[D]') != 29:
+        day[(month == 1) & (day == 28)] = 27
+    return ((base + month).astype('M8[D]') + day).astype('M8[h]') + hour
+
+class MonteCarlo(object):
+    def __init__(self, the_grid, start_utc, end_utc, block=BLOCK_DAY):
+        if block not in BLOCK_HOURS:
+            raise ValueError("Block must be one of %s, not '%s'." %
+                             (", ".join(BLOCK_HOURS.keys()), block))
+        self.start_utc = start_utc
+        self.end_utc = end_utc
+        self.hours = 0
+        if end_utc > start_utc:
+            self.hours = hours_in(end_utc - start_utc)
+        self.block = block
+        block_hours = BLOCK_HOURS[block]
+        self.block_starts = np.arange(0, self.hours, block_hours)
+        self.block_lengths = np.diff(np.append(self.block_starts, self.hours))
+        # Hour of each block each hour of the run is in
+        self.hour_block = np.repeat(np.arange(len(self.block_starts)), self.block_lengths)
+        self.hour_offset = np.arange(self.hours) - self.block_starts[self.hour_block]
+
+        self.series = [HistorySeries(LOAD_SERIES, [the_grid.demand])]
+        self.gen_db = OrderedDict()
+        for fuel, gen in the_grid.generator.gen_db.items():
+            series = HistorySeries(fuel, gen.gen_files)
+            if series.start is not None:
+                self.series.append(series)
+            self.gen_db[fuel] = ScenarioFuel(gen.mw, gen.ghg)
+        if self.series[0].start is None:
+            raise ValueError("The grid has no load.")
+
+        # For each series, the history index each block starts at
+        # in each year, or -1 where that year lacks the whole block.
+        times = np.datetime64(start_utc, 'h') + self.block_starts
+        self.years = []
+        self.sources = []
+        for series in self.series:
+            years = series.get_years()
+            sources = np.full((len(times), len(years)), -1, dtype=np.int64)
+            for col, year in enumerate(years):
+                starts = (shift_to_year(times, year) -
+                          np.datetime64(series.start, 'h')).astype(np.int64)
+                for row, (first, length) in enumerate(zip(starts, self.block_lengths)):
+                    if first < 0 or first + length > len(series.valid):
+                        continue
+                    if series.valid[first:first + length].all():
+                        sources[row, col] = first
+            missing = np.flatnonzero((sources < 0).all(axis=1))
+            if len(missing):
+                raise ValueError("No year of %s has the %s starting %s." %
+                                 (series.name, block, str(times[missing[0]])))
+            self.years.append(np.array(years))
+            self.sources.append(sources)
+        # Year index each sample uses, by sample, series and block
+        self.draws = np.zeros((0, len(self.series), len(times)), dtype=np.int16)
+
+    # Chooses the years for each block of samples synthetic years.
+    def draw(self, samples, seed=None):
+        rng = np.random.default_rng(seed)
+        chance = rng.random((samples, len(self.block_starts)))
+        self.draws = np.empty((samples, len(self.series), len(self.block_starts)),
+                              dtype=np.int16)
+        for idx, sources in enumerate(self.sources):
+            present = sources >= 0
+            counts = present.sum(axis=1)
+            # Take the n'th year with data, for n drawn evenly
+            # from the number of years with data.
+            nth = np.floor(chance * counts).astype(np.int64)
+            seen = np.cumsum(present, axis=1)
+            self.draws[:, idx, :] = (seen[np.newaxis, :, :] <= nth[:, :, np.newaxis]).sum(axis=2)
+
+    # Returns the year each block of sample is taken from, for a series.
+    def get_sample_years(self, sample, series_idx=0):
+        return self.years[series_idx][self.draws[sample, series_idx]]
+
+    # Returns the hourly values of each series for a sample.
+    def get_sample(self, sample):
+        values = []
+        blocks = np.arange(len(self.block_starts))
+        for idx, series in enumerate(self.series):
+            starts = self.sources[idx][blocks, self.draws[sample, idx]]
+            values.append(series.values[starts[self.hour_block] + self.hour_offset])
+        return values
+
+    # Returns the totals of dispatching a sample, as Dispatch.run does.
+    def run_sample(self, sample):
+        values = self.get_sample(sample)
+        gen_db = OrderedDict()
+        for fuel, gen in self.gen_db.items():
+            gen_db[fuel] = ScenarioFuel(gen.mw, gen.ghg)
+        for series, hourly in zip(self.series[1:], values[1:]):
+            gen_db[series.name].hourly = hourly
+        dispatch = Dispatch(ScenarioDemand(values[0]), ScenarioGenerator(gen_db))
+        return dispatch.run(self.start_utc, self.end_utc)
+
+# Monte Carlo runs for run_one_sample, set in each process
+# before any samples are run.
+_monte_carlo = None
+
+def set_monte_carlo(monte_carlo):
+    global _monte_carlo
+    _monte_carlo = monte_carlo
+
+# Returns the sample number, totals and error of a sample.
+def run_one_sample(sample):
+    try:
+        return [sample, _monte_carlo.run_sample(sample), ""]
+    except Exception as e:
+        return [sample, None, str(e)]
+
+# Draws samples synthetic years and dispatches each of them.
+def run_monte_carlo(monte_carlo, samples, seed=None, workers=1):
+    monte_carlo.draw(samples, seed)
+    logging.info("Running %d samples..." % samples)
+    chunksize = max(1, samples // (workers * 4))
+    return map_jobs(run_one_sample, list(range(samples)), workers,
+                    initializer=set_monte_carlo, initargs=(monte_carlo,),
+                    chunksize=chunksize)
+
+# Returns a row of RESULT_HEADER values for each result.
+def get_result_rows(results):
+    rows = []
+    for sample, totals, error in results:
+        if totals is None:
+            rows.append([sample] + [""] * 7 + [error.replace("\n", " ")])
+            continue
+        req_MWh, gen_MWh, ghg, f_ghg, brown_hours, brown_diff = totals
+        rows.append([sample, req_MWh, gen_MWh, req_MWh - gen_MWh, ghg, f_ghg,
+                     brown_hours, brown_diff, ""])
+    return rows
+
+# Returns the PERCENTILES of each of SUMMARY_COLUMNS,
+# over the samples which ran.
+def get_percentiles(results):
+    rows = [x for x in get_result_rows(results) if x[-1] == ""]
+    summary = OrderedDict()
+    for column in SUMMARY_COLUMNS:
+        idx = RESULT_HEADER.index(column)
+        values = np.array([x[idx] for x in rows], dtype=np.float64)
+        if len(values) == 0:
+            summary[column] = [INVALID_VALUE] * len(PERCENTILES)
+            continue
+        summary[column] = np.percentile(values, PERCENTILES).tolist()
+    return summary
+
+def write_samples(results, filepath):
+    with open(filepath, 'w', newline='') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(RESULT_HEADER)
+        writer.writerows(get_result_rows(results))
+    logging.info("Wrote %s" % filepath)
+
+def print_percentiles(results, outfile=None):
+    if outfile is None:
+        outfile = sys.stdout
+    summary = get_percentiles(results)
+    failed = len([x for x in results if x[1] is None])
+    row_format = "%-16s" + " %16s" * len(PERCENTILES)
+    print("%d samples, %d failed" % (len(results), failed), file=outfile)
+    print(row_format % tuple([""] + ["P%d" % x for x in PERCENTILES]), file=outfile)
+    for column, values in summary.items():
+        print(row_format % tuple([column] + ["%.2f" % x for x in values]), file=outfile)
+
+def create_parser():
+    parser = OptionParser(description="Monte Carlo runs of a grid over synthetic "
+                                      "years resampled from its history.")
+    parser.add_option('-d', '--demand',
+            dest = 'demand_path',
+            action = 'append', type = 'string', default = [],
+            help = 'File path to demand file.',
+            metavar = 'FILE')
+    parser.add_option('-g', '--generator',
+            dest = 'generator_path',
+            action = 'append', type = 'string', default = [],
+            help = 'File path to generator file.',
+            metavar = 'FILE')
+    parser.add_option('-m', '--module',
+            dest = 'module_path',
+            action = 'append', type = 'string', default = [],
+            help = 'Directory containing load and generator files.',
+            metavar = 'DIR')
+    parser.add_option('-s', '--start',
+            dest = 'start_date',
+            action = 'store', type = 'string', default = "",
+            help = 'UTC start date for run, YYYY-MM-DD hh:mm',
+            metavar = 'YYY-MM-DD hh:mm')
+    parser.add_option('-e', '--end',
+            dest = 'end_date',
+            action = 'store', type = 'string', default = "",
+            help = 'UTC end date for run, YYYY-MM-DD hh:mm',
+            metavar = 'YYY-MM-DD hh:mm')
+    parser.add_option('-n', '--samples',
+            dest = 'samples',
+            action = 'store', type = 'int', default = 100,
+            help = 'Number of synthetic years.',
+            metavar = 'SAMPLES')
+    parser.add_option('-b', '--block',
+            dest = 'block',
+            action = 'store', type = 'choice', choices = list(BLOCK_HOURS.keys()),
+            default = BLOCK_DAY,
+            help = 'Resample whole %s.' % " or ".join(["%ss" % x for x in BLOCK_HOURS.keys()]),
+            metavar = 'BLOCK')
+    parser.add_option('-r', '--seed',
+            dest = 'seed',
+            action = 'store', type = 'int', default = None,
+            help = 'Random seed, to repeat a set of samples.',
+            metavar = 'SEED')
+    parser.add_option('-j', '--jobs',
+            dest = 'jobs',
+            action = 'store', type = 'int', default = 1,
+            help = 'Number of processes used to load files and run samples.',
+            metavar = 'JOBS')
+    parser.add_option('-f', '--output_file',
+            dest = 'output_file',
+            action = 'store', type = 'string', default = "",
+            help = 'CSV file path for the totals of each sample.',
+            metavar = 'FILE')
+    return parser
+
+def check_options(options):
+    if options.jobs < 1:
+        raise ValueError("Jobs must be at least 1, not %d." % options.jobs)
+
+    if options.samples < 1:
+        raise ValueError("Samples must be at least 1, not %d." % options.samples)
+
+    for path in options.module_path:
+        if not os.path.isdir(path):
+            raise ValueError("Module %s directory not found." % path)
+        demand_paths, generator_paths = get_module_files(path)
+        options.demand_path.extend(demand_paths)
+        options.generator_path.extend(generator_paths)
+
+    if options.demand_path == [] or options.generator_path == []:
+        raise ValueError("Must enter at least one demand and generator file.")
+
+    for path in options.demand_path + options.generator_path:
+        if not os.path.isfile(path):
+            raise ValueError("File '%s' not found." % path)
+
+    return check_dates(options)
+
+def main(argv = None):
+    logging.basicConfig(level=logging.INFO)
+
+    parser = create_parser()
+    if argv is None:
+        argv = sys.argv[1:]
+
+    (options, argv) = parser.parse_args(argv)
+    start, end = check_options(options)
+
+    logging.info("Loading Files...")
+    the_grid = grid(options.demand_path, options.generator_path, workers=options.jobs)
+    monte_carlo = MonteCarlo(the_grid, start, end, options.block)
+    results = run_monte_carlo(monte_carlo, options.samples, options.seed,
+                              workers=options.jobs)
+    if options.output_file != "":
+        write_samples(results, options.output_file)
+    print_percentiles(results)
+    if [x for x in results if x[1] is None]:
+        return -1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
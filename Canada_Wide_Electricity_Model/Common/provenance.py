@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Compact record of where each hour of data came from.
+
+    Each row records up to two file name/line number pairs,
+    the offset of local time from UTC in hours, and the
+    value read from the source.  File names are interned, so
+    each name is stored once no matter how many hours refer to it.
+
+    Rows for the same hour are chained together, so that merging
+    data for an hour does not copy the rows already present.
+
+    Rows are converted back to lists of tokens, in the
+    hourly MW file format, only when asked for.
+"""
+
+import numpy as np
+from datetime import datetime, timedelta
+
+NO_ROW = -1
+NO_FILE = -1
+
+# Minimum number of rows allocated when the table grows
+MIN_ROWS = 1024
+
+class Provenance(object):
+    def __init__(self):
+        self.names = []
+        self.name_ids = {}
+        self.rows = 0
+        self.file_id = np.empty(0, dtype=np.int32)
+        self.line_num = np.empty(0, dtype=np.int32)
+        self.src_id = np.empty(0, dtype=np.int32)
+        self.src_line_num = np.empty(0, dtype=np.int32)
+        self.local_offset = np.empty(0, dtype=np.int32)
+        self.mw = np.empty(0, dtype=np.float64)
+        self.next_row = np.empty(0, dtype=np.int32)
+
+    def __len__(self):
+        return self.rows
+
+    def intern(self, name):
+        name = str(name)
+        if name not in self.name_ids:
+            self.name_ids[name] = len(self.names)
+            self.names.append(name)
+        return self.name_ids[name]
+
+    def _grow(self, count):
+        size = len(self.next_row)
+        if self.rows + count <= size:
+            return
+        extra = max(size, MIN_ROWS, count)
+        for attr in ["file_id", "line_num", "src_id", "src_line_num",
+                     "local_offset", "mw", "next_row"]:
+            old = getattr(self, attr)
+            setattr(self, attr, np.concatenate((old, np.empty(extra, dtype=old.dtype))))
+
+    def _new_rows(self, count):
+        self._grow(count)
+        first = self.rows
+        self.rows += count
+        self.next_row[first:self.rows] = NO_ROW
+        return first
+
+    # Data consists of 0, 1 or 2 file name/line number pairs,
+    # followed by UTC year, month, day, hour,
+    # local year, month, day, hour, and the value.
+    def add(self, UTC, data):
+        prefix = data[:-9]
+        if len(prefix) not in [0, 2, 4]:
+            raise ValueError("Unsupported provenance prefix %s" % str(prefix))
+        local = datetime(int(data[-5]), int(data[-4]), int(data[-3]),
+                         hour=int(data[-2]))
+        offset = local - UTC.replace(tzinfo=None)
+
+        row = self._new_rows(1)
+        self.file_id[row] = NO_FILE
+        self.line_num[row] = 0
+        self.src_id[row] = NO_FILE
+        self.src_line_num[row] = 0
+        if len(prefix) >= 2:
+            self.file_id[row] = self.intern(prefix[0])
+            self.line_num[row] = int(prefix[1])
+        if len(prefix) == 4:
+            self.src_id[row] = self.intern(prefix[2])
+            self.src_line_num[row] = int(prefix[3])
+        self.local_offset[row] = (offset.days * 24) + (offset.seconds // 3600)
+        self.mw[row] = float(data[-1])
+        return row
+
+    # Copies a chain of rows, shifting UTC by hours while keeping
+    # the local time of each row the same.
+    # Returns the first and last rows of the new chain.
+    def copy_chain(self, row, hours):
+        head = NO_ROW
+        tail = NO_ROW
+        while row != NO_ROW:
+            new = self._new_rows(1)
+            self.file_id[new] = self.file_id[row]
+            self.line_num[new] = self.line_num[row]
+            self.src_id[new] = self.src_id[row]
+            self.src_line_num[new] = self.src_line_num[row]
+            self.local_offset[new] = self.local_offset[row] - hours
+            self.mw[new] = self.mw[row]
+            if head == NO_ROW:
+                head = new
+            else:
+                self.next_row[tail] = new
+            tail = new
+            row = self.next_row[row]
+        return head, tail
+
+    # Copies many chains at once, shifting UTC by the matching
+    # entry of hours.  Chains are copied one link at a time,
+    # so that each link of every chain is copied as an array.
+    # Returns arrays of the first and last rows of each new chain.
+    def copy_chains(self, rows, hours):
+        rows = np.asarray(rows, dtype=np.int32)
+        hours = np.asarray(hours, dtype=np.int32)
+        heads = np.full(len(rows), NO_ROW, dtype=np.int32)
+        tails = np.full(len(rows), NO_ROW, dtype=np.int32)
+        chains = np.flatnonzero(rows != NO_ROW)
+        rows = rows[chains]
+        while len(chains):
+            first = self._new_rows(len(chains))
+            new = np.arange(first, first + len(chains), dtype=np.int32)
+            for attr in ["file_id", "line_num", "src_id", "src_line_num", "mw"]:
+                getattr(self, attr)[new] = getattr(self, attr)[rows]
+            self.local_offset[new] = self.local_offset[rows] - hours[chains]
+            started = heads[chains] != NO_ROW
+            self.next_row[tails[chains][started]] = new[started]
+            heads[chains[~started]] = new[~started]
+            tails[chains] = new
+            rows = self.next_row[rows]
+            more = rows != NO_ROW
+            chains = chains[more]
+            rows = rows[more]
+        return heads, tails
+
+    # Copies a chain of rows from another table.
+    # Returns the first and last rows of the new chain.
+    def import_chain(self, other, row):
+        head = NO_ROW
+        tail = NO_ROW
+        while row != NO_ROW:
+            new = self._new_rows(1)
+            self.file_id[new] = NO_FILE
+            self.src_id[new] = NO_FILE
+            if other.file_id[row] != NO_FILE:
+                self.file_id[new] = self.intern(other.names[other.file_id[row]])
+            if other.src_id[row] != NO_FILE:
+                self.src_id[new] = self.intern(other.names[other.src_id[row]])
+            self.line_num[new] = other.line_num[row]
+            self.src_line_num[new] = other.src_line_num[row]
+            self.local_offset[new] = other.local_offset[row]
+            self.mw[new] = other.mw[row]
+            if head == NO_ROW:
+                head = new
+            else:
+                self.next_row[tail] = new
+            tail = new
+            row = other.next_row[row]
+        return head, tail
+
+    def get_row(self, row, UTC):
+        tokens = []
+        if self.file_id[row] != NO_FILE:
+            tokens.extend([self.names[self.file_id[row]], int(self.line_num[row])])
+        if self.src_id[row] != NO_FILE:
+            tokens.extend([self.names[self.src_id[row]], int(self.src_line_num[row])])
+        local = UTC + timedelta(hours=int(self.local_offset[row]))
+        tokens.extend([str(UTC.year), str(UTC.month), str(UTC.day), str(UTC.hour),
+                       str(local.year), str(local.month), str(local.day), str(local.hour),
+                       str(float(self.mw[row]))])
+        return tokens
+
+    def get_rows(self, row, UTC):
+        rows = []
+        while row != NO_ROW:
+            rows.append(self.get_row(row, UTC))
+            row = self.next_row[row]
+        return rows
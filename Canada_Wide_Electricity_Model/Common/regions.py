@@ -0,0 +1,411 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Dispatch of several regions, linked by interties.
+
+    Each region is a grid with its own load and generators, usually
+    a module directory.  An intertie carries power between two regions,
+    up to its capacity in each direction.  Interties are read from a
+    file with lines such as:
+
+    From, To, Capacity, Reverse_Capacity
+    '06_Quebec', '07_New_Brunswick', '1000', '800'
+
+    Capacity is the MW that can be sent from the first region to the
+    second, and Reverse_Capacity the MW that can be sent back, the same
+    as Capacity if not given.  Interties to regions that are not in
+    the run are ignored.
+
+    Each hour, generation in all regions is dispatched in order of
+    increasing GHG emissions, as far as the interties can carry it.
+    Generation with the same GHG emissions is one level.  For each
+    level, generation first serves its own region, then as much of
+    the rest as possible is sent to regions with load still to serve.
+    This is a maximum flow problem, solved by augmenting paths for
+    all hours at once, with each hour that still has a path taking
+    one path per pass.  Flows already sent may be sent another way,
+    but generation already dispatched is never reduced, so the
+    lowest emitting generation that can reach the load serves it.
+
+    As in Dispatch, a region generates no more each hour than the
+    total capacity of its fuels.  Storage is not run.
+"""
+
+import sys
+import os
+import logging
+from datetime import datetime, timedelta
+from math import ceil
+import numpy as np
+from ymdh_data import hours_in
+from run_results import RunResults
+from common_defs import *
+
+intertie_file_header = "From, To, Capacity, Reverse_Capacity"
+
+# Flows and MW smaller than this are taken as 0.
+MW_TOLERANCE = 1e-6
+
+class Intertie(object):
+    def __init__(self, from_region, to_region, capacity, reverse_capacity=None):
+        if reverse_capacity is None:
+            reverse_capacity = capacity
+        self.from_region = from_region
+        self.to_region = to_region
+        self.capacity = float(capacity)
+        self.reverse_capacity = float(reverse_capacity)
+        if from_region == to_region:
+            raise ValueError("Intertie from %s to itself." % from_region)
+        if self.capacity < 0.0 or self.reverse_capacity < 0.0:
+            raise ValueError("Intertie %s - %s capacity must not be negative." %
+                             (from_region, to_region))
+
+def read_interties_file(path):
+    with open(path, 'r') as the_file:
+        lines = [line.strip() for line in the_file.readlines()]
+
+    logging.debug("Loading %s" % path)
+    if lines == [] or lines[0] != intertie_file_header:
+        raise ValueError("File header is '%s', not '%s'.  Halting." %
+                         (lines[0] if lines else "", intertie_file_header))
+
+    interties = []
+    for line_num, line in enumerate(lines[1:]):
+        if line == "":
+            continue
+        if ((line[0] != START_END) or (line[-1] != START_END)):
+            raise ValueError("File %s Line %s delimiters '%s' '%s' not '%s'"
+                             "'%s'. Halting." %
+                             (path, str(line_num + 1), line[0], line[-1], START_END, START_END))
+        toks = [tok.strip() for tok in line[1:-1].split(SEPARATOR)]
+        try:
+            reverse = None
+            if len(toks) > 3 and toks[3] != '':
+                reverse = float(toks[3])
+            interties.append(Intertie(toks[0], toks[1], float(toks[2]), reverse))
+        except (IndexError, ValueError) as e:
+            raise ValueError("File %s Line %s bad format, Error '%s' : %s" %
+                             (path, str(line_num + 1), str(e), line))
+    logging.info("Loaded %s" % path)
+    return interties
+
+class RegionalDispatch(object):
+    def __init__(self, names, grids, interties):
+        self.names = list(names)
+        self.grids = list(grids)
+        self.interties = []
+        for intertie in interties:
+            if intertie.from_region in self.names and intertie.to_region in self.names:
+                self.interties.append(intertie)
+            else:
+                logging.info("Skipping intertie %s - %s, region not in run." %
+                             (intertie.from_region, intertie.to_region))
+        # Each intertie is two arcs, 2 * i from the first region,
+        # and 2 * i + 1 back, so the reverse of arc a is a ^ 1.
+        self.arc_from = np.array([self.names.index(x) for intertie in self.interties
+                                  for x in (intertie.from_region, intertie.to_region)], dtype=int)
+        self.arc_to = np.array([self.names.index(x) for intertie in self.interties
+                                for x in (intertie.to_region, intertie.from_region)], dtype=int)
+        self.start_utc = None
+        self.hours = 0
+        # Each region's fuels, in merit order, and their MW and GHG
+        self.region_fuels = [[] for _ in self.names]
+        self.region_mw = [np.empty((0, 0)) for _ in self.names]
+        self.region_ghg = [np.empty((0, 0)) for _ in self.names]
+        self.region_load = np.empty((len(self.names), 0))
+        self.region_served = np.empty((len(self.names), 0))
+        # MW sent from the first region of each intertie to the
+        # second, negative when sent back.
+        self.flows = np.empty((len(self.interties), 0))
+
+        # Totals for all regions, as Dispatch has them.
+        self.fuels = []
+        self.load = np.empty(0)
+        self.capacity = np.empty(0)
+        self.served = np.empty(0)
+        self.mw = np.empty((0, 0))
+        self.ghg = np.empty((0, 0))
+        self.dispatched = np.empty((0, 0), dtype=np.bool_)
+        self.hour_ghg = np.empty(0)
+        self.hour_fossil_ghg = np.empty(0)
+        self.marginal = np.empty(0, dtype=int)
+        self.marginal_ghg = np.empty(0)
+        self.charge = np.empty(0)
+        self.discharge = np.empty(0)
+        self.stored = np.empty(0)
+        self.totals = (0.0, 0.0, 0.0, 0.0, 0, 0.0)
+
+    def _get_time(self, hour):
+        return self.start_utc + timedelta(hours=int(hour))
+
+    def _get_load(self, the_grid):
+        if the_grid.demand.files == []:
+            return np.zeros(self.hours)
+        return np.array(the_grid.demand.get_mw_hours(self.start_utc, self.hours), dtype=float)
+
+    # Returns the fuels of a grid in merit order, the MW available
+    # from each, and the MW the grid can generate, each hour.
+    def _get_availability(self, name, the_grid):
+        generator = the_grid.generator
+        fuels = [fuel for fuel in generator.get_merit_order() if fuel != FUEL_STORAGE]
+        if FUEL_STORAGE in generator.gen_db and generator.gen_db[FUEL_STORAGE].mw > 0.0:
+            logging.warning("Storage is not run in regional dispatch, %s." % name)
+        avail = np.empty((len(fuels), self.hours))
+        capacity = np.zeros(self.hours)
+        for row, fuel in enumerate(fuels):
+            avail[row] = generator.get_hourly_mw(fuel, self.start_utc, self.hours)
+            capacity = capacity + np.nan_to_num(np.minimum(avail[row], generator.gen_db[fuel].mw))
+        return fuels, avail, capacity
+
+    # Sends supply to unmet load over the interties, with resid the
+    # MW each arc can still carry.  All arrays are regions or arcs by
+    # hours, and are updated.
+    def _send(self, supply, unmet, resid):
+        regions = len(self.names)
+        cols = np.flatnonzero((supply > MW_TOLERANCE).any(axis=0) &
+                              (unmet > MW_TOLERANCE).any(axis=0))
+        while len(cols):
+            # Breadth first search from all regions with supply.
+            count = len(cols)
+            reached = supply[:, cols] > MW_TOLERANCE
+            sinks = unmet[:, cols] > MW_TOLERANCE
+            frontier = reached
+            parent = np.full((regions, count), -1, dtype=int)
+            open_arcs = resid[:, cols] > MW_TOLERANCE
+            found = np.zeros(count, dtype=np.bool_)
+            for _ in range(regions - 1):
+                # Hours that have reached load stop searching.
+                step = frontier[self.arc_from] & open_arcs & ~reached[self.arc_to] & ~found
+                arcs, hours = np.nonzero(step)
+                if len(arcs) == 0:
+                    break
+                parent[self.arc_to[arcs], hours] = arcs
+                frontier = np.zeros_like(reached)
+                frontier[self.arc_to[arcs], hours] = True
+                reached = reached | frontier
+                found = found | (frontier & sinks).any(axis=0)
+
+            hit = reached & sinks
+            if not found.any():
+                break
+            cols = cols[found]
+            parent = parent[:, found]
+            sink = np.argmax(hit[:, found], axis=0)
+
+            # Follow the path back to its supply, finding the MW it can carry.
+            path = []
+            node = sink
+            amount = unmet[sink, cols]
+            for _ in range(regions - 1):
+                arc = parent[node, np.arange(len(cols))]
+                on_path = arc >= 0
+                if not on_path.any():
+                    break
+                arc = np.where(on_path, arc, 0)
+                amount = np.where(on_path, np.minimum(amount, resid[arc, cols]), amount)
+                path.append((arc, on_path))
+                node = np.where(on_path, self.arc_from[arc], node)
+            amount = np.minimum(amount, supply[node, cols])
+
+            for arc, on_path in path:
+                sent = np.where(on_path, amount, 0.0)
+                resid[arc, cols] -= sent
+                resid[arc ^ 1, cols] += sent
+            supply[node, cols] -= amount
+            unmet[sink, cols] -= amount
+
+    # Dispatch hours from start_utc up to, but not including, end_utc.
+    def run(self, start_utc, end_utc):
+        self.start_utc = start_utc
+        if end_utc > start_utc:
+            self.hours = hours_in(end_utc - start_utc)
+        else:
+            self.hours = 0
+        regions = len(self.names)
+        self.region_load = np.zeros((regions, self.hours))
+        avails = []
+        self.capacity = np.zeros(self.hours)
+        # MW each region can still generate
+        headroom = np.zeros((regions, self.hours))
+        for region, (name, the_grid) in enumerate(zip(self.names, self.grids)):
+            self.region_load[region] = self._get_load(the_grid)
+            fuels, avail, headroom[region] = self._get_availability(name, the_grid)
+            self.capacity = self.capacity + headroom[region]
+            self.region_fuels[region] = fuels
+            self.region_mw[region] = np.zeros((len(fuels), self.hours))
+            avails.append(avail)
+        self._check_load()
+
+        resid = np.zeros((2 * len(self.interties), self.hours))
+        for row, intertie in enumerate(self.interties):
+            resid[2 * row] = intertie.capacity
+            resid[2 * row + 1] = intertie.reverse_capacity
+
+        unmet = self.region_load.copy()
+        levels = sorted(set(self.grids[region].generator.gen_db[fuel].ghg
+                            for region in range(regions)
+                            for fuel in self.region_fuels[region]))
+        for level in levels:
+            rows = []
+            supply = np.zeros((regions, self.hours))
+            for region in range(regions):
+                generator = self.grids[region].generator
+                rows.append([row for row, fuel in enumerate(self.region_fuels[region])
+                             if generator.gen_db[fuel].ghg == level])
+                for row in rows[region]:
+                    self._check_availability(region, row, avails[region][row], unmet)
+                    supply[region] += np.nan_to_num(avails[region][row])
+            supply = np.minimum(supply, headroom)
+            available = supply.copy()
+            local = np.minimum(supply, unmet)
+            supply -= local
+            unmet -= local
+            if len(self.interties):
+                self._send(supply, unmet, resid)
+
+            # Generation is taken from each region's fuels in merit order.
+            generated = available - supply
+            headroom -= generated
+            for region in range(regions):
+                for row in rows[region]:
+                    mw = np.minimum(np.nan_to_num(avails[region][row]), generated[region])
+                    self.region_mw[region][row] = mw
+                    generated[region] = generated[region] - mw
+
+        for region in range(regions):
+            generator = self.grids[region].generator
+            ghg = np.array([generator.gen_db[fuel].ghg for fuel in self.region_fuels[region]])
+            self.region_ghg[region] = self.region_mw[region] * ghg.reshape(-1, 1)
+        self.region_served = self.region_load - unmet
+        self.flows = np.array([intertie.capacity - resid[2 * row]
+                               for row, intertie in enumerate(self.interties)])
+        self.flows = self.flows.reshape(len(self.interties), self.hours)
+        self._set_totals(unmet.sum(axis=0))
+        return self.totals
+
+    # Sums the regions, by fuel, as one Dispatch would have them.
+    def _set_totals(self, unserved):
+        ghgs = {}
+        for region in range(len(self.names)):
+            generator = self.grids[region].generator
+            for fuel in self.region_fuels[region]:
+                ghgs[fuel] = min(ghgs.get(fuel, generator.gen_db[fuel].ghg),
+                                 generator.gen_db[fuel].ghg)
+        self.fuels = sorted(ghgs.keys(), key=lambda fuel: ghgs[fuel])
+        self.mw = np.zeros((len(self.fuels), self.hours))
+        self.ghg = np.zeros((len(self.fuels), self.hours))
+        for region in range(len(self.names)):
+            for row, fuel in enumerate(self.region_fuels[region]):
+                self.mw[self.fuels.index(fuel)] += self.region_mw[region][row]
+                self.ghg[self.fuels.index(fuel)] += self.region_ghg[region][row]
+        self.dispatched = self.mw > 0.0
+        self.load = self.region_load.sum(axis=0)
+        self.served = self.region_served.sum(axis=0)
+        self.hour_ghg = self.ghg.sum(axis=0)
+        fossil = np.array([bool(get_fossil_fuel(fuel)) for fuel in self.fuels], dtype=np.bool_)
+        self.hour_fossil_ghg = self.ghg[fossil].sum(axis=0)
+        # Which fuel generates one more MW depends on the region it
+        # is needed in, so there is no marginal fuel for all regions.
+        self.marginal = np.full(self.hours, -1)
+        self.marginal_ghg = np.full(self.hours, np.nan)
+        self.charge = np.zeros(self.hours)
+        self.discharge = np.zeros(self.hours)
+        self.stored = np.zeros(self.hours)
+        self.totals = self._get_totals(self.load, self.served, self.hour_ghg,
+                                       self.hour_fossil_ghg, unserved)
+
+    def _get_totals(self, load, served, ghg, fossil_ghg, unserved):
+        short = unserved > MW_TOLERANCE
+        brown_hours = int(np.count_nonzero(short))
+        brown_diff = 0.0
+        if brown_hours:
+            brown_diff = float(np.max(unserved[short]))
+        return (self._total(load), self._total(served), self._total(ghg),
+                self._total(fossil_ghg), brown_hours, brown_diff)
+
+    def _total(self, values):
+        if len(values) == 0:
+            return 0.0
+        return float(np.cumsum(values)[-1])
+
+    # Returns the totals of a region, as Dispatch.run does.
+    def get_region_totals(self, region):
+        fossil = np.array([bool(get_fossil_fuel(fuel)) for fuel in self.region_fuels[region]],
+                          dtype=np.bool_)
+        ghg = self.region_ghg[region]
+        return self._get_totals(self.region_load[region], self.region_served[region],
+                                ghg.sum(axis=0), ghg[fossil].sum(axis=0),
+                                self.region_load[region] - self.region_served[region])
+
+    # Returns the MW each region sends to others, less what it
+    # receives, for each hour.
+    def get_net_exports(self):
+        exports = np.zeros((len(self.names), self.hours))
+        for row, intertie in enumerate(self.interties):
+            exports[self.names.index(intertie.from_region)] += self.flows[row]
+            exports[self.names.index(intertie.to_region)] -= self.flows[row]
+        return exports
+
+    def _check_load(self):
+        bad = np.isnan(self.region_load)
+        if bad.any():
+            hour = np.flatnonzero(bad.any(axis=0))[0]
+            region = np.flatnonzero(bad[:, hour])[0]
+            raise ValueError("No load for UTC %s in %s" %
+                             (self._get_time(hour).strftime(DATE_FORMAT), self.names[region]))
+
+    # Generation with no data is an error if any load is still unmet.
+    def _check_availability(self, region, row, avail, unmet):
+        bad = np.flatnonzero(np.isnan(avail) & (unmet > MW_TOLERANCE).any(axis=0))
+        if len(bad):
+            raise ValueError("%s %s %s ghg is NaN!" %
+                             (self._get_time(bad[0]).strftime(DATE_FORMAT),
+                              self.names[region], self.region_fuels[region][row]))
+
+# A grid of regions linked by interties, run as grid.run does.
+class RegionalGrid(object):
+    def __init__(self, names, grids, interties):
+        self.names = list(names)
+        self.grids = list(grids)
+        self.interties = list(interties)
+        # RunResults and RegionalDispatch of the last run
+        self.results = None
+        self.dispatch = None
+
+    def create_base(self, start_utc, end_utc):
+        for the_grid in self.grids:
+            if the_grid.demand.files == []:
+                # A region with no load only generates.
+                the_grid.generator.create_base(start_utc, end_utc - start_utc)
+            else:
+                the_grid.create_base(start_utc, end_utc)
+
+    def run(self, start_utc, end_utc, sink=None):
+        hours = self.run_hours(start_utc, end_utc)
+        logging.info("Run %d regions from %s to %s.  %d hours." %
+                     (len(self.names), start_utc.strftime(DATE_FORMAT),
+                      end_utc.strftime(DATE_FORMAT), hours))
+        self.dispatch = RegionalDispatch(self.names, self.grids, self.interties)
+        req_MWh, gen_MWh, ghg, f_ghg, brown_hours, brown_diff = \
+            self.dispatch.run(start_utc, end_utc)
+        self.results = RunResults(self.dispatch)
+        if sink is not None:
+            sink.write(self.results)
+        return req_MWh, gen_MWh, ghg, f_ghg, hours, brown_hours, brown_diff
+
+    # Returns the name, start, end, totals and error of each region
+    # in the last run, as run_all does.
+    def get_region_results(self, start_utc, end_utc):
+        hours = self.run_hours(start_utc, end_utc)
+        results = []
+        for region, name in enumerate(self.names):
+            req_MWh, gen_MWh, ghg, f_ghg, brown_hours, brown_diff = \
+                self.dispatch.get_region_totals(region)
+            results.append([name, start_utc, end_utc,
+                            (req_MWh, gen_MWh, ghg, f_ghg, hours, brown_hours, brown_diff), ""])
+        return results
+
+    # Hours in a run, as grid.run counts them.
+    def run_hours(self, start_utc, end_utc):
+        interval = end_utc - start_utc
+        return interval.days * 24 + ceil(interval.seconds / 3600) + 1
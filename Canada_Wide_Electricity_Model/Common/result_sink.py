@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Destinations for the hourly results of a grid run.
+
+    A sink is given the RunResults once all hours have been run,
+    and only then formats or writes anything.  Runs without a sink
+    only produce totals.
+
+    - TextSink writes one line per hour, in the original grid format
+    - CSVSink writes one row per hour, with MW and GHG for each fuel
+    - ArraySink saves the hourly arrays in a numpy .npz file,
+      with the average and marginal GHG per MWh
+    - RollupSink writes daily or monthly totals
+"""
+
+import sys
+import csv
+import logging
+import numpy as np
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from common_defs import *
+
+SINK_NONE = "none"
+SINK_TEXT = "text"
+SINK_CSV = "csv"
+SINK_ARRAY = "array"
+SINK_DAILY = "daily"
+SINK_MONTHLY = "monthly"
+SINK_TYPES = [SINK_NONE, SINK_TEXT, SINK_CSV, SINK_ARRAY, SINK_DAILY, SINK_MONTHLY]
+
+ROLLUP_FORMATS = {SINK_DAILY : '%Y-%m-%d',
+                  SINK_MONTHLY : '%Y-%m'}
+
+class ResultSink(object):
+    def __init__(self, filepath=''):
+        self.filepath = filepath
+
+    # Calls write_file with the output file open.
+    def write(self, results):
+        if self.filepath == '':
+            self.write_file(results, sys.stdout)
+            return
+        with open(self.filepath, 'w', newline='') as outfile:
+            self.write_file(results, outfile)
+        logging.info("Wrote %s" % self.filepath)
+
+    def write_file(self, results, outfile):
+        raise NotImplementedError()
+
+class TextSink(ResultSink):
+    def write_file(self, results, outfile):
+        lines = []
+        for hour, load in enumerate(results.served.tolist()):
+            gen_db = results.get_hour(hour)
+            op = (results.start_utc + timedelta(hours=hour)).strftime(DATE_FORMAT)
+            op += " %10.2f" % load
+            for fuel in gen_db.keys():
+                op = op + (" %s %f Mw %f GHG" % (fuel, gen_db[fuel][0], gen_db[fuel][1]))
+            lines.append(op)
+        if len(lines):
+            print("\n".join(lines), file=outfile)
+
+class CSVSink(ResultSink):
+    def write_file(self, results, outfile):
+        writer = csv.writer(outfile)
+        header = ["UTC", "Load(MW)", "Capacity(MW)", "Served(MW)"]
+        for fuel in results.fuels:
+            header.extend(["%s(MW)" % fuel, "%s(GHG)" % fuel])
+        writer.writerow(header)
+        columns = [results.load, results.capacity, results.served]
+        for row in range(0, len(results.fuels)):
+            columns.extend([results.mw[row], results.ghg[row]])
+        values = np.array(columns).T.tolist()
+        for hour, row in enumerate(values):
+            UTC = results.start_utc + timedelta(hours=hour)
+            writer.writerow([UTC.strftime(DATE_FORMAT)] + row)
+
+class ArraySink(ResultSink):
+    def write(self, results):
+        if self.filepath == '':
+            raise ValueError("Array output needs a file path.")
+        np.savez(self.filepath,
+                 start_utc=np.array(results.start_utc.strftime(DATE_FORMAT)),
+                 fuels=np.array(results.fuels, dtype=str),
+                 load=results.load,
+                 capacity=results.capacity,
+                 served=results.served,
+                 mw=results.mw,
+                 ghg=results.ghg,
+                 dispatched=results.dispatched,
+                 average_ghg=results.get_intensity(),
+                 marginal=results.marginal,
+                 marginal_ghg=results.marginal_ghg)
+        logging.info("Wrote %s" % self.filepath)
+
+# Saves the hourly emission factors of many runs in a numpy .npz
+# file, as <run>/start_utc, <run>/average_ghg, <run>/marginal_fuel
+# and <run>/marginal_ghg.  factors is a list of the name, start
+# and RunResults.get_emission_factors of each run.
+def write_factor_file(filepath, factors):
+    arrays = OrderedDict()
+    for name, start_utc, values in factors:
+        arrays["%s/start_utc" % name] = np.array(start_utc.strftime(DATE_FORMAT))
+        for key, value in values.items():
+            arrays["%s/%s" % (name, key)] = value
+    np.savez(filepath, **arrays)
+    logging.info("Wrote %s" % filepath)
+
+# Totals for each day or month, by UTC.
+class RollupSink(ResultSink):
+    def __init__(self, period=SINK_MONTHLY, filepath=''):
+        super(RollupSink, self).__init__(filepath)
+        if period not in ROLLUP_FORMATS:
+            raise ValueError("Rollup period must be one of %s, not '%s'." %
+                             (", ".join(ROLLUP_FORMATS.keys()), period))
+        self.period = period
+
+    def write_file(self, results, outfile):
+        date_format = ROLLUP_FORMATS[self.period]
+        writer = csv.writer(outfile)
+        header = ["Period", "Hours", "Load(MWh)", "Generated(MWh)", "GHG", "Fossil_GHG",
+                  "Brownout_Hours"]
+        header.extend(["%s(MWh)" % fuel for fuel in results.fuels])
+        writer.writerow(header)
+        if results.hours == 0:
+            return
+        labels, rollup = results.get_rollup(self.period)
+        names = ["hours", "load", "served", "ghg", "fossil_ghg", "brown_hours"] + results.fuels
+        values = [rollup[name].tolist() for name in names]
+        for idx, label in enumerate(labels.tolist()):
+            writer.writerow([label.strftime(date_format)] + [col[idx] for col in values])
+
+# Returns the sink for one of SINK_TYPES, or None for no output.
+def create_sink(sink_type, filepath=''):
+    if sink_type == SINK_NONE:
+        return None
+    if sink_type == SINK_TEXT:
+        return TextSink(filepath)
+    if sink_type == SINK_CSV:
+        return CSVSink(filepath)
+    if sink_type == SINK_ARRAY:
+        return ArraySink(filepath)
+    if sink_type in ROLLUP_FORMATS:
+        return RollupSink(sink_type, filepath)
+    raise ValueError("Output must be one of %s, not '%s'." %
+                     (", ".join(SINK_TYPES), sink_type))
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Results of a grid run, held as arrays with one entry per hour.
+
+    - load, capacity, served and unserved MW for each hour
+    - MW and GHG for each fuel, as fuels by hours arrays, with
+      fuels in dispatch order
+    - MW charged and discharged, and MWh stored, by storage
+    - the marginal fuel, which would generate one more MW, and its
+      GHG per MWh
+    - totals, as returned by grid.run
+
+    Derived values, such as emissions intensity, fossil share and
+    daily or monthly rollups, are calculated from the arrays
+    when asked for.
+"""
+
+import numpy as np
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from common_defs import *
+
+ROLLUP_UNITS = {"daily" : 'D', "monthly" : 'M'}
+
+class RunResults(object):
+    def __init__(self, dispatch):
+        self.start_utc = dispatch.start_utc
+        self.hours = dispatch.hours
+        self.fuels = list(dispatch.fuels)
+        self.fossil = np.array([bool(get_fossil_fuel(fuel)) for fuel in self.fuels],
+                               dtype=np.bool_)
+        self.load = dispatch.load
+        self.capacity = dispatch.capacity
+        self.served = dispatch.served
+        self.unserved = self.load - self.served
+        self.mw = dispatch.mw
+        self.ghg = dispatch.ghg
+        self.dispatched = dispatch.dispatched
+        self.hour_ghg = dispatch.hour_ghg
+        self.hour_fossil_ghg = dispatch.hour_fossil_ghg
+        self.marginal = dispatch.marginal
+        self.marginal_ghg = dispatch.marginal_ghg
+        self.charge = dispatch.charge
+        self.discharge = dispatch.discharge
+        self.stored = dispatch.stored
+        (self.req_MWh, self.gen_MWh, self.total_ghg, self.fossil_ghg,
+         self.brown_hours, self.brown_diff) = dispatch.totals
+
+    def get_totals(self):
+        return (self.req_MWh, self.gen_MWh, self.total_ghg, self.fossil_ghg,
+                self.brown_hours, self.brown_diff)
+
+    def get_time(self, hour):
+        return self.start_utc + timedelta(hours=int(hour))
+
+    # Returns the UTC hour of each entry, as numpy datetime64 values.
+    def get_times(self):
+        if self.start_utc is None:
+            return np.empty(0, dtype='M8[h]')
+        return np.datetime64(self.start_utc, 'h') + np.arange(self.hours)
+
+    # Returns the MW and GHG dispatched from each fuel for an hour.
+    def get_hour(self, hour):
+        gen_db = {}
+        for row, fuel in enumerate(self.fuels):
+            if self.dispatched[row, hour]:
+                gen_db[fuel] = [float(self.mw[row, hour]), float(self.ghg[row, hour])]
+        return gen_db
+
+    def get_fuel_mw(self, fuel):
+        if fuel not in self.fuels:
+            return np.zeros(self.hours)
+        return self.mw[self.fuels.index(fuel)]
+
+    def get_fuel_ghg(self, fuel):
+        if fuel not in self.fuels:
+            return np.zeros(self.hours)
+        return self.ghg[self.fuels.index(fuel)]
+
+    def get_fossil_mw(self):
+        return self.mw[self.fossil].sum(axis=0)
+
+    # GHG per MWh generated for each hour, 0 when nothing is generated.
+    def get_intensity(self):
+        return np.divide(self.hour_ghg, self.served,
+                         out=np.zeros(self.hours), where=self.served > 0)
+
+    # Name of the marginal fuel for each hour, "" when load is not
+    # all served.
+    def get_marginal_fuels(self):
+        return np.array(self.fuels + [""], dtype=str)[self.marginal]
+
+    # Average and marginal GHG per MWh, as kg/MWh are g/kWh, and the
+    # marginal fuel for each hour.
+    def get_emission_factors(self):
+        return OrderedDict([("average_ghg", self.get_intensity()),
+                            ("marginal_fuel", self.get_marginal_fuels()),
+                            ("marginal_ghg", self.marginal_ghg)])
+
+    # Fraction of generation from fossil fuels for each hour,
+    # 0 when nothing is generated.
+    def get_fossil_share(self):
+        return np.divide(self.get_fossil_mw(), self.served,
+                         out=np.zeros(self.hours), where=self.served > 0)
+
+    # Returns the start of each day or month in the run, and a
+    # dictionary of totals for each.  Fuel MWh are keyed by fuel.
+    def get_rollup(self, period):
+        if period not in ROLLUP_UNITS:
+            raise ValueError("Rollup period must be one of %s, not '%s'." %
+                             (", ".join(ROLLUP_UNITS.keys()), period))
+        labels = self.get_times().astype('M8[%s]' % ROLLUP_UNITS[period])
+        rollup = {}
+        if self.hours == 0:
+            return labels, rollup
+        starts = np.flatnonzero(np.concatenate(([True], labels[1:] != labels[:-1])))
+        rollup["hours"] = np.diff(np.append(starts, self.hours))
+        rollup["load"] = np.add.reduceat(self.load, starts)
+        rollup["served"] = np.add.reduceat(self.served, starts)
+        rollup["unserved"] = np.add.reduceat(self.unserved, starts)
+        rollup["ghg"] = np.add.reduceat(self.hour_ghg, starts)
+        rollup["fossil_ghg"] = np.add.reduceat(self.hour_fossil_ghg, starts)
+        rollup["brown_hours"] = np.add.reduceat((self.unserved > 0).astype(int), starts)
+        for row, fuel in enumerate(self.fuels):
+            rollup[fuel] = np.add.reduceat(self.mw[row], starts)
+        return labels[starts], rollup
@@ -0,0 +1,407 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Runs many scenarios against one grid, loaded once.
+
+    The grid's files are read and its base created once, then the
+    hourly load and the MW available from each fuel are kept as
+    arrays.  Each scenario changes some of:
+    - Load, the MW demanded in every hour
+    - <FUEL> Capacity, the MW of a fuel.  Hourly generation data,
+      such as WIND, is scaled by the change in capacity.
+    - <FUEL> GHG_MWh, the emissions of a fuel, which may change
+      the merit order
+    - STORAGE Hours, the hours of storage discharge at full power
+
+    and is dispatched from the arrays, without reading any files.
+    Scenarios are run in a process pool with --jobs.  The pool is
+    started after the grid is loaded, so each process shares the
+    parent's arrays rather than loading its own.
+
+    Scenarios that only change the capacity of fuels in the grid are
+    run with Dispatch.delta_run against one dispatch of the grid per
+    process, so only the hours they change are dispatched again.
+
+    Scenario files are CSV, one scenario per row:
+    Scenario, Load, WIND Capacity, COAL Capacity, NATGAS GHG_MWh
+    More wind, , +500, ,
+    No coal, , , 0,
+    Gas 450, , , , 450
+    Growth, *1.1, , ,
+
+    A value sets the new value, +X or -X adds to it, *X multiplies it,
+    and an empty value leaves it unchanged.
+"""
+
+from optparse import OptionParser
+from collections import OrderedDict
+import sys
+import os
+import csv
+import logging
+import numpy as np
+from datetime import datetime
+from adjust_data import AdjustData
+from dispatch import Dispatch
+from storage import STORAGE_HOURS
+from ymdh_data import hours_in
+from grid import grid, get_module_files, check_dates
+from jobs import map_jobs
+from math import ceil
+
+from common_defs import *
+
+SCENARIO_NAME = "Scenario"
+SCENARIO_LOAD = "Load"
+SCENARIO_CAPACITY = "Capacity"
+SCENARIO_GHG = "GHG_MWh"
+SCENARIO_HOURS = "Hours"
+
+RESULT_HEADER = ["Scenario", "Demand(MWh)", "Generated(MWh)", "GHG", "Fossil_GHG",
+                 "Hours", "Brownout_Hours", "Max_Deficit(MW)", "Error"]
+
+# Returns the AdjustData for a scenario value, or None if it is empty.
+def parse_change(text):
+    text = text.strip()
+    if text == "":
+        return None
+    try:
+        if text[0] in "+-":
+            return AdjustData(abs_adj=float(text))
+        if text[0] == "*":
+            return AdjustData(ratio=float(text[1:]))
+        # Replaces the value
+        return AdjustData(abs_adj=float(text), ratio=0.0)
+    except ValueError:
+        raise ValueError("Scenario value should be N, +N, -N or *N, not '%s'." % text)
+
+def _change_value(value, change):
+    if change is None:
+        return value
+    return change.adjust([value])[0]
+
+class ScenarioFuel(object):
+    def __init__(self, mw, ghg, hourly=None):
+        self.mw = mw
+        self.ghg = ghg
+        # MW available each hour, None if always self.mw
+        self.hourly = hourly
+
+# The parts of generator_file used by Dispatch, from arrays.
+class ScenarioGenerator(object):
+    def __init__(self, gen_db):
+        self.gen_db = gen_db
+
+    def get_hourly_mw(self, fuel, start_utc, hours):
+        gen = self.gen_db[fuel]
+        if gen.hourly is None:
+            return np.full(hours, gen.mw)
+        return gen.hourly
+
+    # Same order as generator_file.get_merit_order.
+    def get_merit_order(self):
+        return sorted(self.gen_db.keys(), key=lambda fuel: self.gen_db[fuel].ghg)
+
+# The parts of DemandFile used by Dispatch, from an array.
+class ScenarioDemand(object):
+    def __init__(self, load):
+        self.load = load
+
+    def get_mw_hours(self, UTC, hours):
+        return self.load
+
+# The hourly arrays of a grid, for one period.
+class ScenarioBase(object):
+    def __init__(self, the_grid, start_utc, end_utc):
+        self.start_utc = start_utc
+        self.end_utc = end_utc
+        self.hours = 0
+        if end_utc > start_utc:
+            self.hours = hours_in(end_utc - start_utc)
+        self.load = np.array(the_grid.demand.get_mw_hours(start_utc, self.hours))
+        self.gen_db = OrderedDict()
+        generator = the_grid.generator
+        for fuel, gen in generator.gen_db.items():
+            hourly = None
+            if not (gen.gen_files == [] or
+                    (len(gen.gen_files) == 1 and gen.gen_files[0].is_empty())):
+                hourly = generator.get_hourly_mw(fuel, start_utc, self.hours)
+            self.gen_db[fuel] = ScenarioFuel(gen.mw, gen.ghg, hourly)
+
+    # The hours reported by grid.run.
+    def get_run_hours(self):
+        interval = self.end_utc - self.start_utc
+        return interval.days * 24 + ceil(interval.seconds / 3600) + 1
+
+class Scenario(object):
+    def __init__(self, name, load=None, capacity={}, ghg={}, storage_hours=None):
+        self.name = name
+        # AdjustData, or None, for the load, storage and each fuel
+        self.load = load
+        self.capacity = dict(capacity)
+        self.ghg = dict(ghg)
+        self.storage_hours = storage_hours
+
+    # Returns the demand and generator for Dispatch.
+    def apply(self, base):
+        load = base.load
+        if self.load is not None:
+            load = self.load.adjust_array(load)
+        gen_db = OrderedDict()
+        for fuel, gen in base.gen_db.items():
+            gen_db[fuel] = ScenarioFuel(gen.mw, gen.ghg, gen.hourly)
+        for fuel in list(self.capacity.keys()) + list(self.ghg.keys()):
+            if fuel in gen_db:
+                continue
+            if fuel not in self.ghg or self.ghg[fuel].ratio != 0.0:
+                raise ValueError("%s is not in the grid, so needs a %s value." %
+                                 (fuel, SCENARIO_GHG))
+            gen_db[fuel] = ScenarioFuel(0.0, 0.0)
+        for fuel, change in self.capacity.items():
+            gen = gen_db[fuel]
+            mw = _change_value(gen.mw, change)
+            if mw < 0.0:
+                raise ValueError("%s capacity would be %f MW." % (fuel, mw))
+            if gen.hourly is not None and mw != gen.mw:
+                if gen.mw == 0.0:
+                    raise ValueError("Cannot scale %s hourly data from 0 MW." % fuel)
+                gen.hourly = gen.hourly * (mw / gen.mw)
+            gen.mw = mw
+        for fuel, change in self.ghg.items():
+            gen_db[fuel].ghg = _change_value(gen_db[fuel].ghg, change)
+        return ScenarioDemand(load), ScenarioGenerator(gen_db)
+
+    # Returns the new capacity of each fuel changed, if this scenario
+    # only changes capacity of fuels in base without storage, else None.
+    def get_capacity_changes(self, base):
+        if (self.load is not None or self.ghg or self.storage_hours is not None or
+                FUEL_STORAGE in base.gen_db or FUEL_STORAGE in self.capacity):
+            return None
+        changes = {}
+        for fuel, change in self.capacity.items():
+            if fuel not in base.gen_db:
+                return None
+            changes[fuel] = _change_value(base.gen_db[fuel].mw, change)
+        return changes
+
+    # Returns the totals, as grid.run does.  If base_dispatch is a
+    # Dispatch already run on base, it is used for capacity changes.
+    def run(self, base, base_dispatch=None):
+        changes = None
+        if base_dispatch is not None:
+            changes = self.get_capacity_changes(base)
+        if changes is not None:
+            try:
+                totals = base_dispatch.delta_run(changes)
+            finally:
+                base_dispatch.undo()
+            req_MWh, gen_MWh, ghg, f_ghg, brown_hours, brown_diff = totals
+            return req_MWh, gen_MWh, ghg, f_ghg, base.get_run_hours(), brown_hours, brown_diff
+
+        demand, generator = self.apply(base)
+        storage_hours = _change_value(STORAGE_HOURS, self.storage_hours)
+        dispatch = Dispatch(demand, generator, storage_hours=storage_hours)
+        req_MWh, gen_MWh, ghg, f_ghg, brown_hours, brown_diff = dispatch.run(
+                base.start_utc, base.end_utc)
+        return req_MWh, gen_MWh, ghg, f_ghg, base.get_run_hours(), brown_hours, brown_diff
+
+def read_scenario_file(path):
+    with open(path, 'r', newline='') as scenario_file:
+        rows = [row for row in csv.reader(scenario_file, skipinitialspace=True)
+                if [x for x in row if x.strip() != ""]]
+    if rows == [] or rows[0][0].strip() != SCENARIO_NAME:
+        raise ValueError("File %s should start with a '%s' column." % (path, SCENARIO_NAME))
+    columns = []
+    for column in [x.strip() for x in rows[0][1:]]:
+        if column == SCENARIO_LOAD:
+            columns.append((SCENARIO_LOAD, None))
+            continue
+        toks = column.split(" ")
+        if (column != "%s %s" % (FUEL_STORAGE, SCENARIO_HOURS) and
+                (len(toks) != 2 or toks[0] not in MAPPING_KEYWORDS
+                 or toks[1] not in (SCENARIO_CAPACITY, SCENARIO_GHG))):
+            raise ValueError("File %s column '%s' should be '%s', '<FUEL> %s', "
+                             "'<FUEL> %s' or '%s %s'." %
+                             (path, column, SCENARIO_LOAD, SCENARIO_CAPACITY,
+                              SCENARIO_GHG, FUEL_STORAGE, SCENARIO_HOURS))
+        columns.append((toks[1], toks[0]))
+
+    scenarios = []
+    for line_num, row in enumerate(rows[1:]):
+        if len(row) > len(columns) + 1:
+            raise ValueError("File %s Line %d has too many values." % (path, line_num + 2))
+        scenario = Scenario(row[0].strip())
+        try:
+            for (kind, fuel), text in zip(columns, row[1:]):
+                change = parse_change(text)
+                if change is None:
+                    continue
+                if kind == SCENARIO_LOAD:
+                    scenario.load = change
+                elif kind == SCENARIO_CAPACITY:
+                    scenario.capacity[fuel] = change
+                elif kind == SCENARIO_HOURS:
+                    scenario.storage_hours = change
+                else:
+                    scenario.ghg[fuel] = change
+        except ValueError as e:
+            raise ValueError("File %s Line %d %s" % (path, line_num + 2, str(e)))
+        scenarios.append(scenario)
+    return scenarios
+
+# Base and scenarios for run_scenario, set in each process
+# before any are run.  The base dispatch is run by the first
+# scenario that can use it.
+_scenario_base = None
+_scenarios = []
+_base_dispatch = None
+
+def set_scenarios(base, scenarios):
+    global _scenario_base, _scenarios, _base_dispatch
+    _scenario_base = base
+    _scenarios = scenarios
+    _base_dispatch = None
+
+def get_base_dispatch(base):
+    global _base_dispatch
+    if _base_dispatch is None:
+        dispatch = Dispatch(ScenarioDemand(base.load), ScenarioGenerator(base.gen_db))
+        dispatch.run(base.start_utc, base.end_utc)
+        _base_dispatch = dispatch
+    return _base_dispatch
+
+# Returns the name, totals and error of a scenario.
+def run_scenario(idx):
+    scenario = _scenarios[idx]
+    try:
+        base_dispatch = None
+        if scenario.get_capacity_changes(_scenario_base) is not None:
+            try:
+                base_dispatch = get_base_dispatch(_scenario_base)
+            except ValueError:
+                # The base itself cannot be dispatched, so each
+                # scenario reports its own error.
+                pass
+        return [scenario.name, scenario.run(_scenario_base, base_dispatch), ""]
+    except Exception as e:
+        return [scenario.name, None, str(e)]
+
+# Runs each scenario against the_grid, whose base must already
+# have been created from start_utc to end_utc.
+def run_scenarios(the_grid, start_utc, end_utc, scenarios, workers=1):
+    base = ScenarioBase(the_grid, start_utc, end_utc)
+    logging.info("Running %d scenarios..." % len(scenarios))
+    # Scenarios are quick, so send each process many at once.
+    chunksize = max(1, len(scenarios) // (workers * 4))
+    return map_jobs(run_scenario, list(range(len(scenarios))), workers,
+                    initializer=set_scenarios, initargs=(base, scenarios),
+                    chunksize=chunksize)
+
+def write_scenario_results(results, filepath=''):
+    if filepath == '':
+        outfile = sys.stdout
+    else:
+        outfile = open(filepath, 'w', newline='')
+    try:
+        writer = csv.writer(outfile)
+        writer.writerow(RESULT_HEADER)
+        for name, totals, error in results:
+            if totals is None:
+                writer.writerow([name] + [""] * 7 + [error.replace("\n", " ")])
+                continue
+            writer.writerow([name] + list(totals) + [""])
+    finally:
+        if filepath != '':
+            outfile.close()
+
+def create_parser():
+    parser = OptionParser(description="Run scenarios against a grid loaded once.")
+    parser.add_option('-d', '--demand',
+            dest = 'demand_path',
+            action = 'append', type = 'string', default = [],
+            help = 'File path to demand file.',
+            metavar = 'FILE')
+    parser.add_option('-g', '--generator',
+            dest = 'generator_path',
+            action = 'append', type = 'string', default = [],
+            help = 'File path to generator file.',
+            metavar = 'FILE')
+    parser.add_option('-m', '--module',
+            dest = 'module_path',
+            action = 'append', type = 'string', default = [],
+            help = 'Directory containing load and generator files.',
+            metavar = 'DIR')
+    parser.add_option('-s', '--start',
+            dest = 'start_date',
+            action = 'store', type = 'string', default = "",
+            help = 'UTC start date for run, YYYY-MM-DD hh:mm',
+            metavar = 'YYY-MM-DD hh:mm')
+    parser.add_option('-e', '--end',
+            dest = 'end_date',
+            action = 'store', type = 'string', default = "",
+            help = 'UTC end date for run, YYYY-MM-DD hh:mm',
+            metavar = 'YYY-MM-DD hh:mm')
+    parser.add_option('-c', '--scenarios',
+            dest = 'scenario_path',
+            action = 'store', type = 'string', default = "",
+            help = 'CSV file of scenarios, one per row.',
+            metavar = 'FILE')
+    parser.add_option('-j', '--jobs',
+            dest = 'jobs',
+            action = 'store', type = 'int', default = 1,
+            help = 'Number of processes used to load files and run scenarios.',
+            metavar = 'JOBS')
+    parser.add_option('-f', '--output_file',
+            dest = 'output_file',
+            action = 'store', type = 'string', default = "",
+            help = 'File path for scenario totals, standard output if not given.',
+            metavar = 'FILE')
+    return parser
+
+def check_options(options):
+    if options.jobs < 1:
+        raise ValueError("Jobs must be at least 1, not %d." % options.jobs)
+
+    if not os.path.isfile(options.scenario_path):
+        raise ValueError("Scenario file '%s' not found." % options.scenario_path)
+
+    for path in options.module_path:
+        if not os.path.isdir(path):
+            raise ValueError("Module %s directory not found." % path)
+        demand_paths, generator_paths = get_module_files(path)
+        options.demand_path.extend(demand_paths)
+        options.generator_path.extend(generator_paths)
+
+    if options.demand_path == [] or options.generator_path == []:
+        raise ValueError("Must enter at least one demand and generator file.")
+
+    for path in options.demand_path + options.generator_path:
+        if not os.path.isfile(path):
+            raise ValueError("File '%s' not found." % path)
+
+    return check_dates(options)
+
+def main(argv = None):
+    logging.basicConfig(level=logging.INFO)
+
+    parser = create_parser()
+    if argv is None:
+        argv = sys.argv[1:]
+
+    (options, argv) = parser.parse_args(argv)
+    start, end = check_options(options)
+    scenarios = read_scenario_file(options.scenario_path)
+
+    logging.info("Loading Files...")
+    the_grid = grid(options.demand_path, options.generator_path, workers=options.jobs,
+                    window=(start, end))
+    logging.info("Creating load/generation baseline...")
+    the_grid.create_base(start, end)
+    results = run_scenarios(the_grid, start, end, scenarios, workers=options.jobs)
+    write_scenario_results(results, options.output_file)
+    if [x for x in results if x[1] is None]:
+        return -1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Energy storage, such as batteries and pumped hydro.
+
+    Generator files only give the power of FUEL_STORAGE, in MW.
+    The energy it holds is the power times a number of hours,
+    STORAGE_HOURS by default.  Energy is lost when charging, so that
+    only STORAGE_EFFICIENCY of the energy charged is discharged.
+
+    Storage charges from low emission generation that would otherwise
+    not be needed, and discharges into hours that would otherwise use
+    fossil fuels or not be served.  It only charges as much as can
+    be discharged later in the run.  Whether each hour charges or
+    discharges is known before storage is run, so the state of charge
+    is found in one pass through the hours, skipping idle hours.
+"""
+
+import numpy as np
+
+# Hours of discharge at full power
+STORAGE_HOURS = 4.0
+# Fraction of the energy charged which can be discharged
+STORAGE_EFFICIENCY = 0.85
+
+class Storage(object):
+    def __init__(self, power_mw, hours=STORAGE_HOURS, efficiency=STORAGE_EFFICIENCY,
+                 initial_charge=0.0):
+        if power_mw < 0.0:
+            raise ValueError("Storage power must not be negative, not %f MW." % power_mw)
+        if hours <= 0.0:
+            raise ValueError("Storage hours must be more than 0, not %f." % hours)
+        if not (0.0 < efficiency <= 1.0):
+            raise ValueError("Storage efficiency must be more than 0 and at most 1, "
+                             "not %f." % efficiency)
+        if not (0.0 <= initial_charge <= 1.0):
+            raise ValueError("Storage initial charge must be from 0 to 1, not %f." %
+                             initial_charge)
+        self.power_mw = float(power_mw)
+        self.energy_mwh = self.power_mw * hours
+        self.efficiency = float(efficiency)
+        self.initial_mwh = self.energy_mwh * initial_charge
+
+    # Returns the MW charged and discharged, and the MWh stored at
+    # the end of each hour.  surplus is the MW available to charge
+    # each hour, and need the MW that storage could replace.
+    def run(self, surplus, need):
+        hours = len(surplus)
+        charge = np.zeros(hours)
+        discharge = np.zeros(hours)
+        stored = np.zeros(hours)
+        if self.power_mw == 0.0 or hours == 0:
+            stored[:] = self.initial_mwh
+            return charge, discharge, stored
+
+        charging = surplus > 0.0
+        rate = np.where(charging, np.minimum(surplus, self.power_mw),
+                        np.minimum(need, self.power_mw))
+        # Never store more than can be discharged in later hours,
+        # as charging loses energy.
+        wanted = np.where(charging, 0.0, rate)
+        later = wanted.sum() - np.cumsum(wanted)
+        active = np.flatnonzero((charging & (later > 0.0)) | (wanted > 0.0))
+        is_charging = charging[active]
+        count = len(active)
+        # Position of the next charging hour, as nothing can be
+        # discharged while storage is empty.
+        next_charge = np.where(is_charging, np.arange(count), count)
+        next_charge = np.minimum.accumulate(next_charge[::-1])[::-1].tolist()
+        later = later[active].tolist()
+        rate = rate[active].tolist()
+        flags = is_charging.tolist()
+        amounts = [0.0] * count
+        levels = [0.0] * count
+        mwh = self.initial_mwh
+        pos = 0
+        # The state of charge depends on every hour before it, so
+        # this is a loop, over plain floats for speed.
+        while pos < count:
+            if flags[pos]:
+                full = min(self.energy_mwh, later[pos])
+                mw = max(0.0, min(rate[pos], (full - mwh) / self.efficiency))
+                mwh = mwh + mw * self.efficiency
+            elif mwh <= 0.0:
+                pos = next_charge[pos]
+                continue
+            else:
+                mw = min(rate[pos], mwh)
+                mwh = mwh - mw
+            amounts[pos] = mw
+            levels[pos] = mwh
+            pos += 1
+        amounts = np.array(amounts)
+        charge[active[is_charging]] = amounts[is_charging]
+        discharge[active[~is_charging]] = amounts[~is_charging]
+        # Storage holds its charge through idle hours.
+        level = np.full(hours, np.nan)
+        level[active] = levels
+        level = np.concatenate(([self.initial_mwh], level))
+        filled = np.maximum.accumulate(np.where(np.isnan(level), 0, np.arange(hours + 1)))
+        stored[:] = level[filled][1:]
+        return charge, discharge, stored
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Unit test for data assembly.
+
+"""
+
+from data_assembly import *
+
+import os
+import shutil
+import tempfile
+import unittest
+
+# Copies its first argument to stdout, and appends its name to runs.txt
+COPY_SCRIPT = """
+import sys
+with open(sys.argv[1]) as the_file:
+    print(the_file.read().strip())
+with open("runs.txt", "a") as runs:
+    print(sys.argv[1], file=runs)
+if len(sys.argv) > 2:
+    sys.exit(1)
+"""
+
+# Logs the start and end of a step, with the jobs it was given.
+JOBS_SCRIPT = """
+import sys
+import time
+with open("jobs.txt", "a") as log:
+    print("start", sys.argv[1], sys.argv[2], file=log)
+time.sleep(0.2)
+with open("jobs.txt", "a") as log:
+    print("end", sys.argv[1], file=log)
+"""
+
+class TestDataAssembly(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.write("copy.py", COPY_SCRIPT)
+        self.write("src_a.txt", "a")
+        self.write("src_c.txt", "c")
+        # b is derived from a, c is independent
+        self.steps = [
+            AssemblyStep("a", ".", [AssemblyCommand("copy.py", ["src_a.txt"], stdout="a.txt")],
+                         ["src_a.txt"], ["a.txt"]),
+            AssemblyStep("b", ".", [AssemblyCommand("copy.py", ["a.txt"], stdout="b.txt")],
+                         ["a.txt"], ["b.txt"], ["a"]),
+            AssemblyStep("c", ".", [AssemblyCommand("copy.py", ["src_c.txt"], stdout="c.txt")],
+                         ["src_c.txt"], ["c.txt"]),
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def write(self, name, text):
+        with open(os.path.join(self.tempdir, name), 'w') as the_file:
+            print(text, file=the_file)
+
+    def read(self, name):
+        with open(os.path.join(self.tempdir, name)) as the_file:
+            return the_file.read()
+
+    def get_runs(self):
+        runs = self.read("runs.txt").split()
+        os.remove(os.path.join(self.tempdir, "runs.txt"))
+        return runs
+
+    def test_incremental(self):
+        results = run_steps(self.steps, self.tempdir, workers=2)
+        self.assertEqual(list(results.values()), [STEP_RAN] * 3)
+        self.assertEqual(self.read("b.txt"), "a\n")
+        self.assertEqual(sorted(self.get_runs()), ["a.txt", "src_a.txt", "src_c.txt"])
+
+        results = run_steps(self.steps, self.tempdir, workers=2)
+        self.assertEqual(list(results.values()), [STEP_SKIPPED] * 3)
+
+        # Same contents, new modification time
+        self.write("src_c.txt", "c")
+        # New contents rebuild a and b, but not c
+        self.write("src_a.txt", "a2")
+        results = run_steps(self.steps, self.tempdir, workers=2, dry_run=True)
+        self.assertEqual(list(results.values()),
+                         [STEP_OUT_OF_DATE, STEP_OUT_OF_DATE, STEP_SKIPPED])
+        results = run_steps(self.steps, self.tempdir, workers=2)
+        self.assertEqual(list(results.values()), [STEP_RAN, STEP_RAN, STEP_SKIPPED])
+        self.assertEqual(self.read("b.txt"), "a2\n")
+        self.assertEqual(self.get_runs(), ["src_a.txt", "a.txt"])
+
+        # Missing outputs and forced steps are rebuilt
+        os.remove(os.path.join(self.tempdir, "c.txt"))
+        results = run_steps(self.steps, self.tempdir, force=["a"])
+        self.assertEqual(list(results.values()), [STEP_RAN, STEP_SKIPPED, STEP_RAN])
+
+    def test_failure(self):
+        self.steps[0].commands[0].args.append("fail")
+        self.write("a.txt", "old")
+        results = run_steps(self.steps, self.tempdir)
+        self.assertEqual(list(results.values()), [STEP_FAILED, STEP_BLOCKED, STEP_RAN])
+        # The old output is kept, and the step runs again next time.
+        self.assertEqual(self.read("a.txt"), "old\n")
+        self.assertFalse([x for x in os.listdir(self.tempdir) if x.endswith(".tmp")])
+        self.assertNotIn("a", load_state(self.tempdir))
+
+    def test_parallel_steps(self):
+        self.write("jobs.py", JOBS_SCRIPT)
+        steps = [AssemblyStep(name, ".", [AssemblyCommand("jobs.py", [name, "%(jobs)d"])],
+                              [], [], parallel=(name == "p"))
+                 for name in ["a", "b", "p", "c"]]
+        results = run_steps(steps, self.tempdir, workers=3)
+        self.assertEqual(list(results.values()), [STEP_RAN] * 4)
+        log = [line.split() for line in self.read("jobs.txt").splitlines()]
+        # The parallel step is given every job, and runs alone.
+        start = log.index(["start", "p", "3"])
+        self.assertEqual(log[start + 1], ["end", "p"])
+        self.assertEqual(len([x for x in log[0:start] if x[0] == "start"]),
+                         len([x for x in log[0:start] if x[0] == "end"]))
+        self.assertEqual(sorted(x[2] for x in log if x[0] == "start" and x[1] != "p"),
+                         ["1", "1", "1"])
+
+    def test_select_steps(self):
+        self.assertEqual([x.name for x in select_steps(self.steps, ["b"])], ["a", "b"])
+        self.assertEqual([x.name for x in select_steps(self.steps, [])], ["a", "b", "c"])
+        self.assertRaises(ValueError, select_steps, self.steps, ["d"])
+        self.steps[0].deps = ["b"]
+        self.assertRaises(ValueError, order_steps, self.steps)
+
+    def test_get_steps(self):
+        steps = order_steps(get_steps())
+        names = [x.name for x in steps]
+        self.assertLess(names.index("01_British_Columbia:load"),
+                        names.index("03_Saskatchewan:load"))
+        self.assertLess(names.index("02_Alberta:gen"), names.index("04_Manitoba:gen"))
+        pei = select_steps(steps, ["09_Prince_Edward_Island"])
+        self.assertEqual(set([x.name.split(":")[0] for x in pei]),
+                         set(["09_Prince_Edward_Island"]))
+
+if __name__ == '__main__':
+    unittest.main()
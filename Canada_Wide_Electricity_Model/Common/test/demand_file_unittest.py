@@ -43,7 +43,7 @@ class TestDemandFile(unittest.TestCase):
         mock_isfile.side_effect = self.mock_isfile_func
         with patch("builtins.open", mock_open(read_data=file_data)) as mock_file:
             df = DemandFile()
-            self.assertEqual(df.dbase, {})
+            self.assertTrue(df.is_empty())
             self.assertFalse(mock_file.called)
 
     @patch('os.path.isfile')
@@ -165,8 +165,7 @@ class TestDemandFile(unittest.TestCase):
             self.assertFalse(mock_file.called)
             df.read_hourly_mw_file("TestFile")
             mock_file.assert_called_with("TestFile", 'r')
-            self.assertEqual(len(df.dbase.keys()), 1)
-            self.assertTrue("2006" in df.dbase.keys())
+            self.assertEqual(df.valid.sum(), 3)
 
             UTC = datetime(2006, 11, 2, hour=8, tzinfo=timezone.utc)
             self.assertEqual(df.get_mw_hour(UTC), 6851.0)
@@ -235,42 +234,24 @@ class TestDemandFile(unittest.TestCase):
             adj = AdjustData()
             df.duplicate_mw_hours(src_time, new_time, interval, adj)
 
-            self.assertEqual(len(df.dbase.keys()), 1)
-            self.assertTrue("2006" in df.dbase.keys())
-            self.assertEqual(len(df.dbase["2006"].keys()), 1)
-            self.assertTrue("1" in df.dbase["2006"].keys())
-            self.assertEqual(len(df.dbase["2006"]["1"].keys()), 2)
-            self.assertTrue("1" in df.dbase["2006"]["1"].keys())
-            self.assertTrue("2" in df.dbase["2006"]["1"].keys())
-            self.assertEqual(len(df.dbase["2006"]["1"]["1"].keys()), 24)
-            self.assertEqual(len(df.dbase["2006"]["1"]["2"].keys()), 24)
+            self.assertEqual(df.valid.sum(), 48)
+            self.assertTrue(df.get_valid(src_time, 48).all())
             for hour in range (0, 24):
-                self.assertEqual(df.dbase["2006"]["1"]["1"][str(hour)].val,
-                                 df.dbase["2006"]["1"]["2"][str(hour)].val)
+                self.assertEqual(df.get_data(datetime(2006, 1, 1, hour=hour)).val,
+                                 df.get_data(datetime(2006, 1, 2, hour=hour)).val)
 
             interval = timedelta(hours=48)
             new_time = src_time + interval
             adj = AdjustData(abs_adj=100, ratio=1.1)
             df.duplicate_mw_hours(src_time, new_time, interval, adj)
 
-            self.assertEqual(len(df.dbase.keys()), 1)
-            self.assertTrue("2006" in df.dbase.keys())
-            self.assertEqual(len(df.dbase["2006"].keys()), 1)
-            self.assertTrue("1" in df.dbase["2006"].keys())
-            self.assertEqual(len(df.dbase["2006"]["1"].keys()), 4)
-            self.assertTrue("1" in df.dbase["2006"]["1"].keys())
-            self.assertTrue("2" in df.dbase["2006"]["1"].keys())
-            self.assertTrue("3" in df.dbase["2006"]["1"].keys())
-            self.assertTrue("4" in df.dbase["2006"]["1"].keys())
-            self.assertEqual(len(df.dbase["2006"]["1"]["1"].keys()), 24)
-            self.assertEqual(len(df.dbase["2006"]["1"]["2"].keys()), 24)
-            self.assertEqual(len(df.dbase["2006"]["1"]["3"].keys()), 24)
-            self.assertEqual(len(df.dbase["2006"]["1"]["4"].keys()), 24)
+            self.assertEqual(df.valid.sum(), 96)
+            self.assertTrue(df.get_valid(src_time, 96).all())
             for hour in range (0, 24):
-                self.assertEqual((df.dbase["2006"]["1"]["1"][str(hour)].val * 1.1) + 100,
-                                 df.dbase["2006"]["1"]["3"][str(hour)].val)
-                self.assertEqual((df.dbase["2006"]["1"]["2"][str(hour)].val * 1.1) + 100,
-                                 df.dbase["2006"]["1"]["4"][str(hour)].val)
+                self.assertEqual((df.get_data(datetime(2006, 1, 1, hour=hour)).val * 1.1) + 100,
+                                 df.get_data(datetime(2006, 1, 3, hour=hour)).val)
+                self.assertEqual((df.get_data(datetime(2006, 1, 2, hour=hour)).val * 1.1) + 100,
+                                 df.get_data(datetime(2006, 1, 4, hour=hour)).val)
 
     def test_adjust_mw_hours(self):
         file_data = self.file_header + ("\n"
@@ -323,8 +304,8 @@ class TestDemandFile(unittest.TestCase):
                 print("ADJ %f %s" % (data.val, ",".join([str(x) for x in data.data_array[0]])))
 
             for hour in range (0, 24):
-                self.assertEqual(df.dbase["2006"]["1"]["1"][str(hour)].val,
-                                (df.dbase["2006"]["1"]["2"][str(hour)].val * 0.9) + 50.0)
+                self.assertEqual(df.get_data(datetime(2006, 1, 1, hour=hour)).val,
+                                (df.get_data(datetime(2006, 1, 2, hour=hour)).val * 0.9) + 50.0)
 
 if __name__ == '__main__':
     unittest.main()
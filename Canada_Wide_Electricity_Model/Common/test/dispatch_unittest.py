@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Unit test for merit order dispatch.
+
+"""
+
+from dispatch import Dispatch, get_merit_fuels, dispatch_merit_order
+from demand_file import DemandFile
+from generator_file import generator_file
+from common_defs import *
+
+import unittest
+import mock
+import numpy as np
+from unittest.mock import patch, mock_open, call
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+class TestDispatch(unittest.TestCase):
+    gen_file_data = ("Fuel, Capacity, GHG_MWh, Timezone\n"
+                     "'COAL', '1000', '100', 'America/Edmonton'\n"
+                     "'NATGAS', '1001', '20', 'America/Regina'\n"
+                     "'NUCLEAR', '1002', '1', 'America/Toronto'\n"
+                     "'SOLAR_PV', '1003', '15', 'America/Vancouver'\n"
+                     "'HYDRO_RES', '1004', '8', 'America/Montreal'\n")
+    start_time = datetime(2000, 1, 1, hour=0)
+    hours = 48
+
+    def setUp(self):
+        self.gf = self.get_generator()
+        # Load climbs past the total capacity.
+        self.demand = self.get_demand(97.3)
+
+    def get_demand(self, step, first=800.0):
+        demand = DemandFile()
+        for hour in range(0, self.hours):
+            UTC = self.start_time + timedelta(hours=hour)
+            ymdh = [UTC.year, UTC.month, UTC.day, UTC.hour]
+            load = first + (hour * step)
+            demand.add_mw_hour("Load", hour, ["Load", hour] + ymdh + ymdh + [load])
+        return demand
+
+    def get_generator(self, solar_ratio=1.0):
+        with patch('os.path.isfile') as mock_isfile:
+            mock_isfile.return_value = False
+            with patch("builtins.open", mock_open(read_data=self.gen_file_data)):
+                gf = generator_file("TestFile")
+        for hour in range(0, self.hours):
+            UTC = self.start_time + timedelta(hours=hour)
+            ymdh = [UTC.year, UTC.month, UTC.day, UTC.hour]
+            # Solar output varies through the day.
+            solar = 1003.0 * abs(12 - UTC.hour) / 12.0 * solar_ratio
+            gf.add_mw_hour("SOLAR_PV", "Solar", hour, ymdh + ymdh + [solar])
+        return gf
+
+    # Runs hours one at a time, the same way grid.run used to.
+    def hourly_run(self, start_utc, end_utc):
+        req_MWh = 0.0
+        gen_MWh = 0.0
+        ghg = 0.0
+        f_ghg = 0.0
+        brown_hours = 0
+        brown_diff = 0.0
+        hourly = []
+        while start_utc < end_utc:
+            capacity = self.gf.get_total_capacity(start_utc)
+            load = self.demand.get_mw_hour(start_utc)
+            req_MWh += load
+            if (load > capacity):
+                brown_hours += 1
+                brown_diff = max(brown_diff, load - capacity)
+                load = capacity
+            gen_ghg, foss_ghg, gen_db = self.gf.get_ghg_emissions(load, start_utc)
+            gen_MWh += load
+            ghg += gen_ghg
+            f_ghg += foss_ghg
+            hourly.append(gen_db)
+            start_utc += timedelta(hours=1)
+        return (req_MWh, gen_MWh, ghg, f_ghg, brown_hours, brown_diff), hourly
+
+    def test_init(self):
+        dispatch = Dispatch(self.demand, self.gf)
+        self.assertEqual(dispatch.hours, 0)
+        self.assertEqual(dispatch.fuels, [])
+
+    def test_merit_order(self):
+        self.assertEqual(get_merit_fuels(OrderedDict([(FUEL_COAL, 100.0), (FUEL_STORAGE, 0.0),
+                                                      (FUEL_NUCLEAR, 1.0), (FUEL_WIND, 1.0)])),
+                         [FUEL_NUCLEAR, FUEL_WIND, FUEL_COAL])
+        self.assertEqual(get_merit_fuels(OrderedDict((fuel, gen.ghg)
+                                                     for fuel, gen in self.gf.gen_db.items())),
+                         self.gf.get_merit_order())
+
+        load = np.array([50.0, 150.0, 400.0])
+        avail = np.array([[100.0, 100.0, 100.0], [80.0, 0.0, 200.0]])
+        mw, dispatched, before, unserved = dispatch_merit_order(load, avail, avail.sum(axis=0))
+        self.assertEqual(mw.tolist(), [[50.0, 100.0, 100.0], [0.0, 0.0, 200.0]])
+        self.assertEqual(dispatched.tolist(), [[True, True, True], [False, False, True]])
+        self.assertEqual(before.tolist(), [[0.0, 0.0, 0.0], [50.0, 100.0, 100.0]])
+        self.assertEqual(unserved.tolist(), [0.0, 50.0, 100.0])
+
+    def test_run(self):
+        end_time = self.start_time + timedelta(hours=self.hours)
+        exp_totals, exp_hourly = self.hourly_run(self.start_time, end_time)
+
+        dispatch = Dispatch(self.demand, self.gf)
+        totals = dispatch.run(self.start_time, end_time)
+        self.assertEqual(totals, exp_totals)
+        self.assertTrue(totals[4] > 0)
+        self.assertEqual(dispatch.hours, self.hours)
+        self.assertEqual(dispatch.fuels,
+                         ["NUCLEAR", "HYDRO_RES", "SOLAR_PV", "NATGAS", "COAL"])
+        for hour in range(0, self.hours):
+            self.assertEqual(dispatch.get_hour(hour), exp_hourly[hour])
+
+    def test_run_partial(self):
+        start_time = self.start_time + timedelta(hours=5)
+        end_time = self.start_time + timedelta(hours=17)
+        exp_totals, _ = self.hourly_run(start_time, end_time)
+        dispatch = Dispatch(self.demand, self.gf)
+        self.assertEqual(dispatch.run(start_time, end_time), exp_totals)
+        self.assertEqual(dispatch.hours, 12)
+
+        self.assertEqual(dispatch.run(end_time, start_time), (0.0, 0.0, 0.0, 0.0, 0, 0.0))
+        self.assertEqual(dispatch.hours, 0)
+
+    def test_storage(self):
+        end_time = self.start_time + timedelta(hours=self.hours)
+        dispatch = Dispatch(self.demand, self.gf)
+        base = dispatch.run(self.start_time, end_time)
+        fossil = dispatch.mw[[get_fossil_fuel(x) for x in dispatch.fuels]].sum(axis=0)
+        surplus = dispatch.capacity - dispatch.load - fossil > 0
+        need = fossil + dispatch.load - dispatch.served
+
+        self.gf.add_generator([FUEL_STORAGE, '500', '5', 'America/Toronto'], "")
+        dispatch = Dispatch(self.demand, self.gf, storage_hours=2.0, storage_efficiency=0.8)
+        totals = dispatch.run(self.start_time, end_time)
+        self.assertEqual(dispatch.fuels,
+                         ["NUCLEAR", "STORAGE", "HYDRO_RES", "SOLAR_PV", "NATGAS", "COAL"])
+        row = dispatch.fuels.index(FUEL_STORAGE)
+        self.assertEqual(dispatch.mw[row].tolist(),
+                         (dispatch.discharge - dispatch.charge).tolist())
+        self.assertEqual(dispatch.ghg[row].tolist(), (dispatch.discharge * 5).tolist())
+
+        # Charges from surplus, discharges where fossil fuels or
+        # unserved load were needed, within the limits of storage.
+        self.assertGreater(dispatch.charge.sum(), 0.0)
+        self.assertFalse((dispatch.charge[~surplus] > 0).any())
+        self.assertFalse((dispatch.discharge > need).any())
+        self.assertLessEqual(dispatch.charge.max(), 500.0)
+        self.assertLessEqual(dispatch.stored.max(), 1000.0)
+        self.assertAlmostEqual(dispatch.discharge.sum(), dispatch.charge.sum() * 0.8)
+
+        # Load is served by generation plus storage.
+        self.assertTrue(np.allclose(dispatch.mw.sum(axis=0), dispatch.served))
+        self.assertEqual(totals[0], base[0])
+        self.assertGreaterEqual(totals[1], base[1])
+        self.assertLess(totals[3], base[3])
+        self.assertLessEqual(totals[4], base[4])
+
+    def test_marginal(self):
+        # One more MW of load adds the marginal fuel's GHG per MWh.
+        end_time = self.start_time + timedelta(hours=self.hours)
+        dispatch = Dispatch(self.get_demand(64.0), self.gf)
+        dispatch.run(self.start_time, end_time)
+        more = Dispatch(self.get_demand(64.0, first=801.0), self.gf)
+        more.run(self.start_time, end_time)
+        self.assertEqual(set(dispatch.marginal.tolist()), set(range(len(dispatch.fuels))))
+        # Unless the marginal fuel has less than one MW left.
+        left = (dispatch.avail - dispatch.mw)[dispatch.marginal, np.arange(self.hours)]
+        self.assertEqual(np.flatnonzero(left < 1.0).tolist(), [41])
+        self.assertTrue(np.allclose((more.hour_ghg - dispatch.hour_ghg)[left >= 1.0],
+                                    dispatch.marginal_ghg[left >= 1.0]))
+        row = dispatch.marginal[40]
+        self.assertEqual(dispatch.fuels[row], "COAL")
+        self.assertEqual(dispatch.marginal_ghg[40], 100.0)
+
+        # No fuel is marginal when load is not all served.
+        dispatch = Dispatch(self.demand, self.gf)
+        dispatch.run(self.start_time, end_time)
+        short = dispatch.unserved > 0.0
+        self.assertTrue(short.any())
+        self.assertEqual(dispatch.marginal[short].tolist(), [-1] * np.count_nonzero(short))
+        self.assertTrue(np.isnan(dispatch.marginal_ghg[short]).all())
+
+    def test_delta_run(self):
+        end_time = self.start_time + timedelta(hours=self.hours)
+        dispatch = Dispatch(self.demand, self.gf)
+        base = dispatch.run(self.start_time, end_time)
+        base_mw = dispatch.mw.copy()
+
+        # Same results as a run with the changed capacities.
+        totals = dispatch.delta_run({"NATGAS" : 500.0, "SOLAR_PV" : 2006.0})
+        gf = self.get_generator(solar_ratio=2.0)
+        gf.gen_db["NATGAS"].mw = 500.0
+        gf.gen_db["SOLAR_PV"].mw = 2006.0
+        expected = Dispatch(self.demand, gf)
+        self.assertEqual(totals, expected.run(self.start_time, end_time))
+        self.assertEqual(dispatch.mw.tolist(), expected.mw.tolist())
+        self.assertEqual(dispatch.served.tolist(), expected.served.tolist())
+
+        dispatch.undo()
+        self.assertEqual(dispatch.totals, base)
+        self.assertEqual(dispatch.mw.tolist(), base_mw.tolist())
+
+        self.assertRaises(ValueError, dispatch.delta_run, {"COAL" : -1.0})
+        dispatch.undo()
+        self.assertRaises(ValueError, dispatch.delta_run, {"WIND" : 10.0})
+        dispatch.undo()
+        self.assertEqual(dispatch.totals, base)
+
+    def test_delta_run_hours(self):
+        # Coal is only needed at night, so only those hours are
+        # dispatched again.
+        end_time = self.start_time + timedelta(hours=self.hours)
+        demand = self.get_demand(64.0)
+        dispatch = Dispatch(demand, self.gf)
+        base = dispatch.run(self.start_time, end_time)
+        base_ghg = dispatch.ghg.copy()
+        totals = dispatch.delta_run({"COAL" : 0.0})
+        self.assertEqual(dispatch.last_delta["cols"].tolist(), [36, 37, 38, 39, 40])
+        self.assertGreater(totals[4], 0)
+
+        self.gf.gen_db["COAL"].mw = 0.0
+        expected = Dispatch(demand, self.gf)
+        self.assertEqual(totals, expected.run(self.start_time, end_time))
+        self.assertEqual(dispatch.ghg.tolist(), expected.ghg.tolist())
+        self.assertEqual(dispatch.unserved.tolist(), expected.unserved.tolist())
+        self.assertEqual(dispatch.marginal.tolist(), expected.marginal.tolist())
+        dispatch.undo()
+        self.assertEqual(dispatch.totals, base)
+        self.assertEqual(dispatch.ghg.tolist(), base_ghg.tolist())
+
+    def test_delta_run_storage(self):
+        end_time = self.start_time + timedelta(hours=self.hours)
+        self.gf.add_generator([FUEL_STORAGE, '0', '5', 'America/Toronto'], "")
+        dispatch = Dispatch(self.demand, self.gf)
+        base = dispatch.run(self.start_time, end_time)
+        self.assertNotIn(FUEL_STORAGE, dispatch.fuels)
+        # All hours are dispatched again with storage.
+        totals = dispatch.delta_run({FUEL_STORAGE : 500.0, "COAL" : 800.0})
+        self.assertEqual(dispatch.fuels[1], FUEL_STORAGE)
+
+        self.gf.gen_db[FUEL_STORAGE].mw = 500.0
+        self.gf.gen_db["COAL"].mw = 800.0
+        self.assertEqual(totals, Dispatch(self.demand, self.gf).run(self.start_time, end_time))
+        dispatch.undo()
+        self.assertEqual(dispatch.totals, base)
+        self.assertNotIn(FUEL_STORAGE, dispatch.fuels)
+
+    def test_run_no_load(self):
+        start_time = self.start_time + timedelta(hours=self.hours - 2)
+        end_time = start_time + timedelta(hours=4)
+        dispatch = Dispatch(self.demand, self.gf)
+        with self.assertRaises(ValueError) as context:
+            dispatch.run(start_time, end_time)
+        self.assertTrue("No load for UTC 2000-01-03 00:00" in str(context.exception))
+
+    def test_run_no_generation(self):
+        end_time = self.start_time + timedelta(hours=self.hours + 2)
+        UTC = self.start_time + timedelta(hours=self.hours)
+        ymdh = [UTC.year, UTC.month, UTC.day, UTC.hour]
+        self.demand.add_mw_hour("Load", 99, ["Load", 99] + ymdh + ymdh + [100.0])
+        self.gf.gen_db["NUCLEAR"].mw = 0.0
+        self.gf.gen_db["HYDRO_RES"].mw = 0.0
+        dispatch = Dispatch(self.demand, self.gf)
+        with self.assertRaises(ValueError) as context:
+            dispatch.run(self.start_time, end_time)
+        self.assertTrue("2000-01-03 00:00 SOLAR_PV ghg is NaN!" in str(context.exception))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Unit test for the capacity expansion search.
+
+"""
+
+from expansion import *
+from scenario import ScenarioBase, ScenarioFuel
+from common_defs import *
+
+import unittest
+import numpy as np
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+# A ScenarioBase from arrays, rather than a grid.
+class ArrayBase(ScenarioBase):
+    def __init__(self, load, gen_db):
+        self.start_utc = datetime(2019, 1, 1)
+        self.hours = len(load)
+        self.end_utc = self.start_utc + timedelta(hours=self.hours)
+        self.load = np.array(load, dtype=float)
+        self.gen_db = OrderedDict(gen_db)
+
+class TestExpansion(unittest.TestCase):
+    hours = 96
+
+    def get_base(self, storage_mw=0.0):
+        hour = np.arange(self.hours)
+        # Wind blows harder some hours, solar only shines by day.
+        wind = 50.0 * (1.0 + np.sin(hour / 5.0))
+        solar = np.where(hour % 24 < 12, 40.0, 0.0)
+        gen_db = [(FUEL_COAL, ScenarioFuel(100.0, 880.0)),
+                  (FUEL_WIND, ScenarioFuel(100.0, 14.0, wind)),
+                  (FUEL_SOLAR_PV, ScenarioFuel(40.0, 64.0, solar)),
+                  (FUEL_NATURAL_GAS, ScenarioFuel(60.0, 620.0))]
+        if storage_mw:
+            gen_db.append((FUEL_STORAGE, ScenarioFuel(storage_mw, 15.0)))
+        return ArrayBase(180.0 + 20.0 * np.cos(hour / 3.0), gen_db)
+
+    def test_parse_build(self):
+        self.assertEqual(parse_build("WIND"), (FUEL_WIND, 1.0))
+        self.assertEqual(parse_build("NUCLEAR=2.5"), (FUEL_NUCLEAR, 2.5))
+        for text in ["COAL", "WINDY", "WIND=x", "WIND=0", "WIND=1=2"]:
+            self.assertRaises(ValueError, parse_build, text)
+
+    def test_evaluate(self):
+        # Dispatching only some hours gives the same totals as
+        # dispatching the build.
+        base = self.get_base(storage_mw=20.0)
+        search = CapacitySearch(base, 0.0, OrderedDict([(FUEL_WIND, 1.0), (FUEL_NUCLEAR, 1.0),
+                                                        (FUEL_STORAGE, 1.0)]))
+        first = search.evaluate(search.added)
+        self.assertGreater(first.brown_hours, 0)
+        search.added[FUEL_WIND] = 60.0
+        search.cols = search.evaluate(search.added).active
+        search.added[FUEL_NUCLEAR] = 25.0
+        search.added[FUEL_STORAGE] = 10.0
+        result = search.evaluate(search.added)
+        self.assertLess(len(search.cols), self.hours)
+
+        totals = search.run_build()
+        self.assertAlmostEqual(result.fossil_ghg, totals[3], places=3)
+        self.assertEqual(result.brown_hours, totals[5])
+        scenario = search.get_scenario()
+        self.assertEqual(scenario.ghg[FUEL_NUCLEAR].adjust([0.0]), [8.0])
+
+    def test_search(self):
+        base = self.get_base()
+        search = CapacitySearch(base, 0.0, OrderedDict([(FUEL_NUCLEAR, 1.0)]), step=10.0)
+        added = search.run()
+        # Enough nuclear to serve the peak with no wind or solar.
+        peak = np.max(base.load - np.minimum(base.gen_db[FUEL_WIND].hourly, 100.0)
+                      - base.gen_db[FUEL_SOLAR_PV].hourly)
+        self.assertEqual(added[FUEL_NUCLEAR], np.ceil(peak / 10.0) * 10.0)
+        totals = search.run_build()
+        self.assertEqual((totals[3], totals[5]), (0.0, 0))
+
+        # No step can be removed.
+        search = CapacitySearch(base, 1E5, OrderedDict([(FUEL_WIND, 1.0), (FUEL_NUCLEAR, 3.0),
+                                                        (FUEL_STORAGE, 0.5)]), step=5.0)
+        added = search.run()
+        self.assertTrue(search.meets_target(search.evaluate(added)))
+        for fuel in added:
+            if added[fuel] > 0.0:
+                added[fuel] -= 5.0
+                self.assertFalse(search.meets_target(search.evaluate(added)))
+                added[fuel] += 5.0
+
+    def test_cannot_meet(self):
+        # Solar cannot serve the night.
+        search = CapacitySearch(self.get_base(), 0.0, OrderedDict([(FUEL_SOLAR_PV, 1.0)]))
+        self.assertRaises(ValueError, search.run)
+        base = self.get_base()
+        base.gen_db[FUEL_WIND].mw = 0.0
+        self.assertRaises(ValueError, CapacitySearch, base, 0.0, {FUEL_WIND : 1.0})
+        del base.gen_db[FUEL_WIND]
+        self.assertRaises(ValueError, CapacitySearch, base, 0.0, {FUEL_WIND : 1.0})
+
+if __name__ == '__main__':
+    unittest.main()
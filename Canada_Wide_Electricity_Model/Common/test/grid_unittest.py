@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Unit test for grid file.
+
+"""
+
+from grid import *
+from hourly_mw_file import HourlyMWFile
+from result_sink import TextSink
+from common_defs import *
+
+import os
+import io
+import shutil
+import tempfile
+import contextlib
+import unittest
+import numpy as np
+from datetime import datetime, timedelta
+
+class TestGrid(unittest.TestCase):
+    start_time = datetime(2019, 1, 1, hour=0)
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.demand_paths = []
+        self.gen_paths = []
+        self.add_module("01_A", 48, 500.0,
+                        ["'COAL', '1000', '880', 'America/Halifax'",
+                         "'SOLAR_PV', '100', '64', 'America/Halifax'"],
+                        self.start_time, 48)
+        self.add_module("02_B", 48, 250.0,
+                        ["'NATGAS', '400', '620', 'America/Moncton'",
+                         "'COAL', '200', '', ''",
+                         "'SOLAR_PV', '50', '60', ''"],
+                        self.start_time, 48)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def add_module(self, name, hours, load, gen_lines, pv_start, pv_hours):
+        path = os.path.join(self.tempdir, name)
+        os.mkdir(path)
+        with open(os.path.join(path, FILE_LOAD_DB), 'w') as load_file:
+            print("File, LineNum, UTC_Year, UTC_Month, UTC_Day, UTC_Hour, "
+                  "Year, Month, Day, Hour, Load(MW)", file=load_file)
+            for hour in range(0, hours):
+                self.print_hour(load_file, ["Src.csv", str(hour + 2)],
+                                self.start_time + timedelta(hours=hour), load + hour)
+        with open(os.path.join(path, FILE_GEN_DB), 'w') as gen_file:
+            print("Fuel, Capacity, GHG_MWh, Timezone", file=gen_file)
+            for line in gen_lines:
+                print(line, file=gen_file)
+        with open(os.path.join(path, get_filename(FUEL_SOLAR_PV)), 'w') as pv_file:
+            print(HourlyMWFile.file_header, file=pv_file)
+            for hour in range(0, pv_hours):
+                self.print_hour(pv_file, [], pv_start + timedelta(hours=hour), hour * 2.5)
+        self.demand_paths.append(os.path.join(path, FILE_LOAD_DB))
+        self.gen_paths.append(os.path.join(path, FILE_GEN_DB))
+
+    def print_hour(self, the_file, prefix, UTC, mw):
+        local = UTC - timedelta(hours=4)
+        toks = prefix + [str(x) for x in [UTC.year, UTC.month, UTC.day, UTC.hour,
+                                          local.year, local.month, local.day, local.hour, mw]]
+        print("%s%s%s" % (START_END, SEPARATOR.join(toks), START_END), file=the_file)
+
+    def run_grid(self, the_grid):
+        end_time = self.start_time + timedelta(hours=47)
+        the_grid.create_base(self.start_time, end_time)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            totals = the_grid.run(self.start_time, end_time, TextSink())
+        return totals, output.getvalue()
+
+    def test_load_parallel(self):
+        serial = grid(self.demand_paths, self.gen_paths)
+        parallel = grid(self.demand_paths, self.gen_paths, workers=2)
+
+        self.assertEqual(parallel.demand.files, serial.demand.files)
+        self.assertEqual(parallel.demand.get_values(self.start_time, 48).tolist(),
+                         serial.demand.get_values(self.start_time, 48).tolist())
+        self.assertEqual(list(parallel.generator.gen_db.keys()), ["COAL", "SOLAR_PV", "NATGAS"])
+        self.assertEqual(list(parallel.generator.gen_db.keys()),
+                         list(serial.generator.gen_db.keys()))
+        for fuel, gen in serial.generator.gen_db.items():
+            other = parallel.generator.gen_db[fuel]
+            self.assertEqual((other.mw, other.ghg, other.tz_str, other.min_time, other.max_time),
+                             (gen.mw, gen.ghg, gen.tz_str, gen.min_time, gen.max_time))
+            self.assertEqual(len(other.gen_files), len(gen.gen_files))
+        self.assertEqual(parallel.generator.gen_db["COAL"].ghg, 880.0)
+        self.assertEqual(parallel.generator.gen_db["SOLAR_PV"].tz_str, "America/Halifax")
+        self.assertEqual(self.run_grid(parallel), self.run_grid(serial))
+        self.assertEqual(parallel.results.get_totals(), serial.results.get_totals())
+        self.assertEqual(parallel.results.hours, 47)
+
+    def test_run_all(self):
+        self.add_module("Transportation", 48, 10.0,
+                        ["'NATGAS', '100', '620', 'America/Moncton'"],
+                        self.start_time, 48)
+        os.mkdir(os.path.join(self.tempdir, "03_C"))
+        shutil.copy(self.gen_paths[0], os.path.join(self.tempdir, "03_C"))
+        end_time = self.start_time + timedelta(hours=47)
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            results = run_all(self.tempdir, self.start_time, end_time, workers=2)
+        self.assertEqual([x[0] for x in results],
+                         ["01_A", "02_B", "03_C", "Transportation",
+                          "Canada", "Canada plus Transportation"])
+        self.assertEqual(results[2][3], None)
+        self.assertEqual(results[2][4], "No load_db.txt found.")
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 2 + len(results))
+        self.assertTrue(lines[4].startswith("03_C "))
+        self.assertTrue(lines[4].endswith("FAILURE! No load_db.txt found."))
+        self.assertTrue(lines[2].endswith("SUCCESS"))
+
+        # 03_C has generators, but no load
+        c_gen_path = os.path.join(self.tempdir, "03_C", FILE_GEN_DB)
+        for idx, paths, gen_paths in [(0, [0], [0]), (1, [1], [1]), (3, [2], [2]),
+                                      (4, [0, 1], [0, 1, 3]), (5, [0, 1, 2], [0, 1, 3, 2])]:
+            expected = grid([self.demand_paths[x] for x in paths],
+                            [(self.gen_paths + [c_gen_path])[x] for x in gen_paths])
+            expected.create_base(self.start_time, end_time)
+            self.assertEqual(results[idx][3], expected.run(self.start_time, end_time))
+
+        factors_path = os.path.join(self.tempdir, "factors.npz")
+        with contextlib.redirect_stdout(io.StringIO()):
+            sequential = run_all(self.tempdir, self.start_time, end_time,
+                                 factors_path=factors_path)
+        self.assertEqual(sequential, results)
+        with np.load(factors_path) as data:
+            self.assertEqual(sorted(set(key.split("/")[0] for key in data.keys())),
+                             ["01_A", "02_B", "Canada", "Canada plus Transportation",
+                              "Transportation"])
+            self.assertEqual(str(data["Canada/start_utc"]),
+                             self.start_time.strftime(DATE_FORMAT))
+            self.assertEqual(len(data["Canada/marginal_ghg"]), 47)
+
+    def test_load_parallel_error(self):
+        with open(self.demand_paths[1], 'a') as load_file:
+            print("'Bad line'", file=load_file)
+        with self.assertRaises(ValueError) as context:
+            grid(self.demand_paths, self.gen_paths, workers=2)
+        self.assertTrue("Bad format" in str(context.exception))
+
+    def test_check_options_jobs(self):
+        parser = create_parser()
+        (options, argv) = parser.parse_args(["-d", self.demand_paths[0],
+                                             "-g", self.gen_paths[0],
+                                             "-s", "2019-01-01 00:00",
+                                             "-e", "2019-01-02 23:00", "-j", "0"])
+        with self.assertRaises(ValueError) as context:
+            check_options(options)
+        self.assertTrue("Jobs must be at least 1, not 0." in str(context.exception))
+
+if __name__ == '__main__':
+    unittest.main()
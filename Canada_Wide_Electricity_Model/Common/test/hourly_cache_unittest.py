@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Unit test for hourly_cache file.
+
+"""
+
+from hourly_cache import *
+from hourly_cache import _read_header
+from hourly_mw_file import HourlyMWFile
+from demand_file import DemandFile
+
+import os
+import shutil
+import numpy as np
+import tempfile
+import unittest
+from unittest import mock
+
+class TestHourlyCache(unittest.TestCase):
+    file_data = ("File, LineNum, UTC_Year, UTC_Month, UTC_Day, UTC_Hour, "
+                 "Year, Month, Day, Hour, Load(MW)\n"
+                 "'Src.csv', '2', '2020', '1', '1', '5', '2020', '1', '1', '0', '100.0'\n"
+                 "'Src.csv', '3', '2020', '1', '1', '6', '2020', '1', '1', '1', '101.5'\n"
+                 "'Other.csv', '9', '2020', '1', '1', '6', '2020', '1', '1', '1', '2.0'\n"
+                 "'Src.csv', '4', '2020', '1', '1', '8', '2020', '1', '1', '3', '103.0'\n")
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, "load_db.txt")
+        self.write_file(self.file_data)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def write_file(self, data):
+        with open(self.path, 'w') as the_file:
+            the_file.write(data)
+
+    def assert_same(self, first, second):
+        self.assertEqual(first.min_time, second.min_time)
+        self.assertEqual(first.max_time, second.max_time)
+        self.assertEqual([(x.val, x.data_array) for x in first],
+                         [(x.val, x.data_array) for x in second])
+
+    def test_get_cache_path(self):
+        self.assertEqual(get_cache_path("load_db.txt"), "load_db.txt.hmwcache")
+
+    def test_get_source_key(self):
+        key = get_source_key(self.path)
+        self.assertEqual(key["size"], len(self.file_data))
+        self.assertEqual(get_source_key(os.path.join(self.tempdir, "None.txt")), None)
+
+    def test_round_trip(self):
+        demand = DemandFile(self.path)
+        self.assertTrue(os.path.isfile(get_cache_path(self.path)))
+        self.assertEqual(demand.files, [self.path])
+
+        cached = DemandFile()
+        self.assertTrue(read_cache(self.path, cached, cached.file_header))
+        self.assert_same(cached, demand)
+        self.assertEqual(cached.get_values(demand.min_time, 4).tolist()[0:2], [100.0, 103.5])
+
+        reread = DemandFile(self.path)
+        self.assertEqual(reread.files, [self.path])
+        self.assert_same(reread, demand)
+
+    def test_mmap(self):
+        demand = DemandFile(self.path)
+        cache_path = get_cache_path(self.path)
+        with open(cache_path, 'rb') as cache_file:
+            before = cache_file.read()
+
+        cached = DemandFile()
+        self.assertTrue(read_cache(self.path, cached, cached.file_header, 'c'))
+        self.assert_same(cached, demand)
+        self.assertEqual(type(cached.values), np.ndarray)
+        self.assertTrue(isinstance(cached.values.base, np.memmap))
+
+        # Changes are private to this process
+        cached.values[0] = 99.0
+        cached.provenance.mw[0] = 99.0
+        self.assertEqual(cached.get_value(cached.min_time), 99.0)
+        with open(cache_path, 'rb') as cache_file:
+            self.assertEqual(cache_file.read(), before)
+
+        reread = DemandFile(self.path)
+        self.assertTrue(isinstance(reread.values.base, np.memmap))
+        self.assert_same(reread, demand)
+
+    def test_mmap_empty(self):
+        self.write_file(self.file_data.split("\n")[0] + "\n")
+        DemandFile(self.path)
+        cached = DemandFile()
+        self.assertTrue(read_cache(self.path, cached, cached.file_header, 'c'))
+        self.assertTrue(cached.is_empty())
+
+    def test_wrong_header(self):
+        DemandFile(self.path)
+        hourly = HourlyMWFile()
+        self.assertFalse(read_cache(self.path, hourly, hourly.file_header))
+        self.assertTrue(hourly.is_empty())
+
+    def test_no_cache(self):
+        demand = DemandFile()
+        self.assertFalse(read_cache(self.path, demand, demand.file_header))
+
+        demand.use_cache = False
+        demand.read_hourly_mw_file(self.path)
+        self.assertFalse(os.path.isfile(get_cache_path(self.path)))
+
+    def test_source_changed(self):
+        DemandFile(self.path)
+        stat = os.stat(self.path)
+        self.write_file(self.file_data.replace("100.0", "200.0"))
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        demand = DemandFile()
+        self.assertFalse(read_cache(self.path, demand, demand.file_header))
+
+        demand = DemandFile(self.path)
+        self.assertEqual(demand.get_value(demand.min_time), 200.0)
+
+    def test_source_touched(self):
+        DemandFile(self.path)
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        demand = DemandFile()
+        self.assertTrue(read_cache(self.path, demand, demand.file_header, 'c'))
+        expected = DemandFile(self.path)
+        self.assert_same(demand, expected)
+
+        # The new modification time is kept, so the file is not hashed again.
+        with open(get_cache_path(self.path), 'rb') as cache_file:
+            header = _read_header(cache_file)
+        self.assertEqual(header["source"]["mtime_ns"], os.stat(self.path).st_mtime_ns)
+        with mock.patch("hourly_cache.get_file_hash") as get_hash:
+            demand = DemandFile()
+            self.assertTrue(read_cache(self.path, demand, demand.file_header))
+            self.assertFalse(get_hash.called)
+        self.assert_same(demand, expected)
+
+    def test_corrupt_cache(self):
+        expected = DemandFile(self.path)
+        cache_path = get_cache_path(self.path)
+        with open(cache_path, 'r+b') as cache_file:
+            cache_file.truncate(os.path.getsize(cache_path) - 8)
+        demand = DemandFile()
+        self.assertFalse(read_cache(self.path, demand, demand.file_header))
+        self.assertFalse(read_cache(self.path, demand, demand.file_header, 'c'))
+
+        with open(cache_path, 'wb') as cache_file:
+            cache_file.write(b"Not a cache")
+        demand = DemandFile(self.path)
+        self.assert_same(demand, expected)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Unit test for the hourly_index file, and reading hourly
+    files for a window.
+
+"""
+
+from hourly_index import *
+from hourly_cache import get_cache_path
+from hourly_mw_file import HourlyMWFile
+from demand_file import DemandFile
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+class TestHourlyIndex(unittest.TestCase):
+    header = ("File, LineNum, UTC_Year, UTC_Month, UTC_Day, UTC_Hour, "
+              "Year, Month, Day, Hour, Load(MW)\n")
+    start_time = datetime(2019, 12, 31, hour=0)
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, "load_db.txt")
+        # Three days, with one line of the first day out of order.
+        self.lines = []
+        for hour in range(0, 72):
+            UTC = self.start_time + timedelta(hours=hour)
+            self.lines.append(self.get_line(UTC, 100.0 + hour))
+        self.lines.append(self.get_line(self.start_time + timedelta(hours=5), 1.0))
+        self.write_file(self.lines)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def get_line(self, UTC, mw):
+        local = UTC - timedelta(hours=4)
+        toks = ["Src.csv", "2"] + [str(x) for x in [UTC.year, UTC.month, UTC.day, UTC.hour,
+                                                    local.year, local.month, local.day,
+                                                    local.hour, mw]]
+        return "'%s'\n" % "', '".join(toks)
+
+    def write_file(self, lines):
+        with open(self.path, 'w') as the_file:
+            the_file.write(self.header + "".join(lines))
+
+    def read(self, window=None, use_cache=False):
+        saved = HourlyMWFile.use_cache
+        HourlyMWFile.use_cache = use_cache
+        try:
+            return DemandFile(self.path, window)
+        finally:
+            HourlyMWFile.use_cache = saved
+
+    def test_build_index(self):
+        days = build_index(self.path, 11)
+        self.assertEqual(sorted(days.keys()), ["2019-12-31", "2020-01-01", "2020-01-02"])
+        end = len(self.header) + sum(len(line) for line in self.lines)
+        self.assertEqual(days["2019-12-31"], [len(self.header), 0, end])
+        self.assertEqual(days["2020-01-01"][1], 24)
+        self.assertEqual(days["2020-01-02"][2], end - len(self.lines[-1]))
+
+        self.assertEqual(get_byte_range(days, datetime(2020, 1, 1, 6), datetime(2020, 1, 2, 1)),
+                         [days["2020-01-01"][0], 24, days["2020-01-02"][2]])
+        self.assertEqual(get_byte_range(days, datetime(2021, 1, 1), datetime(2021, 1, 2)), None)
+
+        self.write_file(self.lines + ["'Bad line'\n"])
+        self.assertEqual(build_index(self.path, 11), None)
+        self.assertEqual(get_index(self.path, 11), None)
+
+    def test_get_index(self):
+        days = get_index(self.path, 11)
+        self.assertTrue(os.path.isfile(get_index_path(self.path)))
+        self.assertEqual(get_index(self.path, 11), days)
+        # Rebuilt when the file changes.
+        self.write_file(self.lines[0:24])
+        self.assertEqual(list(get_index(self.path, 11).keys()), ["2019-12-31"])
+
+    def test_read_window(self):
+        full = self.read()
+        window = (datetime(2020, 1, 1, 2), datetime(2020, 1, 2, 2))
+        expected = [(x.val, x.data_array) for x in full.gen_func(window[0], timedelta(hours=24))]
+        cache_path = get_cache_path(self.path)
+        for use_cache in [False, True, True]:
+            part = self.read(window, use_cache)
+            self.assertEqual(part.min_time, window[0])
+            self.assertEqual(part.max_time, window[1] - timedelta(hours=1))
+            self.assertEqual([(x.val, x.data_array) for x in part], expected)
+            # Reading part of the file is not cached, so the last
+            # window is taken from the cache of a full read.
+            if use_cache and not os.path.isfile(cache_path):
+                self.read(use_cache=True)
+        self.assertTrue(os.path.isfile(cache_path))
+
+        # The line out of order is found, and its line number kept.
+        part = self.read((self.start_time, datetime(2020, 1, 1)))
+        self.assertEqual(part.get_mw_hour(self.start_time + timedelta(hours=5)), 106.0)
+        self.assertEqual(part.get_data(self.start_time + timedelta(hours=5)).data_array,
+                         full.get_data(self.start_time + timedelta(hours=5)).data_array)
+
+        # Files without every hour of the window are read in full.
+        for use_cache in [False, True]:
+            part = self.read((datetime(2020, 1, 2), datetime(2020, 1, 4)), use_cache)
+            self.assertEqual(part.min_time, self.start_time)
+            self.assertEqual(part.get_mw_hours(self.start_time, 72).tolist(),
+                             full.get_mw_hours(self.start_time, 72).tolist())
+
+    def test_read_window_errors(self):
+        # Lines in the window are checked, as when reading in full.
+        lines = list(self.lines)
+        lines[30] = lines[30].replace("2020', '1', '1', '6", "2020', '1', '1', '66")
+        self.write_file(lines)
+        self.assertRaises(ValueError, self.read, (datetime(2020, 1, 1), datetime(2020, 1, 2)))
+
+if __name__ == '__main__':
+    unittest.main()
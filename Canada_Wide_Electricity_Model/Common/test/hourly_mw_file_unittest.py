@@ -58,13 +58,13 @@ class TestHourlyMWFile(unittest.TestCase):
                 all_toks = ["TestFile", str(li_no+2)]
                 all_toks.extend(line)
                 self.assertEqual(len(all_toks), 11)
-                data = pv.dbase[line[0]][line[1]][line[2]][line[3]]
+                UTC = datetime(int(line[0]), int(line[1]), int(line[2]), hour=int(line[3]))
+                data = pv.get_data(UTC)
                 print("Val %f Data %s" % (data.val, str(data.data_array[0])))
                 print("      Line %s" % str(all_toks))
                 self.assertEqual(len(data.data_array), 1)
                 for i, tok in enumerate(data.data_array[0]):
                     self.assertEqual(str(tok), all_toks[i])
-                UTC = datetime(int(line[0]), int(line[1]), int(line[2]), hour=int(line[3]))
                 self.assertEqual(pv.get_mw_hour(UTC), float(line[-1]))
 
     # Test bad header in file
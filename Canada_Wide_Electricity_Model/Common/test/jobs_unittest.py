@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Unit test for the jobs file.
+
+"""
+
+from jobs import *
+
+import unittest
+
+_offset = 0
+
+def set_offset(offset):
+    global _offset
+    _offset = offset
+
+def add_offset(value):
+    return value + _offset
+
+class TestJobs(unittest.TestCase):
+    def test_map_jobs(self):
+        args = list(range(0, 10))
+        for workers in [1, 3]:
+            self.assertEqual(map_jobs(add_offset, args, workers, set_offset, (5,), 2),
+                             [x + 5 for x in args])
+        self.assertEqual(map_jobs(add_offset, [], 3), [])
+
+if __name__ == '__main__':
+    unittest.main()
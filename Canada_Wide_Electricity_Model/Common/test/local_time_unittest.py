@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Unit test for the local_time file.
+
+"""
+
+from local_time import *
+
+import unittest
+import numpy as np
+import pytz
+from datetime import datetime, timedelta
+
+class TestLocalTime(unittest.TestCase):
+    tz_names = ["America/Vancouver", "America/Regina", "America/Toronto",
+                "America/Halifax", "America/St_Johns"]
+
+    def pytz_utc(self, tz, local, is_dst):
+        return tz.localize(local, is_dst=is_dst).astimezone(pytz.utc).replace(tzinfo=None)
+
+    def test_to_utc(self):
+        # Every hour of the weeks with transitions, in years before and
+        # after the 2007 rule change, and with Newfoundland's transitions
+        # at 00:01 before 2011.
+        for tz_name in self.tz_names:
+            tz = pytz.timezone(tz_name)
+            table = get_local_time_table(tz_name)
+            for year in [2006, 2010, 2020]:
+                for first, last in [((3, 1), (3, 15)), ((4, 1), (4, 8)), ((10, 24), (11, 8))]:
+                    local = datetime(year, *first)
+                    while local < datetime(year, *last):
+                        for is_dst in [False, True]:
+                            self.assertEqual(table.to_utc(local, is_dst),
+                                             self.pytz_utc(tz, local, is_dst))
+                        try:
+                            expected = self.pytz_utc(tz, local, None)
+                        except (pytz.NonExistentTimeError, pytz.AmbiguousTimeError):
+                            self.assertRaises(ValueError, table.to_utc, local, None)
+                        else:
+                            self.assertEqual(table.to_utc(local, None), expected)
+                        local += timedelta(hours=1)
+
+        table = get_local_time_table("America/Vancouver")
+        self.assertIs(table, get_local_time_table("America/Vancouver"))
+        year = table.get_year(2006)
+        hour = timedelta(hours=1)
+        self.assertEqual(np.flatnonzero(year.skipped).tolist(),
+                         [(datetime(2006, 4, 2, 2) - year.start) // hour])
+        self.assertEqual(np.flatnonzero(year.repeated).tolist(),
+                         [(datetime(2006, 10, 29, 1) - year.start) // hour])
+        self.assertRaises(ValueError, table.to_utc, datetime(2006, 1, 1, 0, 30))
+
+    def test_to_utc_array(self):
+        table = get_local_time_table("America/St_Johns")
+        local = [datetime(2010, 1, 1) + timedelta(hours=hour) for hour in range(0, 24 * 800)]
+        flags = np.arange(len(local)) % 3 == 0
+        for is_dst in [False, True, flags]:
+            expected = [table.to_utc(x, bool(flag))
+                        for x, flag in zip(local, np.broadcast_to(is_dst, len(local)))]
+            self.assertEqual(table.to_utc_array(local, is_dst).tolist(), expected)
+
+        self.assertEqual(table.to_utc_array(local[0:24], None).tolist(),
+                         [table.to_utc(x) for x in local[0:24]])
+        self.assertRaises(ValueError, table.to_utc_array, local, None)
+        self.assertRaises(ValueError, table.to_utc_array, [datetime(2010, 1, 1, 0, 30)])
+
+if __name__ == '__main__':
+    unittest.main()
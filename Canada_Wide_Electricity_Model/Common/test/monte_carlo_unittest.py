@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Unit test for Monte Carlo runs.
+
+"""
+
+from monte_carlo import *
+from grid import grid
+from hourly_mw_file import HourlyMWFile
+from common_defs import *
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from datetime import datetime, timedelta
+
+class TestMonteCarlo(unittest.TestCase):
+    start_time = datetime(2020, 2, 25, hour=0)
+    end_time = datetime(2020, 3, 5, hour=0)
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    # Each value is the hour of the year it is for, plus
+    # 10000 for each year after 2018, so its source can be found.
+    def get_mw(self, UTC):
+        first = datetime(UTC.year, 1, 1)
+        hour = (UTC - first).days * 24 + (UTC - first).seconds // 3600
+        return (UTC.year - 2018) * 10000 + hour
+
+    def write_hours(self, path, years, prefix=[]):
+        with open(path, 'w') as the_file:
+            print(("File, LineNum, " if prefix else "") + HourlyMWFile.file_header,
+                  file=the_file)
+            for year in years:
+                UTC = datetime(year, 2, 20)
+                while UTC < datetime(year, 3, 10):
+                    local = UTC - timedelta(hours=4)
+                    toks = prefix + [str(x) for x in
+                                     [UTC.year, UTC.month, UTC.day, UTC.hour, local.year,
+                                      local.month, local.day, local.hour, self.get_mw(UTC)]]
+                    print("%s%s%s" % (START_END, SEPARATOR.join(toks), START_END),
+                          file=the_file)
+                    UTC = UTC + timedelta(hours=1)
+
+    def make_grid(self, load_years, wind_years):
+        load_path = os.path.join(self.tempdir, FILE_LOAD_DB)
+        self.write_hours(load_path, load_years, ["Src.csv", "1"])
+        self.write_hours(os.path.join(self.tempdir, get_filename(FUEL_WIND)), wind_years)
+        gen_path = os.path.join(self.tempdir, FILE_GEN_DB)
+        with open(gen_path, 'w') as gen_file:
+            print("Fuel, Capacity, GHG_MWh, Timezone", file=gen_file)
+            print("'WIND', '30000', '10', 'America/Halifax'", file=gen_file)
+            print("'NATGAS', '5000', '620', 'America/Halifax'", file=gen_file)
+        return grid([load_path], [gen_path])
+
+    def test_one_year(self):
+        the_grid = self.make_grid([2020], [2020])
+        monte_carlo = MonteCarlo(the_grid, self.start_time, self.end_time)
+        results = run_monte_carlo(monte_carlo, 3, seed=1)
+        the_grid.create_base(self.start_time, self.end_time)
+        expected = the_grid.run(self.start_time, self.end_time)
+        for sample, totals, error in results:
+            self.assertEqual(error, "")
+            self.assertEqual(totals, expected[0:4] + expected[5:7])
+
+    def test_resample(self):
+        the_grid = self.make_grid([2018, 2019, 2020], [2019, 2020])
+        monte_carlo = MonteCarlo(the_grid, self.start_time, self.end_time, BLOCK_DAY)
+        monte_carlo.draw(50, seed=2)
+        self.assertEqual(monte_carlo.draws.shape, (50, 2, 9))
+        times = [self.start_time + timedelta(hours=x) for x in range(monte_carlo.hours)]
+        load_years = set()
+        for sample in range(50):
+            load, wind = monte_carlo.get_sample(sample)
+            for idx, series_values in enumerate([load, wind]):
+                years = monte_carlo.get_sample_years(sample, idx)
+                load_years.update(years.tolist())
+                # Same month/day/hour of the chosen year, except
+                # Feb 29 in other years.
+                for hour in range(0, monte_carlo.hours, 7):
+                    year = years[hour // 24]
+                    UTC = times[hour]
+                    if UTC.month == 2 and UTC.day == 29 and year != 2020:
+                        UTC = UTC - timedelta(days=1)
+                    self.assertEqual(series_values[hour], self.get_mw(UTC.replace(year=year)))
+        self.assertEqual(load_years, set([2018, 2019, 2020]))
+
+        # Series with the same years of history take the same year.
+        the_grid = self.make_grid([2019, 2020], [2019, 2020])
+        monte_carlo = MonteCarlo(the_grid, self.start_time, self.end_time, BLOCK_WEEK)
+        monte_carlo.draw(10, seed=2)
+        self.assertEqual(monte_carlo.draws[:, 0, :].tolist(),
+                         monte_carlo.draws[:, 1, :].tolist())
+
+    def test_run_monte_carlo(self):
+        the_grid = self.make_grid([2018, 2019, 2020], [2019, 2020])
+        monte_carlo = MonteCarlo(the_grid, self.start_time, self.end_time)
+        serial = run_monte_carlo(monte_carlo, 20, seed=3)
+        parallel = run_monte_carlo(monte_carlo, 20, seed=3, workers=2)
+        self.assertEqual(parallel, serial)
+        summary = get_percentiles(serial)
+        self.assertEqual(list(summary.keys()), SUMMARY_COLUMNS)
+        ghg = sorted(x[1][2] for x in serial)
+        self.assertTrue(ghg[0] <= summary["GHG"][0] <= summary["GHG"][2] <= ghg[-1])
+
+    def test_missing_history(self):
+        the_grid = self.make_grid([2019], [2019, 2020])
+        self.assertRaises(ValueError, MonteCarlo, the_grid, self.start_time,
+                          self.start_time + timedelta(days=30))
+
+if __name__ == '__main__':
+    unittest.main()
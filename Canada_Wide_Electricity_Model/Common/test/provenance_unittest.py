@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Unit test for provenance file.
+
+"""
+
+from provenance import Provenance, NO_ROW, NO_FILE, MIN_ROWS
+from datetime import datetime, timedelta
+
+import unittest
+
+class TestProvenance(unittest.TestCase):
+
+    def setUp(self):
+        pass
+
+    def test_init(self):
+        prov = Provenance()
+        self.assertEqual(len(prov), 0)
+        self.assertEqual(prov.names, [])
+        self.assertEqual(prov.name_ids, {})
+
+    def test_intern(self):
+        prov = Provenance()
+        self.assertEqual(prov.intern("File1"), 0)
+        self.assertEqual(prov.intern("File2"), 1)
+        self.assertEqual(prov.intern("File1"), 0)
+        self.assertEqual(prov.names, ["File1", "File2"])
+
+    def test_add(self):
+        prov = Provenance()
+        UTC = datetime(2020, 1, 1, hour=4)
+        row = prov.add(UTC, ["2020", "1", "1", "4", "2020", "1", "1", "0", "100.0"])
+        self.assertEqual(row, 0)
+        self.assertEqual(prov.file_id[row], NO_FILE)
+        self.assertEqual(prov.src_id[row], NO_FILE)
+        self.assertEqual(prov.local_offset[row], -4)
+        self.assertEqual(prov.next_row[row], NO_ROW)
+        self.assertEqual(prov.get_row(row, UTC),
+                         ["2020", "1", "1", "4", "2020", "1", "1", "0", "100.0"])
+
+        row = prov.add(UTC, ["load_db.txt", 3, "NS_Load.csv", "357",
+                             "2020", "1", "1", "4", "2020", "1", "1", "0", "100.0"])
+        self.assertEqual(row, 1)
+        self.assertEqual(prov.get_row(row, UTC),
+                         ["load_db.txt", 3, "NS_Load.csv", 357,
+                          "2020", "1", "1", "4", "2020", "1", "1", "0", "100.0"])
+
+        with self.assertRaises(ValueError) as context:
+            prov.add(UTC, ["load_db.txt", "2020", "1", "1", "4",
+                           "2020", "1", "1", "0", "100.0"])
+        self.assertTrue("Unsupported provenance prefix ['load_db.txt']"
+                        in str(context.exception))
+
+    def test_grow(self):
+        prov = Provenance()
+        UTC = datetime(2020, 1, 1, hour=0)
+        for i in range(0, MIN_ROWS + 1):
+            prov.add(UTC, ["File", i, "2020", "1", "1", "0",
+                           "2019", "12", "31", "20", str(i)])
+        self.assertEqual(len(prov), MIN_ROWS + 1)
+        self.assertEqual(prov.names, ["File"])
+        self.assertEqual(prov.get_row(MIN_ROWS, UTC)[1], MIN_ROWS)
+        self.assertEqual(prov.get_row(MIN_ROWS, UTC)[-1], str(float(MIN_ROWS)))
+
+    def test_copy_chain(self):
+        prov = Provenance()
+        UTC = datetime(2020, 1, 1, hour=4)
+        first = prov.add(UTC, ["A", 1, "2020", "1", "1", "4", "2020", "1", "1", "0", "1.0"])
+        second = prov.add(UTC, ["B", 2, "2020", "1", "1", "4", "2020", "1", "1", "0", "2.0"])
+        prov.next_row[first] = second
+
+        head, tail = prov.copy_chain(first, 24)
+        self.assertEqual(head, 2)
+        self.assertEqual(tail, 3)
+        new_UTC = UTC + timedelta(hours=24)
+        self.assertEqual(prov.get_rows(head, new_UTC),
+                         [["A", 1, "2020", "1", "2", "4", "2020", "1", "1", "0", "1.0"],
+                          ["B", 2, "2020", "1", "2", "4", "2020", "1", "1", "0", "2.0"]])
+        self.assertEqual(prov.names, ["A", "B"])
+
+    def test_copy_chains(self):
+        prov = Provenance()
+        UTC = datetime(2020, 1, 1, hour=4)
+        first = prov.add(UTC, ["A", 1, "2020", "1", "1", "4", "2020", "1", "1", "0", "1.0"])
+        second = prov.add(UTC, ["B", 2, "2020", "1", "1", "4", "2020", "1", "1", "0", "2.0"])
+        third = prov.add(UTC, ["C", 3, "2020", "1", "1", "4", "2020", "1", "1", "0", "3.0"])
+        prov.next_row[first] = second
+
+        heads, tails = prov.copy_chains([first, NO_ROW, third], [24, 1, 48])
+        self.assertEqual(heads.tolist(), [3, NO_ROW, 4])
+        self.assertEqual(tails.tolist(), [5, NO_ROW, 4])
+        for row, hours in [(first, 24), (third, 48)]:
+            new_UTC = UTC + timedelta(hours=hours)
+            self.assertEqual(prov.get_rows(heads[[first, NO_ROW, third].index(row)], new_UTC),
+                             [r[0:2] + [str(x) for x in (2020, 1, 1 + hours // 24, 4)] +
+                              ["2020", "1", "1", "0"] + r[-1:]
+                              for r in prov.get_rows(row, UTC)])
+
+        heads, tails = prov.copy_chains([], [])
+        self.assertEqual(len(heads), 0)
+
+if __name__ == '__main__':
+    unittest.main()
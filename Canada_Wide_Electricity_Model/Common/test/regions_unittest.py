@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Unit test for regions linked by interties.
+
+"""
+
+from regions import *
+from grid import grid, load_regions, combine_grids
+from common_defs import *
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+class TestRegions(unittest.TestCase):
+    start_time = datetime(2019, 1, 1, hour=0)
+    end_time = datetime(2019, 1, 2, hour=0)
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    # Writes a module directory, with a load for each hour.
+    def add_module(self, name, loads, gen_lines):
+        path = os.path.join(self.tempdir, name)
+        os.mkdir(path)
+        if loads is not None:
+            with open(os.path.join(path, FILE_LOAD_DB), 'w') as load_file:
+                print("File, LineNum, UTC_Year, UTC_Month, UTC_Day, UTC_Hour, "
+                      "Year, Month, Day, Hour, Load(MW)", file=load_file)
+                for hour, load in enumerate(loads):
+                    UTC = self.start_time + timedelta(hours=hour)
+                    local = UTC - timedelta(hours=4)
+                    toks = ["Src.csv", str(hour + 2)] + [str(x) for x in
+                            [UTC.year, UTC.month, UTC.day, UTC.hour,
+                             local.year, local.month, local.day, local.hour, load]]
+                    print("%s%s%s" % (START_END, SEPARATOR.join(toks), START_END),
+                          file=load_file)
+        with open(os.path.join(path, FILE_GEN_DB), 'w') as gen_file:
+            print("Fuel, Capacity, GHG_MWh, Timezone", file=gen_file)
+            for line in gen_lines:
+                print(line, file=gen_file)
+        return path
+
+    def write_interties(self, lines):
+        path = os.path.join(self.tempdir, "interties.txt")
+        with open(path, 'w') as the_file:
+            print(intertie_file_header, file=the_file)
+            for line in lines:
+                print(line, file=the_file)
+        return path
+
+    def run_regions(self, paths, lines):
+        regional = load_regions(paths, self.write_interties(lines))
+        regional.create_base(self.start_time, self.end_time)
+        return regional, regional.run(self.start_time, self.end_time)
+
+    def test_read_interties_file(self):
+        interties = read_interties_file(self.write_interties(
+            ["'01_A', '02_B', '100', '50'", "'02_B', '03_C', '75.5', ''"]))
+        self.assertEqual([(x.from_region, x.to_region, x.capacity, x.reverse_capacity)
+                          for x in interties],
+                         [("01_A", "02_B", 100.0, 50.0), ("02_B", "03_C", 75.5, 75.5)])
+
+        self.assertRaises(ValueError, read_interties_file,
+                          self.write_interties(["'01_A', '01_A', '100', ''"]))
+        self.assertRaises(ValueError, read_interties_file,
+                          self.write_interties(["'01_A', '02_B', '-1', ''"]))
+        path = self.write_interties([])
+        with open(path, 'w') as the_file:
+            print("From, To", file=the_file)
+        self.assertRaises(ValueError, read_interties_file, path)
+
+    def test_no_interties(self):
+        # Each region is run as if on its own.
+        paths = [self.add_module("01_A", range(500, 524),
+                                 ["'HYDRO_RES', '450', '17', ''",
+                                  "'COAL', '200', '880', ''"]),
+                 self.add_module("02_B", [400.0] * 24,
+                                 ["'NATGAS', '250', '620', ''",
+                                  "'WIND', '100', '14', ''"])]
+        regional, totals = self.run_regions(paths, ["'01_A', '03_C', '100', ''"])
+        self.assertEqual(regional.dispatch.interties, [])
+        results = regional.get_region_results(self.start_time, self.end_time)
+        for path, result in zip(paths, results):
+            the_grid = grid([os.path.join(path, FILE_LOAD_DB)], [os.path.join(path, FILE_GEN_DB)])
+            the_grid.create_base(self.start_time, self.end_time)
+            expected = the_grid.run(self.start_time, self.end_time)
+            self.assertEqual(result[0], os.path.basename(path))
+            for value, expected_value in zip(result[3], expected):
+                self.assertAlmostEqual(value, expected_value, places=4)
+        self.assertAlmostEqual(totals[0], sum(x[3][0] for x in results))
+        self.assertEqual(totals[5], 24)
+
+    def test_transfer_limit(self):
+        paths = [self.add_module("01_A", [100.0] * 24, ["'HYDRO_RES', '1000', '17', ''"]),
+                 self.add_module("02_B", [400.0] * 24, ["'COAL', '500', '880', ''"])]
+        regional, totals = self.run_regions(paths, ["'02_B', '01_A', '50', '150'"])
+        dispatch = regional.dispatch
+        # 150 MW is sent from A to B, against the intertie's direction.
+        self.assertEqual(dispatch.flows.tolist(), [[-150.0] * 24])
+        self.assertEqual(dispatch.get_net_exports().tolist(), [[150.0] * 24, [-150.0] * 24])
+        self.assertEqual(dispatch.region_mw[0].tolist(), [[250.0] * 24])
+        self.assertEqual(dispatch.region_mw[1].tolist(), [[250.0] * 24])
+        self.assertEqual(totals[2], 24 * (250.0 * 17 + 250.0 * 880))
+        self.assertEqual(dispatch.get_region_totals(1)[2], 24 * 250.0 * 880)
+        self.assertEqual(dispatch.fuels, [FUEL_HYDRO_RESERVOIR, FUEL_COAL])
+        self.assertEqual(regional.results.get_fuel_mw(FUEL_COAL).tolist(), [250.0] * 24)
+
+    def test_reroute(self):
+        # Sending all of A to C would leave B's low emission
+        # generation with nowhere to go, so A serves D instead.
+        paths = [self.add_module("01_A", None, ["'HYDRO_RES', '100', '17', ''"]),
+                 self.add_module("02_B", None, ["'WIND', '100', '14', ''"]),
+                 self.add_module("03_C", [100.0] * 24, ["'OIL', '200', '878', ''"]),
+                 self.add_module("04_D", [100.0] * 24, ["'OIL', '200', '878', ''"])]
+        regional, totals = self.run_regions(paths, ["'01_A', '03_C', '100', '0'",
+                                                    "'01_A', '04_D', '100', '0'",
+                                                    "'02_B', '03_C', '100', '0'"])
+        self.assertEqual(regional.dispatch.flows.tolist(),
+                         [[0.0] * 24, [100.0] * 24, [100.0] * 24])
+        self.assertEqual(totals[0:4], (4800.0, 4800.0, 24 * (100.0 * 17 + 100.0 * 14), 0.0))
+
+    def test_unlimited_interties(self):
+        # Interties that can carry everything make one grid.
+        paths = [self.add_module("01_A", range(500, 524),
+                                 ["'HYDRO_RES', '300', '17', ''",
+                                  "'COAL', '100', '880', ''"]),
+                 self.add_module("02_B", [300.0] * 24,
+                                 ["'NATGAS', '250', '620', ''",
+                                  "'WIND', '150', '14', ''"])]
+        regional, totals = self.run_regions(paths, ["'01_A', '02_B', '100000', ''"])
+        combined = combine_grids([grid([os.path.join(path, FILE_LOAD_DB)],
+                                       [os.path.join(path, FILE_GEN_DB)]) for path in paths])
+        combined.create_base(self.start_time, self.end_time)
+        expected = combined.run(self.start_time, self.end_time)
+        for value, expected_value in zip(totals, expected):
+            self.assertAlmostEqual(value, expected_value, places=4)
+        self.assertEqual(regional.results.get_fuel_mw(FUEL_COAL).tolist(),
+                         combined.results.get_fuel_mw(FUEL_COAL).tolist())
+
+if __name__ == '__main__':
+    unittest.main()
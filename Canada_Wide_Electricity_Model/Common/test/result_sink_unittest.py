@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Unit test for result sinks.
+
+"""
+
+from result_sink import *
+from dispatch import Dispatch
+from run_results import RunResults
+from demand_file import DemandFile
+from generator_file import generator_file
+from common_defs import *
+
+import os
+import io
+import csv
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from unittest.mock import patch, mock_open
+from datetime import datetime, timedelta
+
+class TestResultSink(unittest.TestCase):
+    gen_file_data = ("Fuel, Capacity, GHG_MWh, Timezone\n"
+                     "'COAL', '1000', '100', 'America/Edmonton'\n"
+                     "'NUCLEAR', '500', '1', 'America/Toronto'\n")
+    start_time = datetime(2000, 1, 31, hour=12)
+    hours = 48
+
+    def setUp(self):
+        with patch('os.path.isfile') as mock_isfile:
+            mock_isfile.return_value = False
+            with patch("builtins.open", mock_open(read_data=self.gen_file_data)):
+                gf = generator_file("TestFile")
+        demand = DemandFile()
+        for hour in range(0, self.hours):
+            UTC = self.start_time + timedelta(hours=hour)
+            ymdh = [UTC.year, UTC.month, UTC.day, UTC.hour]
+            demand.add_mw_hour("Load", hour, ["Load", hour] + ymdh + ymdh + [400.0 + hour * 30])
+        dispatch = Dispatch(demand, gf)
+        self.totals = dispatch.run(self.start_time,
+                                   self.start_time + timedelta(hours=self.hours))
+        self.results = RunResults(dispatch)
+
+    def write(self, sink):
+        output = io.StringIO()
+        sink.write_file(self.results, output)
+        return output.getvalue()
+
+    def test_text(self):
+        lines = self.write(TextSink()).splitlines()
+        self.assertEqual(len(lines), self.hours)
+        self.assertEqual(lines[0], "2000-01-31 12:00     400.00 NUCLEAR 400.000000 Mw 400.000000 GHG")
+        self.assertEqual(lines[10], "2000-01-31 22:00     700.00 NUCLEAR 500.000000 Mw 500.000000 GHG"
+                                    " COAL 200.000000 Mw 20000.000000 GHG")
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(self.write(CSVSink()))))
+        self.assertEqual(rows[0], ["UTC", "Load(MW)", "Capacity(MW)", "Served(MW)",
+                                   "NUCLEAR(MW)", "NUCLEAR(GHG)", "COAL(MW)", "COAL(GHG)"])
+        self.assertEqual(len(rows), self.hours + 1)
+        self.assertEqual(rows[11], ["2000-01-31 22:00", "700.0", "1500.0", "700.0",
+                                    "500.0", "500.0", "200.0", "20000.0"])
+        self.assertEqual(rows[-1][1:4], ["1810.0", "1500.0", "1500.0"])
+
+    def test_array(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tempdir, "run.npz")
+            ArraySink(path).write(self.results)
+            with np.load(path) as data:
+                self.assertEqual(str(data["start_utc"]), "2000-01-31 12:00")
+                self.assertEqual(data["fuels"].tolist(), ["NUCLEAR", "COAL"])
+                self.assertEqual(data["served"].tolist(), self.results.served.tolist())
+                self.assertEqual(data["mw"].shape, (2, self.hours))
+                self.assertEqual(data["marginal"].tolist(), self.results.marginal.tolist())
+                self.assertEqual(data["average_ghg"].tolist(),
+                                 self.results.get_intensity().tolist())
+
+            path = os.path.join(tempdir, "factors.npz")
+            write_factor_file(path, [("A", self.results.start_utc,
+                                      self.results.get_emission_factors())])
+            with np.load(path) as data:
+                self.assertEqual(sorted(data.keys()), ["A/average_ghg", "A/marginal_fuel",
+                                                       "A/marginal_ghg", "A/start_utc"])
+                self.assertEqual(data["A/marginal_fuel"].tolist(),
+                                 self.results.get_marginal_fuels().tolist())
+        finally:
+            shutil.rmtree(tempdir)
+        with self.assertRaises(ValueError) as context:
+            ArraySink().write(self.results)
+        self.assertTrue("Array output needs a file path." in str(context.exception))
+
+    def test_rollup(self):
+        rows = list(csv.reader(io.StringIO(self.write(RollupSink(SINK_DAILY)))))
+        self.assertEqual(rows[0], ["Period", "Hours", "Load(MWh)", "Generated(MWh)", "GHG",
+                                   "Fossil_GHG", "Brownout_Hours", "NUCLEAR(MWh)", "COAL(MWh)"])
+        self.assertEqual([row[0:2] for row in rows[1:]],
+                         [["2000-01-31", "12"], ["2000-02-01", "24"], ["2000-02-02", "12"]])
+        self.assertEqual(sum(float(row[2]) for row in rows[1:]), self.totals[0])
+        self.assertEqual(sum(int(row[6]) for row in rows[1:]), self.totals[4])
+
+        rows = list(csv.reader(io.StringIO(self.write(RollupSink(SINK_MONTHLY)))))
+        self.assertEqual([row[0:2] for row in rows[1:]], [["2000-01", "12"], ["2000-02", "36"]])
+        self.assertEqual(float(rows[1][3]) + float(rows[2][3]), self.totals[1])
+
+        with self.assertRaises(ValueError) as context:
+            RollupSink("weekly")
+        self.assertTrue("not 'weekly'" in str(context.exception))
+
+    def test_create_sink(self):
+        self.assertEqual(create_sink(SINK_NONE), None)
+        self.assertTrue(isinstance(create_sink(SINK_TEXT), TextSink))
+        self.assertTrue(isinstance(create_sink(SINK_CSV, "out.csv"), CSVSink))
+        self.assertEqual(create_sink(SINK_CSV, "out.csv").filepath, "out.csv")
+        self.assertTrue(isinstance(create_sink(SINK_ARRAY, "out.npz"), ArraySink))
+        self.assertEqual(create_sink(SINK_DAILY).period, SINK_DAILY)
+        with self.assertRaises(ValueError) as context:
+            create_sink("xml")
+        self.assertTrue("not 'xml'" in str(context.exception))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Unit test for run results.
+
+"""
+
+from run_results import RunResults
+from dispatch import Dispatch
+from demand_file import DemandFile
+from generator_file import generator_file
+from common_defs import *
+
+import unittest
+import numpy as np
+from unittest.mock import patch, mock_open
+from datetime import datetime, timedelta
+
+class TestRunResults(unittest.TestCase):
+    gen_file_data = ("Fuel, Capacity, GHG_MWh, Timezone\n"
+                     "'COAL', '1000', '100', 'America/Edmonton'\n"
+                     "'NUCLEAR', '500', '1', 'America/Toronto'\n")
+    start_time = datetime(2000, 1, 31, hour=12)
+    hours = 48
+
+    def setUp(self):
+        with patch('os.path.isfile') as mock_isfile:
+            mock_isfile.return_value = False
+            with patch("builtins.open", mock_open(read_data=self.gen_file_data)):
+                gf = generator_file("TestFile")
+        demand = DemandFile()
+        for hour in range(0, self.hours):
+            UTC = self.start_time + timedelta(hours=hour)
+            ymdh = [UTC.year, UTC.month, UTC.day, UTC.hour]
+            load = 0.0 if hour == 0 else 400.0 + hour * 30
+            demand.add_mw_hour("Load", hour, ["Load", hour] + ymdh + ymdh + [load])
+        self.dispatch = Dispatch(demand, gf)
+        self.totals = self.dispatch.run(self.start_time,
+                                        self.start_time + timedelta(hours=self.hours))
+        self.results = RunResults(self.dispatch)
+
+    def test_init(self):
+        results = self.results
+        self.assertEqual(results.get_totals(), self.totals)
+        self.assertEqual(results.fuels, ["NUCLEAR", "COAL"])
+        self.assertEqual(results.fossil.tolist(), [False, True])
+        self.assertEqual(results.hours, self.hours)
+        self.assertEqual(results.unserved[-1], 1810.0 - 1500.0)
+        self.assertEqual(results.unserved[0], 0.0)
+        self.assertEqual(results.get_hour(10), self.dispatch.get_hour(10))
+        self.assertEqual(results.get_time(10), datetime(2000, 1, 31, hour=22))
+        self.assertEqual(results.get_times()[10], np.datetime64("2000-01-31T22", 'h'))
+
+    def test_fuels(self):
+        results = self.results
+        self.assertEqual(results.get_fuel_mw("COAL")[10], 200.0)
+        self.assertEqual(results.get_fuel_ghg("COAL")[10], 20000.0)
+        self.assertEqual(results.get_fuel_mw("WIND").tolist(), [0.0] * self.hours)
+        self.assertEqual(results.get_fossil_mw().tolist(), results.get_fuel_mw("COAL").tolist())
+
+    def test_intensity(self):
+        results = self.results
+        intensity = results.get_intensity()
+        self.assertEqual(intensity[0], 0.0)
+        self.assertEqual(intensity[1], 1.0)
+        self.assertEqual(intensity[10], 20500.0 / 700.0)
+        share = results.get_fossil_share()
+        self.assertEqual(share[0], 0.0)
+        self.assertEqual(share[1], 0.0)
+        self.assertEqual(share[10], 200.0 / 700.0)
+
+    def test_emission_factors(self):
+        factors = self.results.get_emission_factors()
+        self.assertEqual(list(factors.keys()), ["average_ghg", "marginal_fuel", "marginal_ghg"])
+        self.assertEqual(factors["average_ghg"].tolist(), self.results.get_intensity().tolist())
+        self.assertEqual(factors["marginal_fuel"][[0, 1, 10, -1]].tolist(),
+                         ["NUCLEAR", "NUCLEAR", "COAL", ""])
+        self.assertEqual(factors["marginal_ghg"][10], 100.0)
+        self.assertTrue(np.isnan(factors["marginal_ghg"][-1]))
+
+    def test_rollup(self):
+        labels, rollup = self.results.get_rollup("monthly")
+        self.assertEqual(labels.tolist(), [datetime(2000, 1, 1).date(), datetime(2000, 2, 1).date()])
+        self.assertEqual(rollup["hours"].tolist(), [12, 36])
+        self.assertEqual(rollup["load"].sum(), self.totals[0])
+        self.assertEqual(rollup["served"].sum(), self.totals[1])
+        self.assertEqual(rollup["brown_hours"].sum(), self.totals[4])
+        self.assertEqual(rollup["unserved"].sum(), self.results.unserved.sum())
+        self.assertEqual(rollup["COAL"][0], self.results.get_fuel_mw("COAL")[0:12].sum())
+
+        labels, rollup = self.results.get_rollup("daily")
+        self.assertEqual(len(labels), 3)
+        self.assertEqual(rollup["hours"].tolist(), [12, 24, 12])
+
+        with self.assertRaises(ValueError) as context:
+            self.results.get_rollup("yearly")
+        self.assertTrue("not 'yearly'" in str(context.exception))
+
+    def test_empty(self):
+        dispatch = Dispatch(DemandFile(), generator_file())
+        results = RunResults(dispatch)
+        self.assertEqual(results.get_totals(), (0.0, 0.0, 0.0, 0.0, 0, 0.0))
+        self.assertEqual(len(results.get_times()), 0)
+        labels, rollup = results.get_rollup("daily")
+        self.assertEqual(rollup, {})
+
+if __name__ == '__main__':
+    unittest.main()
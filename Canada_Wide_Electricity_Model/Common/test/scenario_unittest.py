@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Unit test for scenario runs.
+
+"""
+
+from scenario import *
+from grid import grid
+from hourly_mw_file import HourlyMWFile
+from common_defs import *
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+class TestScenario(unittest.TestCase):
+    start_time = datetime(2019, 1, 1, hour=0)
+    end_time = datetime(2019, 1, 2, hour=23)
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    # Returns a grid, with load and solar increasing each hour.
+    def make_grid(self, name, gen_lines, pv_ratio=1.0, load_ratio=1.0):
+        path = os.path.join(self.tempdir, name)
+        os.mkdir(path)
+        with open(os.path.join(path, FILE_LOAD_DB), 'w') as load_file:
+            print("File, LineNum, " + HourlyMWFile.file_header, file=load_file)
+            for hour in range(0, 48):
+                self.print_hour(load_file, hour, (900.0 + hour * 10) * load_ratio,
+                                ["Src.csv", str(hour + 2)])
+        with open(os.path.join(path, FILE_GEN_DB), 'w') as gen_file:
+            print("Fuel, Capacity, GHG_MWh, Timezone", file=gen_file)
+            for line in gen_lines:
+                print(line, file=gen_file)
+        with open(os.path.join(path, get_filename(FUEL_SOLAR_PV)), 'w') as pv_file:
+            print(HourlyMWFile.file_header, file=pv_file)
+            for hour in range(0, 48):
+                self.print_hour(pv_file, hour, hour * 2.5 * pv_ratio)
+        the_grid = grid([os.path.join(path, FILE_LOAD_DB)], [os.path.join(path, FILE_GEN_DB)])
+        the_grid.create_base(self.start_time, self.end_time)
+        return the_grid
+
+    def print_hour(self, the_file, hour, mw, prefix=[]):
+        UTC = self.start_time + timedelta(hours=hour)
+        local = UTC - timedelta(hours=4)
+        toks = prefix + [str(x) for x in [UTC.year, UTC.month, UTC.day, UTC.hour,
+                                 local.year, local.month, local.day, local.hour, mw]]
+        print("%s%s%s" % (START_END, SEPARATOR.join(toks), START_END), file=the_file)
+
+    def gen_lines(self, coal="600", natgas="400", natgas_ghg="620", solar="100"):
+        return ["'COAL', '%s', '880', 'America/Halifax'" % coal,
+                "'NATGAS', '%s', '%s', 'America/Halifax'" % (natgas, natgas_ghg),
+                "'SOLAR_PV', '%s', '64', 'America/Halifax'" % solar]
+
+    def check_scenario(self, base_grid, scenario, expected_grid):
+        base = ScenarioBase(base_grid, self.start_time, self.end_time)
+        expected = expected_grid.run(self.start_time, self.end_time)
+        self.assertEqual(scenario.run(base), expected)
+
+    def test_scenarios(self):
+        base_grid = self.make_grid("base", self.gen_lines())
+        self.check_scenario(base_grid, Scenario("Base"), base_grid)
+        self.check_scenario(base_grid,
+                            Scenario("No coal", capacity={"COAL" : parse_change("0")}),
+                            self.make_grid("no_coal", self.gen_lines(coal="0")))
+        # Cheaper gas is dispatched before coal.
+        self.check_scenario(base_grid,
+                            Scenario("Gas", ghg={"NATGAS" : parse_change("*0.5")}),
+                            self.make_grid("gas", self.gen_lines(natgas_ghg="310")))
+        # Hourly solar data grows with its capacity.
+        self.check_scenario(base_grid,
+                            Scenario("Solar", capacity={"SOLAR_PV" : parse_change("+100")}),
+                            self.make_grid("solar", self.gen_lines(solar="200"), pv_ratio=2.0))
+        self.check_scenario(base_grid,
+                            Scenario("Growth", load=parse_change("*1.5")),
+                            self.make_grid("growth", self.gen_lines(), load_ratio=1.5))
+        # The base grid is not changed by scenarios.
+        self.check_scenario(base_grid, Scenario("Base"), base_grid)
+
+    def test_capacity_changes(self):
+        base_grid = self.make_grid("base", self.gen_lines())
+        base = ScenarioBase(base_grid, self.start_time, self.end_time)
+        base_dispatch = get_base_dispatch(base)
+        scenarios = [Scenario("Solar", capacity={"SOLAR_PV" : parse_change("*3")}),
+                     Scenario("Less", capacity={"COAL" : parse_change("-100"),
+                                                "NATGAS" : parse_change("0")}),
+                     Scenario("Gas", ghg={"NATGAS" : parse_change("*0.5")})]
+        self.assertEqual(scenarios[1].get_capacity_changes(base),
+                         {"COAL" : 500.0, "NATGAS" : 0.0})
+        self.assertIsNone(scenarios[2].get_capacity_changes(base))
+        # Changing capacity from the base dispatch gives the same
+        # totals as dispatching the scenario.
+        for scenario in scenarios:
+            self.assertEqual(scenario.run(base, base_dispatch), scenario.run(base))
+        self.assertEqual(base_dispatch.totals, base_grid.run(self.start_time, self.end_time)[0:4]
+                         + base_grid.run(self.start_time, self.end_time)[5:7])
+
+    def test_scenario_errors(self):
+        base = ScenarioBase(self.make_grid("base", self.gen_lines()),
+                            self.start_time, self.end_time)
+        self.assertRaises(ValueError,
+                          Scenario("New", capacity={"NUCLEAR" : parse_change("100")}).run, base)
+        self.assertRaises(ValueError,
+                          Scenario("Less", capacity={"COAL" : parse_change("-700")}).run, base)
+        totals = Scenario("New", capacity={"NUCLEAR" : parse_change("2000")},
+                          ghg={"NUCLEAR" : parse_change("12")}).run(base)
+        self.assertEqual(totals[2], totals[1] * 12)
+
+    def test_parse_change(self):
+        self.assertIsNone(parse_change(" "))
+        self.assertEqual(parse_change("5").adjust([2.0]), [5.0])
+        self.assertEqual(parse_change("+5").adjust([2.0]), [7.0])
+        self.assertEqual(parse_change("-5").adjust([2.0]), [-3.0])
+        self.assertEqual(parse_change("*5").adjust([2.0]), [10.0])
+        self.assertRaises(ValueError, parse_change, "five")
+
+    def test_read_scenario_file(self):
+        path = os.path.join(self.tempdir, "scenarios.csv")
+        with open(path, 'w') as the_file:
+            print("Scenario, Load, COAL Capacity, NATGAS GHG_MWh", file=the_file)
+            print("Base", file=the_file)
+            print("Mixed, *1.1, 0, +10", file=the_file)
+        scenarios = read_scenario_file(path)
+        self.assertEqual([x.name for x in scenarios], ["Base", "Mixed"])
+        self.assertIsNone(scenarios[0].load)
+        self.assertEqual(scenarios[1].load.ratio, 1.1)
+        self.assertEqual(list(scenarios[1].capacity.keys()), ["COAL"])
+        self.assertEqual(scenarios[1].ghg["NATGAS"].abs_adj, 10.0)
+
+        with open(path, 'w') as the_file:
+            print("Scenario, COAL MW", file=the_file)
+        self.assertRaises(ValueError, read_scenario_file, path)
+
+    def test_run_scenarios(self):
+        base_grid = self.make_grid("base", self.gen_lines())
+        scenarios = [Scenario("Base"),
+                     Scenario("No coal", capacity={"COAL" : parse_change("0")}),
+                     Scenario("New", capacity={"NUCLEAR" : parse_change("100")})]
+        serial = run_scenarios(base_grid, self.start_time, self.end_time, scenarios)
+        parallel = run_scenarios(base_grid, self.start_time, self.end_time, scenarios,
+                                 workers=2)
+        self.assertEqual(parallel, serial)
+        self.assertEqual(serial[0], ["Base", base_grid.run(self.start_time, self.end_time), ""])
+        self.assertIsNone(serial[2][1])
+
+if __name__ == '__main__':
+    unittest.main()
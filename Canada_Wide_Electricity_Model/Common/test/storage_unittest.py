@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+"""
+    Unit test for energy storage.
+
+"""
+
+from storage import *
+
+import unittest
+import numpy as np
+
+class TestStorage(unittest.TestCase):
+    def test_run(self):
+        storage = Storage(80.0, hours=1.0, efficiency=0.5)
+        charge, discharge, stored = storage.run(np.array([100.0, 100.0, 0.0, 0.0, 0.0]),
+                                                np.array([0.0, 0.0, 50.0, 50.0, 50.0]))
+        self.assertEqual(charge.tolist(), [80.0, 80.0, 0.0, 0.0, 0.0])
+        self.assertEqual(discharge.tolist(), [0.0, 0.0, 50.0, 30.0, 0.0])
+        self.assertEqual(stored.tolist(), [40.0, 80.0, 30.0, 0.0, 0.0])
+
+    def test_run_later_need(self):
+        # Only charge what can be discharged later,
+        # and hold it through idle hours.
+        storage = Storage(50.0, hours=2.0, efficiency=1.0)
+        charge, discharge, stored = storage.run(np.array([100.0, 0.0, 0.0, 0.0, 100.0]),
+                                                np.array([0.0, 0.0, 0.0, 10.0, 0.0]))
+        self.assertEqual(charge.tolist(), [10.0, 0.0, 0.0, 0.0, 0.0])
+        self.assertEqual(discharge.tolist(), [0.0, 0.0, 0.0, 10.0, 0.0])
+        self.assertEqual(stored.tolist(), [10.0, 10.0, 10.0, 0.0, 0.0])
+
+    def test_run_initial_charge(self):
+        storage = Storage(10.0, hours=3.0, initial_charge=0.5)
+        charge, discharge, stored = storage.run(np.zeros(3), np.array([0.0, 20.0, 20.0]))
+        self.assertEqual(discharge.tolist(), [0.0, 10.0, 5.0])
+        self.assertEqual(stored.tolist(), [15.0, 5.0, 0.0])
+
+        charge, discharge, stored = Storage(0.0).run(np.ones(3), np.ones(3))
+        self.assertEqual(charge.tolist() + discharge.tolist(), [0.0] * 6)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, Storage, -1.0)
+        self.assertRaises(ValueError, Storage, 1.0, hours=0.0)
+        self.assertRaises(ValueError, Storage, 1.0, efficiency=1.5)
+        self.assertRaises(ValueError, Storage, 1.0, initial_charge=2.0)
+
+if __name__ == '__main__':
+    unittest.main()
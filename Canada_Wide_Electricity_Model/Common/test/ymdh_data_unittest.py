@@ -13,6 +13,8 @@ from common_defs import *
 import unittest
 import mock
 from math import isnan
+import copy
+import numpy as np
 from unittest.mock import patch, mock_open, call
 
 class TestVA(unittest.TestCase):
@@ -79,7 +81,9 @@ class TestYMDHData(unittest.TestCase):
 
     def test_init(self):
         ymdh = YMDHData()
-        self.assertEqual(ymdh.dbase, {})
+        self.assertTrue(ymdh.base_time is None)
+        self.assertEqual(len(ymdh.values), 0)
+        self.assertEqual(len(ymdh.valid), 0)
         self.assertTrue(ymdh.min_time is None)
         self.assertTrue(ymdh.max_time is None)
 
@@ -104,76 +108,59 @@ class TestYMDHData(unittest.TestCase):
         UTC = datetime(2006, 1, 2, hour=5)
         ymdh = YMDHData()
         Y, M, D, H = ymdh._get_keys_from_time(UTC)
-        ymdh.add_ymdh(UTC, 3.0, [Y, M, D, H, 1, 2, 3, 4, 3.0])
+        ymdh.add_ymdh(UTC, 3.0, [Y, M, D, H, 2006, 1, 2, 1, 3.0])
         UTC = UTC + timedelta(hours=1)
         Y, M, D, H = ymdh._get_keys_from_time(UTC)
-        ymdh.add_ymdh(UTC, 6.0, [Y, M, D, H, 5, 6, 7, 8, 6.0])
-
-        self.assertEqual(len(ymdh.dbase), 1)
-        self.assertTrue("2006" in ymdh.dbase.keys())
-        self.assertEqual(len(ymdh.dbase["2006"]), 1)
-        self.assertTrue("1" in ymdh.dbase["2006"].keys())
-        self.assertEqual(len(ymdh.dbase["2006"]["1"]), 1)
-        self.assertTrue("2" in ymdh.dbase["2006"]["1"].keys())
-        self.assertEqual(len(ymdh.dbase["2006"]["1"]["2"]), 2)
-        self.assertTrue("5" in ymdh.dbase["2006"]["1"]["2"].keys())
-        self.assertTrue("6" in ymdh.dbase["2006"]["1"]["2"].keys())
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].val, 3.0)
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[0][0], "2006")
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[0][1], "1")
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[0][2], "2")
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[0][3], "5")
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[0][4], 1)
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[0][5], 2)
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[0][6], 3)
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[0][7], 4)
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[0][8], 3)
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["6"].val, 6.0)
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["6"].data_array[0][0], "2006")
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["6"].data_array[0][1], "1")
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["6"].data_array[0][2], "2")
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["6"].data_array[0][3], "6")
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["6"].data_array[0][4], 5)
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["6"].data_array[0][5], 6)
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["6"].data_array[0][6], 7)
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["6"].data_array[0][7], 8)
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["6"].data_array[0][8], 6)
+        ymdh.add_ymdh(UTC, 6.0, [Y, M, D, H, "2006", "1", "2", "2", "6.0"])
+
+        self.assertEqual(ymdh.valid.sum(), 2)
+        self.assertTrue(ymdh.has_hour(datetime(2006, 1, 2, hour=5)))
+        self.assertTrue(ymdh.has_hour(datetime(2006, 1, 2, hour=6)))
+        data = ymdh.get_data(datetime(2006, 1, 2, hour=5))
+        self.assertEqual(data.val, 3.0)
+        self.assertEqual(data.data_array,
+                         [["2006", "1", "2", "5", "2006", "1", "2", "1", "3.0"]])
+        data = ymdh.get_data(datetime(2006, 1, 2, hour=6))
+        self.assertEqual(data.val, 6.0)
+        self.assertEqual(data.data_array,
+                         [["2006", "1", "2", "6", "2006", "1", "2", "2", "6.0"]])
+
+    def test_add_ymdh_file_line(self):
+        UTC = datetime(2006, 1, 2, hour=5)
+        ymdh = YMDHData()
+        Y, M, D, H = ymdh._get_keys_from_time(UTC)
+        ymdh.add_ymdh(UTC, 3.0, ["File1", 7, Y, M, D, H, "2006", "1", "2", "1", "3.0"])
+        ymdh.add_ymdh(UTC, 4.0, ["File1", 8, "Src", "12", Y, M, D, H,
+                                 "2006", "1", "2", "1", "4.0"], ignore_dup=True)
+        data = ymdh.get_data(UTC)
+        self.assertEqual(data.val, 7.0)
+        self.assertEqual(data.data_array,
+            [["File1", 7, "2006", "1", "2", "5", "2006", "1", "2", "1", "3.0"],
+             ["File1", 8, "Src", 12, "2006", "1", "2", "5", "2006", "1", "2", "1", "4.0"]])
+        # File names are only stored once
+        self.assertEqual(ymdh.provenance.names, ["File1", "Src"])
+
+        with self.assertRaises(ValueError) as context:
+            ymdh.add_ymdh(UTC, 4.0, ["File1", Y, M, D, H,
+                                     "2006", "1", "2", "1", "4.0"], ignore_dup=True)
+        self.assertTrue("Unsupported provenance prefix" in str(context.exception))
 
     def test_add_ymdh_dup(self):
         UTC = datetime(2006, 1, 2, hour=5)
         ymdh = YMDHData()
         Y, M, D, H = ymdh._get_keys_from_time(UTC)
-        ymdh.add_ymdh(UTC, 3.0, [Y, M, D, H, 1, 2, 3, 4, 3.0])
-        ymdh.add_ymdh(UTC, 6.0, [Y, M, D, H, 5, 6, 7, 8, 6.0], ignore_dup=True)
-
-        self.assertEqual(len(ymdh.dbase), 1)
-        self.assertTrue("2006" in ymdh.dbase.keys())
-        self.assertEqual(len(ymdh.dbase["2006"]), 1)
-        self.assertTrue("1" in ymdh.dbase["2006"].keys())
-        self.assertEqual(len(ymdh.dbase["2006"]["1"]), 1)
-        self.assertTrue("2" in ymdh.dbase["2006"]["1"].keys())
-        self.assertEqual(len(ymdh.dbase["2006"]["1"]["2"]), 1)
-        self.assertTrue("5" in ymdh.dbase["2006"]["1"]["2"].keys())
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].val, 9.0)
-        self.assertEqual(len(ymdh.dbase["2006"]["1"]["2"]["5"].data_array), 2)
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[0][0], "2006")
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[0][1], "1")
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[0][2], "2")
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[0][3], "5")
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[0][4], 1)
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[0][5], 2)
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[0][6], 3)
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[0][7], 4)
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[0][8], 3)
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[1][0], "2006")
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[1][1], "1")
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[1][2], "2")
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[1][3], "5")
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[1][4], 5)
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[1][5], 6)
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[1][6], 7)
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[1][7], 8)
-        self.assertEqual(ymdh.dbase["2006"]["1"]["2"]["5"].data_array[1][8], 6)
+        ymdh.add_ymdh(UTC, 3.0, [Y, M, D, H, "2006", "1", "2", "1", "3.0"])
+        ymdh.add_ymdh(UTC, 6.0, [Y, M, D, H, "2006", "1", "2", "0", "6.0"], ignore_dup=True)
+
+        self.assertEqual(ymdh.valid.sum(), 1)
+        self.assertTrue(ymdh.has_hour(datetime(2006, 1, 2, hour=5)))
+        data = ymdh.get_data(datetime(2006, 1, 2, hour=5))
+        self.assertEqual(data.val, 9.0)
+        self.assertEqual(len(data.data_array), 2)
+        self.assertEqual(data.data_array[0],
+                         ["2006", "1", "2", "5", "2006", "1", "2", "1", "3.0"])
+        self.assertEqual(data.data_array[1],
+                         ["2006", "1", "2", "5", "2006", "1", "2", "0", "6.0"])
 
     def test_add_ymdh_dup_fail(self):
         UTC = datetime(2006, 1, 2, hour=5)
@@ -207,54 +194,6 @@ class TestYMDHData(unittest.TestCase):
             for d_tok, y_tok in zip(data.data_array[0], file_data[i]):
                 self.assertEqual(d_tok, y_tok)
 
-    def test_get_subset(self):
-        def check_test(subset, exp_subset):
-            self.assertEqual(len(subset), len(exp_subset))
-            for x, y in zip(subset, exp_subset):
-                self.assertEqual(x, y)
-
-        data = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9']
-        ymdh = YMDHData()
-        # checking first of 3 keys
-        testset = ymdh._get_subset(data, True, False, 5, 6)
-        exp_testset = data[5:]
-        check_test(testset, exp_testset)
-
-        # checking middle of 3 keys
-        testset = ymdh._get_subset(data, False, False, 5, 6)
-        exp_testset = data
-        check_test(testset, exp_testset)
-
-        # checking last of 3 keys
-        testset = ymdh._get_subset(data, False, True, 5, 6)
-        exp_testset = data[:7]
-        check_test(testset, exp_testset)
-
-        # checking first of 2 keys
-        testset = ymdh._get_subset(data, True, False, 5, 6)
-        exp_testset = data[5:]
-        check_test(testset, exp_testset)
-
-        # checking last of 2 keys
-        testset = ymdh._get_subset(data, False, True, 5, 6)
-        exp_testset = data[:7]
-        check_test(testset, exp_testset)
-
-        # checking only key, all values allowed
-        testset = ymdh._get_subset(data, True, True, 0, 9)
-        exp_testset = data
-        check_test(testset, exp_testset)
-
-        # checking only key, subrange allowed
-        testset = ymdh._get_subset(data, True, True, 5, 6)
-        exp_testset = data[5:7]
-        check_test(testset, exp_testset)
-
-        # checking only key, subrange allowed
-        testset = ymdh._get_subset(data, True, True, 5, 5)
-        exp_testset = data[5:6]
-        check_test(testset, exp_testset)
-
     def test_gen_func(self):
         file_data= [['2000', '1', '1', '1', '2000', '1', '2', '7', '123000.0'],
                     ['2000', '1', '1', '23', '2000', '2', '3', '8', '12300.0'],
@@ -387,7 +326,7 @@ class TestYMDHData(unittest.TestCase):
         self.assertEqual(dat.data_array[0][5], M)
         self.assertEqual(dat.data_array[0][6], D)
         self.assertEqual(dat.data_array[0][7], H)
-        self.assertEqual(dat.data_array[0][8], 3.0)
+        self.assertEqual(dat.data_array[0][8], "3.0")
 
     def test_duplicate_data(self):
         start_time = datetime(2006, 1, 2, hour=0)
@@ -395,54 +334,40 @@ class TestYMDHData(unittest.TestCase):
         for i in range(0, 24):
             UTC = start_time + timedelta(hours=i)
             y, m, d, h = ymdh._get_keys_from_time(UTC)
-            ymdh.add_ymdh(UTC, i+4, [y, m, d, h, i, i+1, i+2, i+3, i+4])
+            ly, lm, ld, lh = ymdh._get_keys_from_time(UTC - timedelta(hours=4))
+            ymdh.add_ymdh(UTC, i+4, ["File", i, y, m, d, h, ly, lm, ld, lh, i+4])
         interval = timedelta(hours=24)
         new_time = start_time + timedelta(days=5)
         adj = AdjustData()
         ymdh.duplicate_data(start_time, new_time, interval, adj)
 
-        self.assertEqual(len(ymdh.dbase), 1)
-        self.assertTrue("2006" in ymdh.dbase.keys())
-        self.assertEqual(len(ymdh.dbase["2006"]), 1)
-        self.assertTrue("1" in ymdh.dbase["2006"].keys())
-        self.assertEqual(len(ymdh.dbase["2006"]["1"]), 2)
-        self.assertTrue("2" in ymdh.dbase["2006"]["1"].keys())
-        self.assertTrue("7" in ymdh.dbase["2006"]["1"].keys())
-        self.assertEqual(len(ymdh.dbase["2006"]["1"]["2"]), 24)
-        self.assertEqual(len(ymdh.dbase["2006"]["1"]["7"]), 24)
+        self.assertEqual(ymdh.valid.sum(), 48)
+        self.assertTrue(ymdh.get_valid(datetime(2006, 1, 2), 24).all())
+        self.assertTrue(ymdh.get_valid(datetime(2006, 1, 7), 24).all())
 
-        for D in ["2", "7"]:
+        for D in [2, 7]:
             for i in range(0, 24):
-                H = str(i)
-                self.assertTrue(H in ymdh.dbase["2006"]["1"][D].keys())
-                self.assertEqual(ymdh.dbase["2006"]["1"][D][H].val, i + 4)
-                self.assertEqual(len(ymdh.dbase["2006"]["1"][D][H].data_array), 1)
-                self.assertEqual(len(ymdh.dbase["2006"]["1"][D][H].data_array[0]), 9)
-                self.assertEqual(ymdh.dbase["2006"]["1"][D][H].data_array[0][-4], i+1)
-                self.assertEqual(ymdh.dbase["2006"]["1"][D][H].data_array[0][-3], i+2)
-                self.assertEqual(ymdh.dbase["2006"]["1"][D][H].data_array[0][-2], i+3)
-                self.assertEqual(ymdh.dbase["2006"]["1"][D][H].data_array[0][-1], i+4)
+                data = ymdh.get_data(datetime(2006, 1, D, hour=i))
+                self.assertEqual(data.val, i + 4)
+                self.assertEqual(len(data.data_array), 1)
+                self.assertEqual(len(data.data_array[0]), 11)
+                self.assertEqual(data.data_array[0][0], "File")
+                self.assertEqual(data.data_array[0][1], i)
+                self.assertEqual(data.data_array[0][2:6], ["2006", "1", str(D), str(i)])
+                self.assertEqual(data.data_array[0][-1], str(float(i+4)))
+        # Duplicated hours keep the local time of the source hour
         for h in range(0, 24):
-            H = str(h)
-            self.assertTrue(
-                        ymdh.dbase["2006"]["1"]["2"][H].data_array[0][8] is
-                        ymdh.dbase["2006"]["1"]["7"][H].data_array[0][8])
-            for i in range(0, 4):
-                print("%d %d" % (h, i))
-                self.assertFalse(
-                        ymdh.dbase["2006"]["1"]["2"][H].data_array[0][i] is
-                        ymdh.dbase["2006"]["1"]["7"][H].data_array[0][i])
-                self.assertTrue(
-                        ymdh.dbase["2006"]["1"]["2"][H].data_array[0][i+4] is
-                        ymdh.dbase["2006"]["1"]["7"][H].data_array[0][i+4])
-
+            src = ymdh.get_data(datetime(2006, 1, 2, hour=h)).data_array[0]
+            trg = ymdh.get_data(datetime(2006, 1, 7, hour=h)).data_array[0]
+            self.assertNotEqual(src[2:6], trg[2:6])
+            self.assertEqual(src[6:], trg[6:])
 
     def test_adjust_values(self):
         start_time = datetime(2006, 1, 2, hour=0)
         ymdh = YMDHData()
         for i in range(0, 24):
             UTC = start_time + timedelta(hours=i)
-            ymdh.add_ymdh(UTC, (i+1) * 100, ["2006", "1", "2", str(i), i+1, i+2, i+3, i+4, (i+1) * 100])
+            ymdh.add_ymdh(UTC, (i+1) * 100, ["2006", "1", "2", str(i), "2006", "1", "1", str(i), (i+1) * 100])
         interval = timedelta(hours=24)
         new_time = start_time + timedelta(days=5)
         adj = AdjustData()
@@ -450,37 +375,31 @@ class TestYMDHData(unittest.TestCase):
         adj = AdjustData(abs_adj=100, ratio=1.1)
         ymdh.adjust_values(start_time, interval, adj)
 
-        self.assertEqual(len(ymdh.dbase), 1)
-        self.assertTrue("2006" in ymdh.dbase.keys())
-        self.assertEqual(len(ymdh.dbase["2006"]), 1)
-        self.assertTrue("1" in ymdh.dbase["2006"].keys())
-        self.assertEqual(len(ymdh.dbase["2006"]["1"]), 2)
-        self.assertTrue("2" in ymdh.dbase["2006"]["1"].keys())
-        self.assertTrue("7" in ymdh.dbase["2006"]["1"].keys())
-        self.assertEqual(len(ymdh.dbase["2006"]["1"]["2"]), 24)
-        self.assertEqual(len(ymdh.dbase["2006"]["1"]["7"]), 24)
+        self.assertEqual(ymdh.valid.sum(), 48)
+        self.assertTrue(ymdh.get_valid(datetime(2006, 1, 2), 24).all())
+        self.assertTrue(ymdh.get_valid(datetime(2006, 1, 7), 24).all())
 
         for D in ["2", "7"]:
             for i in range(0, 24):
                 H = str(i)
-                self.assertTrue(H in ymdh.dbase["2006"]["1"][D].keys())
-                self.assertEqual(len(ymdh.dbase["2006"]["1"][D][H].data_array), 1)
-                self.assertEqual(len(ymdh.dbase["2006"]["1"][D][H].data_array[0]), 9)
-                self.assertEqual(ymdh.dbase["2006"]["1"][D][H].data_array[0][0], "2006")
-                self.assertEqual(ymdh.dbase["2006"]["1"][D][H].data_array[0][1], "1")
-                self.assertEqual(ymdh.dbase["2006"]["1"][D][H].data_array[0][2], D)
-                self.assertEqual(ymdh.dbase["2006"]["1"][D][H].data_array[0][3], H)
-                self.assertEqual(ymdh.dbase["2006"]["1"][D][H].data_array[0][4], i+1)
-                self.assertEqual(ymdh.dbase["2006"]["1"][D][H].data_array[0][5], i+2)
-                self.assertEqual(ymdh.dbase["2006"]["1"][D][H].data_array[0][6], i+3)
-                self.assertEqual(ymdh.dbase["2006"]["1"][D][H].data_array[0][7], i+4)
+                self.assertTrue(ymdh.has_hour(datetime(2006, 1, int(D), hour=i)))
+                self.assertEqual(len(ymdh.get_data(datetime(2006, 1, int(D), hour=int(H))).data_array), 1)
+                self.assertEqual(len(ymdh.get_data(datetime(2006, 1, int(D), hour=int(H))).data_array[0]), 9)
+                self.assertEqual(ymdh.get_data(datetime(2006, 1, int(D), hour=int(H))).data_array[0][0], "2006")
+                self.assertEqual(ymdh.get_data(datetime(2006, 1, int(D), hour=int(H))).data_array[0][1], "1")
+                self.assertEqual(ymdh.get_data(datetime(2006, 1, int(D), hour=int(H))).data_array[0][2], D)
+                self.assertEqual(ymdh.get_data(datetime(2006, 1, int(D), hour=int(H))).data_array[0][3], H)
+                self.assertEqual(ymdh.get_data(datetime(2006, 1, int(D), hour=int(H))).data_array[0][4], "2006")
+                self.assertEqual(ymdh.get_data(datetime(2006, 1, int(D), hour=int(H))).data_array[0][5], "1")
+                self.assertEqual(ymdh.get_data(datetime(2006, 1, int(D), hour=int(H))).data_array[0][6], "1")
+                self.assertEqual(ymdh.get_data(datetime(2006, 1, int(D), hour=int(H))).data_array[0][7], H)
 
         D2 = "2"
         D7 = "7"
         for i in range(0, 24):
             H = str(i)
-            self.assertEqual(ymdh.dbase["2006"]["1"][D2][H].val,
-                             (ymdh.dbase["2006"]["1"][D7][H].val * 1.1) + 100)
+            self.assertEqual(ymdh.get_data(datetime(2006, 1, int(D2), hour=int(H))).val,
+                             (ymdh.get_data(datetime(2006, 1, int(D7), hour=int(H))).val * 1.1) + 100)
 
     def test_verify_range(self):
         start_time = datetime(2006, 1, 2, hour=0)
@@ -525,6 +444,60 @@ class TestYMDHData(unittest.TestCase):
         for miss_u, miss_i in missing:
             ymdh.copy_nearest(miss_u, miss_i)
 
+    # Fills missing hours one at a time, the way copy_nearest used to.
+    def hourly_copy_nearest(self, ymdh, UTC, interval):
+        for hour in range(0, int(interval.total_seconds()) // 3600):
+            targ = UTC + timedelta(hours=hour)
+            if not ymdh.has_hour(targ):
+                src = ymdh._determine_nearest_time(targ)
+                ymdh.duplicate_data(src, targ, timedelta(hours=1))
+
+    def test_copy_nearest_bulk(self):
+        def create():
+            ymdh = YMDHData()
+            # Two partial years, one of them a leap year
+            for start, days, skip in [(datetime(2016, 2, 20), 15, 7),
+                                      (datetime(2019, 2, 18), 20, 1000)]:
+                for i in [x for x in range(0, days * 24) if x % skip != 3]:
+                    UTC = start + timedelta(hours=i)
+                    y, m, d, h = ymdh._get_keys_from_time(UTC)
+                    ly, lm, ld, lh = ymdh._get_keys_from_time(UTC - timedelta(hours=4))
+                    ymdh.add_ymdh(UTC, i * 1.5, ["File", i, y, m, d, h, ly, lm, ld, lh, i * 1.5])
+            return ymdh
+
+        for start, days in [(datetime(2015, 2, 21), 12), (datetime(2020, 2, 26), 6),
+                            (datetime(2016, 2, 19, hour=7), 15)]:
+            interval = timedelta(days=days)
+            expected = create()
+            self.hourly_copy_nearest(expected, start, interval)
+            ymdh = create()
+            ymdh.copy_nearest(start, interval)
+            self.assertEqual(ymdh.min_time, expected.min_time)
+            self.assertEqual(ymdh.max_time, expected.max_time)
+            self.assertEqual([(x.val, x.data_array) for x in ymdh],
+                             [(x.val, x.data_array) for x in expected])
+
+    def test_copy_nearest_missing(self):
+        ymdh = YMDHData()
+        start_time = datetime(2019, 3, 1, hour=0)
+        for i in [0, 1, 3]:
+            UTC = start_time + timedelta(hours=i)
+            y, m, d, h = ymdh._get_keys_from_time(UTC)
+            ymdh.add_ymdh(UTC, i, [y, m, d, h, y, m, d, h, i])
+
+        with self.assertRaises(ValueError) as context:
+            ymdh.copy_nearest(datetime(2020, 3, 1, hour=0), timedelta(hours=4))
+        self.assertTrue("No other year has same Month/Day/Hour!\n2020-3-1-2"
+                        in str(context.exception))
+        # Hours before the failure are filled
+        self.assertEqual(ymdh.get_values(datetime(2020, 3, 1, hour=0), 4).tolist()[0:2],
+                         [0.0, 1.0])
+        self.assertFalse(ymdh.has_hour(datetime(2020, 3, 1, hour=3)))
+
+        with self.assertRaises(ValueError) as context:
+            YMDHData().copy_nearest(start_time, timedelta(hours=4))
+        self.assertTrue("Database is empty" in str(context.exception))
+
     def test_determine_nearest_time(self):
         start_time = datetime(2006, 1, 1, hour=5)
         ymdh = YMDHData()
@@ -546,7 +519,7 @@ class TestYMDHData(unittest.TestCase):
             self.assertEqual(m, M)
             self.assertEqual(d, D)
             self.assertEqual(h, H)
-            self.assertTrue(y in ymdh.dbase.keys())
+            self.assertTrue(ymdh.has_hour(src_time))
 
     def test_create_base(self):
         abs_adj = 1
@@ -561,12 +534,9 @@ class TestYMDHData(unittest.TestCase):
                 self.assertTrue(src[0] in ["2006", "2007"])
                 self.assertEqual(trg[0], "2019")
                 self.assertEqual(src[8], trg[8])
-                self.assertTrue(src[8] is trg[8])
                 for i in range(1, 4):
                     self.assertEqual(src[i], trg[i])
                     self.assertEqual(src[i+4], trg[i+4])
-                    self.assertFalse(src[i] is trg[i])
-                    self.assertTrue(src[i+4] is trg[i+4])
             self.assertFalse(src_data is trg_data)
             self.assertFalse(src_data.val is trg_data.val)
             self.assertEqual((trg_data.val * ratio_adj) + abs_adj, src_data.val)
@@ -603,3 +573,153 @@ class TestYMDHData(unittest.TestCase):
         d = 0
         for h in range(0, hr_offset):
             local_check(d, h)
+
+    def test_get_values(self):
+        start_time = datetime(2006, 1, 2, hour=0)
+        ymdh = YMDHData()
+        for i in range(0, 24):
+            if i in [5, 6]:
+                continue
+            UTC = start_time + timedelta(hours=i)
+            Y, M, D, H = ymdh._get_keys_from_time(UTC)
+            ymdh.add_ymdh(UTC, i+1, [Y, M, D, H, Y, M, D, H, i+1])
+
+        vals = ymdh.get_values(start_time, 24)
+        self.assertEqual(len(vals), 24)
+        valid = ymdh.get_valid(start_time, 24)
+        self.assertEqual(len(valid), 24)
+        for i in range(0, 24):
+            if i in [5, 6]:
+                self.assertTrue(isnan(vals[i]))
+                self.assertFalse(valid[i])
+            else:
+                self.assertEqual(vals[i], i+1)
+                self.assertTrue(valid[i])
+        with self.assertRaises(ValueError):
+            vals[0] = 99.0
+
+        # Hours outside the data range are invalid
+        vals = ymdh.get_values(start_time - timedelta(hours=2), 4)
+        valid = ymdh.get_valid(start_time - timedelta(hours=2), 4)
+        self.assertEqual(len(vals), 4)
+        self.assertTrue(isnan(vals[0]))
+        self.assertTrue(isnan(vals[1]))
+        self.assertEqual(vals[2], 1.0)
+        self.assertEqual(vals[3], 2.0)
+        self.assertEqual(list(valid), [False, False, True, True])
+        vals[0] = 99.0
+        self.assertTrue(isnan(ymdh.get_value(start_time - timedelta(hours=2))))
+
+        vals = YMDHData().get_values(start_time, 3)
+        self.assertTrue(all(isnan(x) for x in vals))
+
+    def test_add_ymdh_out_of_order(self):
+        ymdh = YMDHData()
+        times = [datetime(2006, 1, 2, hour=5),
+                 datetime(2005, 12, 1, hour=0),
+                 datetime(2007, 3, 4, hour=23)]
+        for i, UTC in enumerate(times):
+            Y, M, D, H = ymdh._get_keys_from_time(UTC)
+            ymdh.add_ymdh(UTC, i+1, [Y, M, D, H, Y, M, D, H, i+1])
+        for i, UTC in enumerate(times):
+            self.assertEqual(ymdh.get_value(UTC), i+1)
+        self.assertEqual(ymdh.min_time, times[1])
+        self.assertEqual(ymdh.max_time, times[2])
+        self.assertEqual([x.val for x in ymdh], [2, 1, 3])
+
+    def test_merge(self):
+        start_time = datetime(2006, 1, 2, hour=0)
+        first = YMDHData()
+        second = YMDHData()
+        for i in range(0, 4):
+            UTC = start_time + timedelta(hours=i)
+            Y, M, D, H = first._get_keys_from_time(UTC)
+            first.add_ymdh(UTC, i, ["A", i, Y, M, D, H, Y, M, D, H, i])
+            UTC = start_time + timedelta(hours=i+2)
+            Y, M, D, H = second._get_keys_from_time(UTC)
+            second.add_ymdh(UTC, 10, ["B", i, Y, M, D, H, Y, M, D, H, 10])
+
+        ymdh = YMDHData()
+        ymdh.merge(first)
+        ymdh.merge(second)
+        ymdh.merge(YMDHData())
+        self.assertEqual(ymdh.get_values(start_time, 6).tolist(),
+                         [0.0, 1.0, 12.0, 13.0, 10.0, 10.0])
+        self.assertEqual(ymdh.min_time, start_time)
+        self.assertEqual(ymdh.max_time, start_time + timedelta(hours=5))
+        data = ymdh.get_data(start_time + timedelta(hours=3))
+        self.assertEqual([row[0:2] for row in data.data_array], [["A", 3], ["B", 1]])
+        data = ymdh.get_data(start_time + timedelta(hours=5))
+        self.assertEqual(data.data_array[0][0:2], ["B", 3])
+
+    def test_merge_adjusted(self):
+        UTC = datetime(2006, 1, 1, hour=0)
+        interval = timedelta(hours=1)
+        first = YMDHData()
+        first.add_ymdh(UTC, 100.0, ["A", 0, "2006", "1", "1", "0", "2006", "1", "1", "0", 100.0])
+        second = YMDHData()
+        second.add_ymdh(UTC, 10.0, ["B", 0, "2006", "1", "1", "0", "2006", "1", "1", "0", 10.0])
+
+        # Adjusted and scaled hours are added at their adjusted values.
+        adjusted = copy.deepcopy(second)
+        adjusted.adjust_values(UTC, interval, AdjustData(ratio=2.0))
+        merged = copy.deepcopy(first)
+        merged.merge(adjusted)
+        self.assertEqual(merged.get_value(UTC), 120.0)
+        merged = copy.deepcopy(first)
+        merged.merge(second.scaled_view(UTC, interval, AdjustData(ratio=3.0)))
+        self.assertEqual(merged.get_value(UTC), 130.0)
+        self.assertEqual([row[0] for row in merged.get_data(UTC).data_array], ["A", "B"])
+
+        # Changing the merged data leaves the data merged into it unchanged.
+        merged = YMDHData()
+        merged.merge(second)
+        merged.adjust_values(UTC, interval, AdjustData(abs_adj=5.0))
+        merged.add_ymdh(UTC, 1.0, [], ignore_dup=True)
+        self.assertEqual(merged.get_value(UTC), 16.0)
+        self.assertEqual(second.get_value(UTC), 10.0)
+        second.adjust_values(UTC, interval, AdjustData(abs_adj=7.0))
+        self.assertEqual(merged.get_value(UTC), 16.0)
+
+    def test_scaled_view(self):
+        start_time = datetime(2006, 1, 2, hour=0)
+        ymdh = YMDHData()
+        for i in range(0, 24):
+            UTC = start_time + timedelta(hours=i)
+            y, m, d, h = ymdh._get_keys_from_time(UTC)
+            ymdh.add_ymdh(UTC, i+4, ["File", i, y, m, d, h, y, m, d, h, i+4])
+        adj = AdjustData(abs_adj=1.0, ratio=1.1)
+        view_time = start_time + timedelta(hours=2)
+        interval = timedelta(hours=20)
+
+        expected = copy.deepcopy(ymdh)
+        expected.adjust_values(view_time, interval, adj)
+        view = ymdh.scaled_view(view_time, interval, adj)
+        self.assertTrue(np.shares_memory(view.values, ymdh.values))
+        self.assertEqual(view.get_values(start_time, 24).tolist(),
+                         expected.get_values(start_time, 24).tolist())
+        self.assertEqual(view.get_value(view_time), expected.get_value(view_time))
+        self.assertEqual([(x.val, x.data_array) for x in view],
+                         [(x.val, x.data_array) for x in expected])
+        self.assertEqual(ymdh.get_value(view_time), 6.0)
+
+        # Changing either one leaves the other unchanged
+        view.adjust_values(start_time, interval, AdjustData(abs_adj=100.0))
+        self.assertFalse(np.shares_memory(view.values, ymdh.values))
+        self.assertEqual(view.get_value(view_time), expected.get_value(view_time) + 100.0)
+        self.assertEqual(ymdh.get_value(view_time), 6.0)
+
+        view = ymdh.scaled_view(view_time, interval, adj)
+        UTC = start_time + timedelta(hours=24)
+        y, m, d, h = ymdh._get_keys_from_time(UTC)
+        ymdh.add_ymdh(UTC, 1.0, ["File", 24, y, m, d, h, y, m, d, h, 1.0])
+        ymdh.add_ymdh(view_time, 1.0, ["File", 25, "2006", "1", "2", "2",
+                                       "2006", "1", "2", "2", 1.0], ignore_dup=True)
+        self.assertFalse(view.has_hour(UTC))
+        self.assertEqual(view.get_data(view_time).val, expected.get_value(view_time))
+        self.assertEqual(len(view.get_data(view_time).data_array), 1)
+        self.assertEqual(len(ymdh.get_data(view_time).data_array), 2)
+
+        merged = YMDHData()
+        merged.merge(ymdh.scaled_view(view_time, interval, adj))
+        self.assertEqual(merged.get_value(view_time), (7.0 * 1.1) + 1.0)
@@ -6,6 +6,13 @@
     - value
     - array of other information
 
+    Values are held in a contiguous array of floats, indexed by the
+    number of hours since a base UTC time.  A validity mask records
+    which hours have been added.  The array grows in either direction
+    as hours outside the current range are added.
+
+    The other information for each hour is kept in a Provenance
+    table, and is only converted to lists when asked for.
 """
 
 from optparse import OptionParser
@@ -17,8 +24,15 @@ import logging
 import copy
 from datetime import datetime, timedelta
 from math import ceil, isnan
+import numpy as np
 from common_defs import *
 from adjust_data import AdjustData
+from provenance import Provenance, NO_ROW
+
+ONE_HOUR = timedelta(hours=1)
+
+# Minimum number of hours allocated when the array grows
+MIN_ALLOCATION = 24 * 31
 
 class VA(object):
     def __init__(self, val, data_iter=[]):
@@ -51,82 +65,139 @@ class VA(object):
             items.append("\n")
         return "%s%s%s" % (START_END, SEPARATOR.join(items), START_END)
 
+def hours_in(interval):
+    return (interval.days * 24) + ceil(interval.seconds/3600.0)
+
 class YMDHData(object):
     def __init__(self):
-        self.dbase = {}
+        self.base_time = None
+        self.values = np.empty(0, dtype=np.float64)
+        self.valid = np.zeros(0, dtype=np.bool_)
+        # First and last provenance rows for each hour
+        self.head = np.empty(0, dtype=np.int32)
+        self.tail = np.empty(0, dtype=np.int32)
+        self.provenance = Provenance()
         self.min_time = None
         self.max_time = None
+        # Set when the arrays are shared with another object,
+        # see scaled_view.
+        self.shared = False
+        # Adjustment, first and last+1 index, applied as values are read
+        self.scale = None
 
     def __iter__(self):
-        self.Ys = sorted(list(self.dbase.keys()))
-        self.Ms = []
-        self.Ds = []
-        self.Hs = []
-        self.Y_i = -1
-        self.M_i = -1
-        self.D_i = -1
-        self.H_i = -1
-        if len(self.Ys) == 0:
-            return self
-        return self
-
-    def __next__(self):
-        self.H_i += 1
-        if self.H_i >= len(self.Hs):
-            self.H_i = 0
-            self.D_i += 1
-            if self.D_i >= len(self.Ds):
-                self.D_i = 0
-                self.M_i += 1
-                if self.M_i >= len(self.Ms):
-                    self.M_i = 0
-                    self.Y_i += 1
-                    if self.Y_i >= len(self.Ys):
-                        raise StopIteration
-                    self.Y = self.Ys[self.Y_i]
-                    self.Ms = list(self.dbase[self.Y].keys())
-                self.M = self.Ms[self.M_i]
-                self.Ds = list(self.dbase[self.Y][self.M].keys())
-            self.D = self.Ds[self.D_i]
-            self.Hs = list(self.dbase[self.Y][self.M][self.D].keys())
-        self.H = self.Hs[self.H_i]
-        return self.dbase[self.Y][self.M][self.D][self.H]
-
-    def _get_subset(self, keys, is_start, is_end, start, end):
-        ret = keys
-        if is_start and is_end:
-            keys = [x for x in keys if (int(x) >= start and int(x) <= end)]
-        elif is_start:
-            keys = [x for x in keys if int(x) >= start]
-        elif is_end:
-            keys = [x for x in keys if int(x) <= end]
-        return keys
+        for idx in np.flatnonzero(self.valid):
+            yield self._get_va(idx)
+
+    # Number of hours from the base time to UTC.
+    # Any timezone information is ignored, as all times are UTC.
+    def _get_index(self, UTC):
+        delta = UTC.replace(tzinfo=None) - self.base_time
+        return (delta.days * 24) + (delta.seconds // 3600)
+
+    def _get_time(self, idx):
+        return self.base_time + timedelta(hours=int(idx))
+
+    # Returns values from lo up to hi, with any scaling applied.
+    def _read_values(self, lo, hi):
+        values = self.values[lo:hi]
+        if self.scale is None:
+            return values
+        adj, scale_lo, scale_hi = self.scale
+        first = max(lo, scale_lo)
+        last = min(hi, scale_hi)
+        if first >= last:
+            return values
+        values = values.copy()
+        valid = self.valid[first:last]
+        scaled = values[first - lo:last - lo]
+        scaled[valid] = adj.adjust_array(scaled[valid])
+        return values
+
+    # Returns a copy of self that shares its arrays, with values
+    # in the interval starting at UTC adjusted by adj as they are read.
+    # This gives the same values as copying and calling adjust_values,
+    # but no data is copied until either object is changed.
+    def scaled_view(self, UTC, interval, adj):
+        view = copy.copy(self)
+        if view.scale is not None:
+            view._unshare()
+        view.shared = True
+        self.shared = True
+        if not self.is_empty():
+            _, lo, hi = self._get_window(UTC, hours_in(interval))
+            view.scale = (adj, lo, hi)
+        return view
+
+    # Takes private copies of shared arrays, applying any scaling,
+    # before self is changed.
+    def _unshare(self):
+        if not self.shared:
+            return
+        self.values = self._read_values(0, len(self.values)).copy()
+        self.valid = self.valid.copy()
+        self.head = self.head.copy()
+        self.tail = self.tail.copy()
+        self.provenance = copy.deepcopy(self.provenance)
+        self.shared = False
+        self.scale = None
+
+    def _get_va(self, idx):
+        va = VA(float(self._read_values(idx, idx + 1)[0]))
+        if self.head[idx] != NO_ROW:
+            va.data_array = self.provenance.get_rows(self.head[idx],
+                                                     self._get_time(idx))
+        return va
+
+    # Ensure that UTC has a slot in the array, growing the array
+    # if necessary.  Returns the index of UTC.
+    def _reserve(self, UTC):
+        UTC = UTC.replace(tzinfo=None, minute=0, second=0, microsecond=0)
+        if self.base_time is None:
+            self.base_time = UTC
+        idx = self._get_index(UTC)
+        size = len(self.values)
+        if 0 <= idx < size:
+            return idx
+
+        grow = max(size, MIN_ALLOCATION)
+        if idx < 0:
+            front = grow - idx
+            back = 0
+        else:
+            front = 0
+            back = grow + idx - size + 1
+        self.values = np.concatenate((np.full(front, INVALID_VALUE),
+                                      self.values,
+                                      np.full(back, INVALID_VALUE)))
+        self.valid = np.concatenate((np.zeros(front, dtype=np.bool_),
+                                     self.valid,
+                                     np.zeros(back, dtype=np.bool_)))
+        self.head = np.concatenate((np.full(front, NO_ROW, dtype=np.int32),
+                                    self.head,
+                                    np.full(back, NO_ROW, dtype=np.int32)))
+        self.tail = np.concatenate((np.full(front, NO_ROW, dtype=np.int32),
+                                    self.tail,
+                                    np.full(back, NO_ROW, dtype=np.int32)))
+        self.base_time = self.base_time - timedelta(hours=front)
+        return idx + front
+
+    # Returns the array indices overlapping hours starting at UTC.
+    # The first index returned is the offset of the overlap within
+    # the requested range.
+    def _get_window(self, UTC, hours):
+        if self.base_time is None or hours <= 0:
+            return 0, 0, 0
+        start = self._get_index(UTC)
+        lo = min(max(start, 0), len(self.values))
+        hi = min(max(start + hours, 0), len(self.values))
+        return lo - start, lo, hi
 
     def gen_func(self, UTC=None, interval=None, debug=False):
-        start_time = UTC
-        end_time = UTC + interval - timedelta(hours=1)
-
-        Ys = sorted([x for x in self.dbase.keys() if (int(x) >= start_time.year and int(x) <= end_time.year)])
-        for Y in Ys:
-            i_Y = int(Y)
-            Ms = self._get_subset(self.dbase[Y].keys(),
-                                 start_time.year == i_Y,
-                                 end_time.year == i_Y,
-                                 start_time.month, end_time.month)
-            for M in Ms:
-                i_M = int(M)
-                Ds = self._get_subset(self.dbase[Y][M].keys(),
-                                     start_time.year == i_Y and start_time.month == i_M,
-                                     end_time.year == i_Y and end_time.month == i_M,
-                                     start_time.day, end_time.day)
-                for D in Ds:
-                    i_D = int(D)
-                    Hs = self._get_subset(self.dbase[Y][M][D].keys(),
-                                         start_time.year == i_Y and start_time.month == i_M and start_time.day == i_D,
-                                         end_time.year == i_Y and end_time.month == i_M and end_time.day == i_D,
-                                         start_time.hour, end_time.hour)
-                    for H in Hs:
-                        yield self.dbase[Y][M][D][H]
+        hours = hours_in(interval)
+        _, lo, hi = self._get_window(UTC, hours)
+        for idx in np.flatnonzero(self.valid[lo:hi]):
+            yield self._get_va(lo + idx)
 
     def _get_keys_from_time(self, UTC):
         y = str(UTC.year)
@@ -144,29 +215,31 @@ class YMDHData(object):
         return datetime(y, m, d, hour=h)
 
     def is_empty(self):
-        return self.dbase == {}
+        return self.base_time is None
+
+    def has_hour(self, UTC):
+        if self.base_time is None:
+            return False
+        idx = self._get_index(UTC)
+        return 0 <= idx < len(self.values) and bool(self.valid[idx])
 
     def _determine_nearest_time(self, UTC):
-        if len(self.dbase.keys()) == 0:
+        if self.is_empty():
             raise ValueError("Database is empty, no key available!")
-        try:
-            y, m, d, h = self._get_keys_from_time(UTC)
-            val = self.dbase[y][m][d][h]
+        if self.has_hour(UTC):
             return UTC
-        except KeyError:
-            # Don't count on having another leap year present.
-            if m == "2" and d == "29":
-                d = "28"
-            # See if a different year has the same month/day/hour:
-            for Y in sorted(self.dbase.keys()):
-                try:
-                    val = self.dbase[Y][m][d][h]
-                    ret = datetime(int(Y), int(m), int(d), hour=int(h))
-                    return ret
-                except KeyError:
-                    pass
+        m = UTC.month
+        d = UTC.day
+        # Don't count on having another leap year present.
+        if m == 2 and d == 29:
+            d = 28
+        # See if a different year has the same month/day/hour:
+        for Y in range(self.min_time.year, self.max_time.year + 1):
+            ret = datetime(Y, m, d, hour=UTC.hour)
+            if self.has_hour(ret):
+                return ret
         raise ValueError("No other year has same Month/Day/Hour!\n%s-%s-%s-%s"
-                         % (y, m, d, h))
+                         % self._get_keys_from_time(UTC))
 
     def add_ymdh(self, UTC, val, data, ignore_dup=False):
         if self.min_time is None:
@@ -177,110 +250,232 @@ class YMDHData(object):
         elif UTC > self.max_time:
             self.max_time = UTC
 
-        va = VA(val, data)
         if data != []:
-            date = self._get_UTC_from_va(va)
+            date = self._get_UTC_from_va(VA(val, data))
             if date != UTC:
                 raise ValueError("Data %s does not match UTC %s" %
                                  (date.strftime(DATE_FORMAT),
                                   UTC.strftime(DATE_FORMAT)))
-        Y, M, D, H = self._get_keys_from_time(UTC)
+        self._unshare()
+        idx = self._reserve(UTC)
 
-        if not Y in self.dbase:
-            self.dbase[Y] = {}
-
-        if not M in self.dbase[Y]:
-            self.dbase[Y][M] = {}
-
-        if not D in self.dbase[Y][M]:
-            self.dbase[Y][M][D] = {}
-
-        if H in self.dbase[Y][M][D]:
-            if ignore_dup:
-                self.dbase[Y][M][D][H] = self.dbase[Y][M][D][H] + va
-            else:
+        if self.valid[idx]:
+            if not ignore_dup:
+                Y, M, D, H = self._get_keys_from_time(UTC)
                 raise ValueError("Duplicate line at time %s %s %s %s:00!"
                                  "Original data %s" %
-                                 (Y, M, D, H, str(self.dbase[Y][M][D][H])))
+                                 (Y, M, D, H, str(self._get_va(idx))))
+            if isnan(val) or isnan(self.values[idx]):
+                raise ValueError("Adding NaN!")
+            self.values[idx] += val
+        else:
+            self.values[idx] = val
+            self.valid[idx] = True
+            self.head[idx] = NO_ROW
+            self.tail[idx] = NO_ROW
+
+        if data != []:
+            row = self.provenance.add(UTC, data)
+            self._append_rows(idx, row, row)
+
+    # Adds all hours from other.
+    # Hours present in both are summed, and other's provenance rows
+    # are added after those of self.
+    def merge(self, other):
+        if other.is_empty():
             return
-        self.dbase[Y][M][D][H] = va
+        self._unshare()
+        if other.shared:
+            other = copy.copy(other)
+            other._unshare()
+        if self.is_empty():
+            # The arrays are shared until either object is changed.
+            self.base_time = other.base_time
+            self.values = other.values
+            self.valid = other.valid
+            self.head = other.head
+            self.tail = other.tail
+            self.provenance = other.provenance
+            self.min_time = other.min_time
+            self.max_time = other.max_time
+            self.shared = True
+            other.shared = True
+            return
+
+        for idx in np.flatnonzero(other.valid):
+            UTC = other._get_time(idx)
+            self.add_ymdh(UTC, float(other.values[idx]), [], ignore_dup=True)
+            if other.head[idx] != NO_ROW:
+                self._append_rows(self._get_index(UTC),
+                                  *self.provenance.import_chain(other.provenance,
+                                                                other.head[idx]))
+        self.min_time = min(self.min_time, other.min_time)
+        self.max_time = max(self.max_time, other.max_time)
+
+    def _append_rows(self, idx, head, tail):
+        if self.head[idx] == NO_ROW:
+            self.head[idx] = head
+        else:
+            self.provenance.next_row[self.tail[idx]] = head
+        self.tail[idx] = tail
 
     def get_value(self, UTC):
-        data = self.get_data(UTC)
-        return data.val
+        try:
+            idx = self._get_index(UTC)
+        except (AttributeError, TypeError):
+            return INVALID_VALUE
+        if 0 <= idx < len(self.values):
+            return float(self._read_values(idx, idx + 1)[0])
+        return INVALID_VALUE
+
+    # Returns an array of values for each hour starting at UTC.
+    # Hours with no data are NaN.  When the range lies within the
+    # data, the array returned is a read only view.
+    def get_values(self, UTC, hours):
+        offset, lo, hi = self._get_window(UTC, hours)
+        if offset == 0 and (hi - lo) == hours:
+            view = self._read_values(lo, hi)
+            view.flags.writeable = False
+            return view
+        ret = np.full(hours, INVALID_VALUE)
+        ret[offset:offset + hi - lo] = self._read_values(lo, hi)
+        return ret
+
+    # Returns a boolean array, True for each hour starting at UTC
+    # that has data.
+    def get_valid(self, UTC, hours):
+        offset, lo, hi = self._get_window(UTC, hours)
+        ret = np.zeros(hours, dtype=np.bool_)
+        ret[offset:offset + hi - lo] = self.valid[lo:hi]
+        return ret
+
+    # Keeps only the hours from UTC up to, but not including, end_utc,
+    # if every one of them is present.  Returns False, keeping all
+    # hours, if any are missing.  Provenance rows of the other hours
+    # are kept, but are no longer used.
+    def keep_window(self, UTC, end_utc):
+        hours = hours_in(end_utc - UTC)
+        if hours <= 0 or not self.get_valid(UTC, hours).all():
+            return False
+        self._unshare()
+        _, lo, hi = self._get_window(UTC, hours)
+        self.values = self.values[lo:hi]
+        self.valid = self.valid[lo:hi]
+        self.head = self.head[lo:hi]
+        self.tail = self.tail[lo:hi]
+        self.base_time = self._get_time(lo)
+        self.min_time = self.base_time
+        self.max_time = self._get_time(hours - 1)
+        return True
 
     def get_data(self, UTC):
         try:
-            Y, M, D, H = self._get_keys_from_time(UTC)
-        except:
+            idx = self._get_index(UTC)
+        except (AttributeError, TypeError):
             return VA(INVALID_VALUE)
-        try:
-            return self.dbase[Y][M][D][H]
-        except:
-            pass
+        if 0 <= idx < len(self.values) and self.valid[idx]:
+            return self._get_va(idx)
         return VA(INVALID_VALUE)
 
     def duplicate_data(self, UTC, new_UTC, interval, adjustment=AdjustData(),
                              debug=False):
         delta = new_UTC - UTC
-        for va in self.gen_func(UTC, interval, debug=debug):
-            Y, M, D, H = self._get_keys_from_va(va)
-            src_UTC = self._get_UTC_from_va(va)
+        delta_hours = (delta.days * 24) + (delta.seconds // 3600)
+        self._unshare()
+        offset, lo, hi = self._get_window(UTC, hours_in(interval))
+        src = lo + np.flatnonzero(self.valid[lo:hi])
+        if len(src) == 0:
+            return
+        # Gather everything from the source first, as adding the
+        # target hours may move the source hours within the array.
+        src_times = [self._get_time(idx) for idx in src]
+        newvals = adjustment.adjust_array(self.values[src])
+        heads = self.head[src]
+        for src_UTC, head, newval in zip(src_times, heads, newvals):
             trg_UTC = src_UTC + delta
-            vl = copy.deepcopy(va)
-            newval = adjustment.adjust([vl.val])[0]
-
-            ty, tm, td, th = self._get_keys_from_time(trg_UTC)
-            for da in vl.data_array:
-                da[-9] = ty
-                da[-8] = tm
-                da[-7] = td
-                da[-6] = th
-            #if debug:
-            #    print("Duplicate: src %s trg %s" % (src_UTC.strftime(DATE_FORMAT),
-            #                                        trg_UTC.strftime(DATE_FORMAT)))
             self.add_ymdh(trg_UTC, newval, [])
-            self.dbase[ty][tm][td][th].data_array = vl.data_array
+            if head != NO_ROW:
+                self._append_rows(self._get_index(trg_UTC),
+                                  *self.provenance.copy_chain(head, delta_hours))
 
     def adjust_values(self, UTC, interval, adj, debug=False):
-        for va in self.gen_func(UTC, interval, debug):
-            va.val = adj.adjust([va.val])[0]
+        self._unshare()
+        _, lo, hi = self._get_window(UTC, hours_in(interval))
+        valid = self.valid[lo:hi]
+        self.values[lo:hi][valid] = adj.adjust_array(self.values[lo:hi][valid])
 
     def verify_range(self, UTC, interval):
-        hours = (interval.days * 24) + ceil(interval.seconds/3600.0)
+        hours = hours_in(interval)
+        present = self.get_valid(UTC, hours).astype(np.int8)
+        # Missing intervals start where present goes from 1 to 0,
+        # and end where it goes from 0 to 1.
+        edges = np.diff(np.concatenate(([1], present, [1])))
+        starts = np.flatnonzero(edges == -1)
+        ends = np.flatnonzero(edges == 1)
         missing = []
-        start_time = None
-        start_incr = None
-        for hour in range(0, hours):
-            incr = timedelta(hours=hour)
-            UTC_i = UTC + incr
-            y, m, d, h = self._get_keys_from_time(UTC_i)
-            try:
-                val = self.dbase[y][m][d][h]
-                if start_time is not None:
-                    missing.append ([start_time, incr - start_incr])
-                    start_time = None
-                    start_incr = None
-            except:
-                if start_time is None:
-                    start_time = UTC_i
-                    start_incr = incr
-        if start_time is not None:
-            missing.append ([start_time, interval - start_incr])
+        for start, end in zip(starts, ends):
+            start_incr = timedelta(hours=int(start))
+            if end == hours:
+                missing.append([UTC + start_incr, interval - start_incr])
+            else:
+                missing.append([UTC + start_incr, timedelta(hours=int(end - start))])
         return missing
 
+    # Returns, for each index in targets, the index of the same
+    # month/day/hour in the earliest year that has data, or -1.
+    def _find_nearest(self, targets):
+        times = np.datetime64(self.base_time, 'h') + targets
+        months = times.astype('M8[M]')
+        days = times.astype('M8[D]')
+        month = (months - times.astype('M8[Y]').astype('M8[M]')).astype(np.int64)
+        day = (days - months.astype('M8[D]')).astype(np.int64)
+        hour = (times - days.astype('M8[h]')).astype(np.int64)
+        # Don't count on having another leap year present.
+        day[(month == 1) & (day == 28)] = 27
+
+        nearest = np.full(len(targets), -1, dtype=np.int64)
+        for Y in range(self.min_time.year, self.max_time.year + 1):
+            year = np.datetime64(str(Y), 'M')
+            cand = ((year + month).astype('M8[D]') + day).astype('M8[h]') + hour
+            cand = (cand - np.datetime64(self.base_time, 'h')).astype(np.int64)
+            found = (nearest < 0) & (cand >= 0) & (cand < len(self.values))
+            found[found] = self.valid[cand[found]]
+            nearest[found] = cand[found]
+        return nearest
+
+    # Fills every missing hour from the same month/day/hour of the
+    # earliest year with data, as _determine_nearest_time does.
+    # Hours filled here are copies of hours already present, so they
+    # are found all at once, before any are filled.
     def copy_nearest(self, UTC, interval):
-        hours = (interval.days * 24) + ceil(interval.seconds/3600.0)
-        one_hour = timedelta(hours=1)
-        for hour in range(0, hours):
-            incr = timedelta(hours=hour)
-            targ = UTC + incr
-            y, m, d, h = self._get_keys_from_time(targ)
-            try:
-                val = self.dbase[y][m][d][h]
-            except KeyError:
-                src = self._determine_nearest_time(targ)
-                self.duplicate_data(src, targ, one_hour, debug=True)
+        hours = hours_in(interval)
+        if hours <= 0 or self.get_valid(UTC, hours).all():
+            return
+        if self.is_empty():
+            raise ValueError("Database is empty, no key available!")
+        self._unshare()
+        # Make room for the whole range first, so indices don't move.
+        self._reserve(UTC)
+        self._reserve(UTC + timedelta(hours=hours - 1))
+        lo = self._get_index(UTC)
+        targets = lo + np.flatnonzero(~self.valid[lo:lo + hours])
+        sources = self._find_nearest(targets)
+
+        failed = np.flatnonzero(sources < 0)
+        if len(failed):
+            bad_UTC = self._get_time(targets[failed[0]])
+            targets = targets[:failed[0]]
+            sources = sources[:failed[0]]
+        if len(targets):
+            self.values[targets] = AdjustData().adjust_array(self.values[sources])
+            self.valid[targets] = True
+            self.head[targets], self.tail[targets] = \
+                self.provenance.copy_chains(self.head[sources], targets - sources)
+            self.min_time = min(self.min_time, self._get_time(targets[0]))
+            self.max_time = max(self.max_time, self._get_time(targets[-1]))
+        if len(failed):
+            raise ValueError("No other year has same Month/Day/Hour!\n%s-%s-%s-%s"
+                             % self._get_keys_from_time(bad_UTC))
 
     def create_base(self, UTC, interval):
         missing = self.verify_range(UTC, interval)
@@ -290,5 +485,6 @@ class YMDHData(object):
             logging.debug("Base already present.")
         for miss_u, miss_i in missing:
             logging.debug("    Start %s Interval %s" % (miss_u.strftime(DATE_FORMAT), str(miss_i)))
-            self.copy_nearest(miss_u, miss_i)
+        if len(missing):
+            self.copy_nearest(UTC, interval)
 
@@ -15,9 +15,11 @@ function check_rc(){
         echo ---------------------------------------
 }
 
+JOBS=${JOBS:-$(getconf _NPROCESSORS_ONLN)}
+
 cd 01_British_Columbia
 echo 'Starting British Columbia...'
-./BC_Spreadsheet_Files.py -a > load_db.txt
+./BC_Spreadsheet_Files.py -a -j $JOBS > load_db.txt
 check_rc 'British Columbia'
 cd ..
 
@@ -84,7 +86,7 @@ cd ..
 
 cd 10_Newfoundland_and_Labrador
 echo 'Starting Newfoundland and Labrador...'
-./NL_pdf_files.py -d ../www.pub.nl.ca -l > load_db.txt
+./NL_pdf_files.py -d ../www.pub.nl.ca -l -c NL_pdf_cache.json -j $JOBS > load_db.txt
 check_rc 'Newfoundland and Labrador'
 cd ..
 